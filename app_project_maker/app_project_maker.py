@@ -1,16 +1,92 @@
+from __future__ import annotations
+
+import fnmatch
+import functools
+import heapq
 import os
 import shutil
+import stat
+import sys
+import threading
+import time as time_module
 from abc import ABCMeta, abstractmethod
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, Executor, Future, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, Type, List, Tuple, Union, Optional
+from typing import Callable, Dict, Type, List, Tuple, Union, Optional, Iterator, Iterable, Set, Any, Sequence, BinaryIO, TypeVar, \
+    Collection, TYPE_CHECKING
 
-from loguru import logger
+from app_project_maker.log import logger
+from app_project_maker.atomic_write import atomic_write_bytes
 
+from app_project_maker.component_cache import ComponentValidator, stat_fingerprint
+from app_project_maker.config.loader import CONFIG_FILES, ConfigLoader
+from app_project_maker.config.project_config import ProjectConfig
+from app_project_maker.copy_mode import CopyMode, ProgressCallback, copy_tree, is_immutable
 from app_project_maker.error import *
-from app_project_maker.hidden_project_config import ProjectMeta, META_HIDDEN_FILE
+from app_project_maker.file_lock import FileLock
+from app_project_maker.metrics import METRICS, Operation, OperationHook, OperationStats
+from app_project_maker.hidden_project_config import ProjectMeta, META_HIDDEN_FILE, SNAPSHOT_FILES
+from app_project_maker.layout import LayoutKind, MigrationResult, ProjectLayout, is_shard_dir, scan_projects
 from app_project_maker.project_manage_config import ProjectManageConfig
+from app_project_maker.project_registry import ProjectRegistry, path_stem
 from app_project_maker.sort import ProjectSort
+from app_project_maker.usage import DiskUsage, Quota, ROOT_COMPONENT, component_name, scan_directory, scan_project
+from app_project_maker.trash import TrashReaper, TRASH_DIR
+
+# tarfile,sqlite3,inotifyなどを使うモジュールはimport app_project_makerを遅くしないよう,使うメソッド内でimportする
+if TYPE_CHECKING:
+    from app_project_maker.archive import ArchiveStats
+    from app_project_maker.blob_store import BlobReport, BlobStore, GcResult
+    from app_project_maker.project_index import ProjectIndex
+    from app_project_maker.roots import RootScanner, RootStatus
+    from app_project_maker.snapshot import RestoreResult, SnapshotInfo, SnapshotStore
+    from app_project_maker.watch import ProjectWatcher, ProjectChange, ChangeCallback
+
+T = TypeVar('T')
+# Project._meta_lockの作成
+_LOCK_INIT = threading.Lock()
+
+
+def _synchronized(method):
+    """
+    AppProjectMaker.projects_lockを取ってからメソッドを呼ぶ.監視スレッドと呼び出し側のスレッドがself.projectsを同時に操作しないようにする
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.projects_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _list_tree(path: Path) -> Set[str]:
+    """
+    ディレクトリ以下のファイルとディレクトリのパス
+    """
+    paths = set()
+    for root, dirs, files in os.walk(path):
+        paths.update(os.path.join(root, name) for name in dirs + files)
+    return paths
+
+
+def _remove_added(path: Path, before: Set[str]):
+    """
+    _list_tree(path)がbeforeだった時点から追加されたファイルとディレクトリを削除する.既存のファイルは残す
+    """
+    for root, dirs, files in os.walk(path, topdown=False):
+        for name in files:
+            file_path = os.path.join(root, name)
+            if file_path not in before:
+                try:
+                    os.remove(file_path)
+                except FileNotFoundError:
+                    pass
+        for name in dirs:
+            dir_path = os.path.join(root, name)
+            if dir_path not in before:
+                shutil.rmtree(dir_path, ignore_errors=True)
 
 
 class AbstractComponent(metaclass=ABCMeta):
@@ -18,9 +94,19 @@ class AbstractComponent(metaclass=ABCMeta):
        AppProjectMakerからリソースを追加時にこのクラスを実装した具体クラスが使用される
        """
     mode = "None"
+    # Trueにするとvalid()の結果をリソースのフィンガープリントと共にプロジェクトディレクトリにキャッシュし,
+    # fingerprint_filesが変更されていなければ次回以降valid()を呼ばない
+    cache_validation = False
+    # create()で作成するリソースの見積もりサイズ(byte).クォータを超えるかどうかをcreate()の前に確認する
+    estimated_size = 0
+    # ブロブストアが有効な場合にProjectが設定する
+    blob_store: Optional[BlobStore] = None
+    # コンポーネントを追加したProject
+    project: Optional['Project'] = None
 
     def __init__(self, resource: str, base_path: Path):
         self.resource_name = resource
+        self.project_path = base_path
         self.resource_directory = base_path.joinpath(resource)
         if not self.resource_directory.exists():
             self.resource_directory.mkdir(parents=True, exist_ok=True)
@@ -36,6 +122,62 @@ class AbstractComponent(metaclass=ABCMeta):
         """現存するリソースが再利用可能かをチェック"""
         raise NotImplementedError()
 
+    def fingerprint_files(self) -> Iterable[Path]:
+        """valid()の結果に影響するファイル.既定はresource_directory以下の全ファイル"""
+        for root, _, files in os.walk(self.resource_directory):
+            for file_name in files:
+                yield Path(root, file_name)
+
+    def fingerprint(self) -> str:
+        """fingerprint_filesのパス,サイズ,更新時刻から作るフィンガープリント"""
+        return stat_fingerprint(self.resource_directory, self.fingerprint_files())
+
+    def register_resource(self, file_path: Union[str, Path]) -> Path:
+        """
+        リソースファイルをブロブストアに登録し,他のプロジェクトと共有する.ストアが無効であれば何もしない
+        登録したファイルは読み取り専用になる
+        :param file_path:
+        :return: file_path
+        """
+        if self.blob_store is not None:
+            self.blob_store.add(self.project_path, file_path)
+        return Path(file_path)
+
+    def write_resource(self, relative_path: Union[str, Path], data: bytes) -> Path:
+        """
+        resource_directory以下にファイルを書き込み,プロジェクトのディスク使用量に加算する.
+        クォータを超える場合は書き込まずにQuotaExceededErrorを投げる.
+        既存のファイルは新しいファイルで置き換えるため,ハードリンクで共有しているブロブやコピー元のプロジェクトは変更されない
+        :param relative_path: resource_directoryからの相対パス
+        :param data:
+        :return: 書き込んだファイルのパス
+        """
+        path = self.resource_directory.joinpath(relative_path)
+        try:
+            st = path.stat()
+            old_size, new_file, shared = st.st_size, 0, st.st_nlink > 1
+            # ブロブは読み取り専用なので,置き換えたファイルは書き込めるようにする
+            mode = (st.st_mode & 0o777) | stat.S_IWUSR
+        except FileNotFoundError:
+            old_size, new_file, shared, mode = 0, 1, False, None
+        if self.project is not None:
+            self.project.check_quota(len(data) - old_size)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_bytes(path, data, mode=mode)
+        if shared and self.blob_store is not None:
+            # 置き換えたファイルはブロブではなくなる
+            self.blob_store.forget(self.project_path, path)
+        if self.project is not None:
+            self.project.record_usage(self.resource_name, len(data) - old_size, new_file)
+        return path
+
+    def resources_changed(self):
+        """
+        write_resource以外でリソースを書き換えた場合に呼び,このコンポーネントの使用量を数え直す
+        """
+        if self.project is not None:
+            self.project.refresh_usage(self.resource_name)
+
     @property
     def resource_path(self) -> Path:
         """コンポーネントの保存パス"""
@@ -48,29 +190,192 @@ class AbstractComponent(metaclass=ABCMeta):
         raise NotImplementedError
 
 
+@dataclass
+class ComponentSpec:
+    """
+    Project.add_componentsに渡すコンポーネントの指定.引数はadd_componentと同じ
+    """
+    resource_path: str
+    source_name: str
+    component: Type[AbstractComponent]
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    # 先に追加されている必要があるコンポーネントのresource_path
+    depends_on: Sequence[str] = ()
+
+
+@dataclass
+class ComponentResult:
+    """
+    Project.add_componentsのコンポーネントごとの結果
+    """
+    resource_path: str
+    component: Optional[AbstractComponent] = None
+    resources: Optional[Dict[str, str]] = None
+    # 既存のリソースを使わずにcreate()した
+    created: bool = False
+    # valid()を呼ばずにキャッシュした検証結果を使った
+    valid_cached: bool = False
+    valid_seconds: float = 0.0
+    create_seconds: float = 0.0
+    error: Optional[Exception] = None
+
+
 class Project:
     """
     AppProjectMakerから生成された1プロジェクト.
+    多数のプロジェクトを保持するため__slots__で属性を固定し,components,etc,検証キャッシュ,設定ローダーは最初に使う時に作る
     """
+    __slots__ = ('_path', 'name', '_components', '_etc', 'index', 'write_behind', 'blob_store', 'quota',
+                 '_meta', '_meta_stat', '_meta_dirty', '_meta_written', '_flush_timer', '_lock',
+                 '_validator', '_config_loaders', 'trash')
+
+    def __init__(self, path: Union[str, Path], name: str = None, index: Optional[ProjectIndex] = None,
+                 write_behind: Optional[float] = None, blob_store: Optional[BlobStore] = None,
+                 quota: Optional[Quota] = None, trash: Optional[Callable[[Path], Any]] = None):
+        """
+        :param path: 文字列の場合はpathに最初にアクセスした時点でPathにする
+        :param name:
+        :param index: 更新日を反映するメタデータインデックス(AppProjectMakerが共有する)
+        :param write_behind: update_config_dateの書き込みを最大でこの秒数に1回にまとめる.Noneであれば毎回書き込む
+        :param blob_store: リソースを共有するブロブストア(AppProjectMakerが共有する)
+        :param quota: ディスク使用量の上限.indexが無い場合は全体の上限は確認しない
+        :param trash: 削除するスナップショットを受け取る関数(AppProjectMakerのゴミ箱).省略時はその場で削除する
+        """
+        # 全件を列挙する場合にPathの作成が大半を占めるので,ProjectRegistryからは文字列で受け取る
+        self._path: Union[str, Path] = path
+        self.name = sys.intern(name or path_stem(str(path)))
+        self._components: Optional[Dict[str, AbstractComponent]] = None
+        self._etc: Optional[Dict[str, Any]] = None
+        self.index = index
+        self.write_behind = write_behind
+        self.blob_store = blob_store
+        self.quota = quota
+        self.trash = trash
+
+        # .prjのキャッシュ.(mtime,size,inode)が変わらない間は読み直さない
+        self._meta: Optional[ProjectMeta] = None
+        self._meta_stat: Optional[Tuple[int, int, int]] = None
+        self._meta_dirty = False
+        self._meta_written = 0.0
+        self._flush_timer: Optional[threading.Timer] = None
+        self._lock: Optional[threading.RLock] = None
+        self._validator: Optional[ComponentValidator] = None
+        # 設定クラス -> ローダー
+        self._config_loaders: Optional[Dict[type, ConfigLoader]] = None
+
+    @property
+    def _meta_lock(self) -> threading.RLock:
+        """
+        .prjのキャッシュ・検証キャッシュ・設定ローダーのロック.全件を列挙する場合に作らないよう最初に使う時点で作る
+        """
+        lock = self._lock
+        if lock is None:
+            with _LOCK_INIT:
+                if self._lock is None:
+                    self._lock = threading.RLock()
+                lock = self._lock
+        return lock
 
-    def __init__(self, path: Path, name: str = None):
-        self.path = path
-        self.name = path.stem
-        self.components = {}
-        self.etc = {}
-        if name:
-            self.name = name
+    @property
+    def path(self) -> Path:
+        path = self._path
+        if type(path) is str:
+            path = self._path = Path(path)
+        return path
+
+    @path.setter
+    def path(self, path: Path):
+        self._path = path
+
+    @property
+    def components(self) -> Dict[str, AbstractComponent]:
+        if self._components is None:
+            self._components = {}
+        return self._components
+
+    @components.setter
+    def components(self, components: Dict[str, AbstractComponent]):
+        self._components = components
+
+    @property
+    def etc(self) -> Dict[str, Any]:
+        if self._etc is None:
+            self._etc = {}
+        return self._etc
+
+    @etc.setter
+    def etc(self, etc: Dict[str, Any]):
+        self._etc = etc
+
+    def _meta_file_stat(self) -> Tuple[int, int, int]:
+        st = os.stat(ProjectMeta.meta_file_path(self.path))
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _cached_meta(self) -> ProjectMeta:
+        with self._meta_lock:
+            if self._meta_dirty:
+                return self._meta
+            # 読み込み中に書き換えられても次回読み直されるように,statは読み込みより先に取る
+            stat = self._meta_file_stat()
+            if self._meta is None or stat != self._meta_stat:
+                self._meta = ProjectMeta.read(self.path)
+                self._meta_stat = stat
+            return self._meta
 
     def hidden_config(self) -> ProjectMeta:
-        return ProjectMeta.read(self.path)
+        return replace(self._cached_meta())
 
     def update_config_date(self, time: Optional[datetime] = None) -> None:
-        meta: ProjectMeta = ProjectMeta.read(self.path)
-        if time:
-            meta.update_date = time
-        else:
-            meta.update_date = datetime.now()
-        meta.write_current(self.path)
+        """
+        .prjの更新日を更新.write_behindが設定されている場合は書き込みをまとめて遅延させる
+        :param time: 更新日.省略時は現在時刻
+        :return:
+        """
+        with self._meta_lock:
+            meta = self._cached_meta()
+            if time:
+                meta.update_date = time
+            else:
+                meta.update_date = datetime.now()
+            self._meta_dirty = True
+
+            if self.write_behind is None:
+                self.flush()
+                return
+            elapsed = time_module.monotonic() - self._meta_written
+            if elapsed >= self.write_behind:
+                self.flush()
+            elif self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.write_behind - elapsed, self._flush_behind)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def flush(self) -> None:
+        """
+        遅延している.prjの書き込みを実行
+        :return:
+        """
+        with self._meta_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._meta_dirty:
+                return
+            self._meta.write_current(self.path)
+            self._meta_stat = self._meta_file_stat()
+            self._meta_dirty = False
+            self._meta_written = time_module.monotonic()
+            if self.index is not None:
+                self.index.upsert(self.name, self.path, self._meta)
+
+    def _flush_behind(self):
+        try:
+            self.flush()
+        except OSError as e:
+            # 書き込み前にプロジェクトが削除された場合など
+            logger.warning(f"Failed To Write Meta: {self.path} {e!r}")
+            with self._meta_lock:
+                self._meta_dirty = False
 
     def add_component(self, resource_path: str, source_name: str, new_project: Type[AbstractComponent], **kwargs) \
             -> Tuple[Dict[str, str], AbstractComponent]:
@@ -86,29 +391,319 @@ class Project:
         :return:
         :rtype:
         """
-        component_path = self.path.joinpath(source_name)
+        result = self._provision_component(ComponentSpec(resource_path, source_name, new_project, kwargs))
+        self.components[resource_path] = result.component
+        return result.resources, result.component
+
+    def add_components(self, specs: Iterable[Union[ComponentSpec, tuple]], executor: Optional[Executor] = None,
+                       max_workers: Optional[int] = None) -> Dict[str, ComponentResult]:
+        """
+        複数のコンポーネントを並列に追加
+        依存関係(ComponentSpec.depends_on)の無いコンポーネントはvalid()とcreate()を並列に実行し,
+        依存先が全て完了したコンポーネントから順に実行する
+        :param specs: ComponentSpecまたは(resource_path, source_name, component[, kwargs])
+        :param executor: 実行に使うExecutor.省略時はThreadPoolExecutorを作成する
+        :param max_workers: executor省略時のスレッド数
+        :return: resource_path -> 実行結果(時間,エラー).失敗したコンポーネントはself.componentsに追加されない
+        """
+        specs = [spec if isinstance(spec, ComponentSpec) else ComponentSpec(*spec) for spec in specs]
+        by_path = {spec.resource_path: spec for spec in specs}
+        if len(by_path) != len(specs):
+            raise ValueError('resource_path is duplicated')
+        for spec in specs:
+            unknown = set(spec.depends_on) - by_path.keys()
+            if unknown:
+                raise ValueError(f'{spec.resource_path} depends on unknown components: {unknown}')
+        # 循環している場合は1つもcreate()しないうちに失敗させる
+        cyclic = self._cyclic_components(specs)
+        if cyclic:
+            raise ValueError(f'circular dependency: {cyclic}')
+
+        own_executor = executor is None
+        if own_executor:
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+        results: Dict[str, ComponentResult] = {}
+        waiting = dict(by_path)
+        running: Dict[Future, str] = {}
+        try:
+            while waiting or running:
+                for resource_path, spec in list(waiting.items()):
+                    if not all(dep in results for dep in spec.depends_on):
+                        continue
+                    del waiting[resource_path]
+                    failed = [dep for dep in spec.depends_on if results[dep].error is not None]
+                    if failed:
+                        results[resource_path] = ComponentResult(
+                            resource_path, error=ComponentDependencyError(resource_path, failed))
+                    else:
+                        running[executor.submit(self._provision_component, spec)] = resource_path
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    resource_path = running.pop(future)
+                    try:
+                        results[resource_path] = future.result()
+                    except Exception as e:
+                        logger.warning(f"Failed To Add Component: {resource_path} {e!r}")
+                        results[resource_path] = ComponentResult(resource_path, error=e)
+        finally:
+            if own_executor:
+                executor.shutdown(wait=True)
+
+        for resource_path, result in results.items():
+            if result.error is None:
+                self.components[resource_path] = result.component
+        return {spec.resource_path: results[spec.resource_path] for spec in specs}
+
+    @staticmethod
+    def _cyclic_components(specs: List[ComponentSpec]) -> List[str]:
+        """
+        依存関係をトポロジカルソート(Kahnのアルゴリズム)し,順序が決まらないコンポーネントを返す
+        :param specs:
+        :return: 循環している,または循環に依存しているコンポーネントのresource_path
+        """
+        remaining = {spec.resource_path: len(set(spec.depends_on)) for spec in specs}
+        dependents: Dict[str, List[str]] = {}
+        for spec in specs:
+            for dep in set(spec.depends_on):
+                dependents.setdefault(dep, []).append(spec.resource_path)
+        ready = [resource_path for resource_path, count in remaining.items() if count == 0]
+        while ready:
+            for dependent in dependents.get(ready.pop(), ()):
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+        return [resource_path for resource_path, count in remaining.items() if count > 0]
+
+    def _provision_component(self, spec: ComponentSpec) -> ComponentResult:
+        """
+        コンポーネントを作成し,既存のリソースが使えなければデフォルトのリソースを作成する
+        :param spec:
+        :return:
+        """
+        component_path = self.path.joinpath(spec.source_name)
+        # AbstractComponentがディレクトリを作成するので先に確認する
+        existed = component_path.exists()
         # このリソースに対するディレクトリパス
-        self.components[resource_path] = component = new_project(source_name, self.path, **kwargs)
+        component = spec.component(spec.source_name, self.path, **spec.kwargs)
+        component.blob_store = self.blob_store
+        component.project = self
+        result = ComponentResult(spec.resource_path, component)
 
         # パスが現存し、機能に使えるデータがそろっている
-        if component_path.exists() and component.valid():
+        start = time_module.perf_counter()
+        reusable = False
+        if component_path.exists():
+            with METRICS.measure(Operation.COMPONENT_VALID):
+                with self._meta_lock:
+                    if self._validator is None:
+                        self._validator = ComponentValidator(self.path)
+                reusable, result.valid_cached = self._validator.validate(component)
+        result.valid_seconds = time_module.perf_counter() - start
+        if reusable:
             logger.info(f"Use Exist Resource : {component_path}")
         # パスが存在していないので、新規にコンポーネントディレクトリおよびデフォルトのデータを作成
         else:
             logger.info(f"Create New Resource Directory : {component_path}")
-            component.create()
+            self.check_quota(component.estimated_size)
+            # 既存のディレクトリにcreate()した場合,クォータ超過時にはcreate()が追加したものだけを削除する
+            before = _list_tree(component_path) if existed else None
+            start = time_module.perf_counter()
+            with METRICS.measure(Operation.COMPONENT_CREATE):
+                component.create()
+            result.create_seconds = time_module.perf_counter() - start
+            result.created = True
+            self.refresh_usage(spec.source_name)
+            try:
+                self.check_quota(0)
+            except QuotaExceededError:
+                # 見積もりより大きなリソースが作られた場合は作成したリソースを残さない
+                if before is None:
+                    shutil.rmtree(component_path, ignore_errors=True)
+                else:
+                    _remove_added(component_path, before)
+                self.refresh_usage(spec.source_name)
+                raise
 
-        return component.resources, component
+        result.resources = component.resources
+        return result
+
+    def config_loader(self, cls: Type[T] = ProjectConfig, file_name: Optional[str] = None,
+                      debounce: float = 0.5) -> ConfigLoader[T]:
+        """
+        プロジェクトの設定ファイルのローダー.同じ設定クラスには同じローダーを返す
+        :param cls: ProjectConfig,RecordConfig,DetectionConfigなどの設定クラス
+        :param file_name: プロジェクト内のファイル名.省略時はCONFIG_FILESの名前
+        :param debounce: 最初に作成する時のみ使用する
+        :return:
+        """
+        with self._meta_lock:
+            if self._config_loaders is None:
+                self._config_loaders = {}
+            loader = self._config_loaders.get(cls)
+            if loader is None:
+                loader = ConfigLoader(self.path.joinpath(file_name or CONFIG_FILES[cls]), cls, debounce=debounce)
+                self._config_loaders[cls] = loader
+            return loader
+
+    def config(self, cls: Type[T] = ProjectConfig) -> T:
+        """
+        デコード・検証済みの設定.ファイルが変更されていなければ読み直さない
+        :param cls:
+        :return:
+        """
+        return self.config_loader(cls).get()
+
+    def disk_usage(self) -> DiskUsage:
+        """
+        インデックスに記録したディスク使用量.記録が無い場合のみプロジェクトを走査する
+        :return:
+        """
+        usage = self.index.usage(self.name) if self.index is not None else {}
+        if not usage:
+            return self.refresh_usage()
+        return self._to_disk_usage(usage)
+
+    def refresh_usage(self, component: Optional[str] = None) -> DiskUsage:
+        """
+        ディスクを走査して使用量を数え直す
+        :param component: 数え直すコンポーネント.入れ子のリソース('media/video')はプロジェクト直下のディレクトリ('media')
+        全体を数え直す.Noneであればプロジェクト全体
+        :return: プロジェクト全体の使用量
+        """
+        if component is None:
+            usage = scan_project(self.path)
+            if self.index is None:
+                return self._to_disk_usage(usage)
+            self.index.set_usage(self.name, usage, replace=True)
+            return self._to_disk_usage(usage)
+        if self.index is None or not self.index.usage(self.name):
+            return self.refresh_usage()
+        component = component_name(component)
+        self.index.set_usage(self.name, {component: scan_directory(self.path.joinpath(component))})
+        return self._to_disk_usage(self.index.usage(self.name))
+
+    def record_usage(self, component: str, size: int, files: int = 0):
+        """
+        コンポーネントの使用量にsize byte加算する.記録が無い場合は次のdisk_usageで走査される
+        入れ子のリソースはrefresh_usageと同じくプロジェクト直下のディレクトリに加算する
+        """
+        if self.index is not None and self.index.usage(self.name):
+            self.index.add_usage(self.name, component_name(component), size, files)
+
+    def check_quota(self, additional: int):
+        """
+        additional byte増やすとクォータを超える場合はQuotaExceededErrorを投げる
+        :param additional:
+        :return:
+        """
+        if self.quota is None:
+            return
+        project_usage = self.disk_usage().bytes
+        # 全体の使用量は記録済みのプロジェクトの合計.クォータがある場合は読み込み・登録時に全プロジェクトを記録している
+        total_usage = self.index.total_usage() if self.index is not None else project_usage
+        self.quota.check(self.name, project_usage, total_usage, additional)
+
+    @staticmethod
+    def _to_disk_usage(usage: Dict[str, Tuple[int, int]]) -> DiskUsage:
+        return DiskUsage(sum(size for size, _ in usage.values()), sum(files for _, files in usage.values()),
+                         {component: size for component, (size, _) in usage.items()})
+
+    def register_resources(self, directory: Union[str, Path]) -> Dict[str, str]:
+        """
+        ディレクトリ以下のファイルをブロブストアに登録する.ストアが無効であれば何もしない
+        :param directory: プロジェクト内のディレクトリ
+        :return: プロジェクトからの相対パス -> ハッシュ
+        """
+        if self.blob_store is None:
+            return {}
+        return self.blob_store.add_tree(self.path, directory)
 
     def remove_component(self, resource_path: str):
         if resource_path in self.components.keys():
             self.components.pop(resource_path)
 
+    def relocate(self, path: Path):
+        """
+        ディレクトリを移動した後にパスを更新する(AppProjectMaker.migrate_layoutから呼ばれる)
+        追加済みのコンポーネントのproject_pathとresource_directoryも更新する
+        :param path: 移動先
+        :return:
+        """
+        with self._meta_lock:
+            self.path = path
+            self._meta_stat = None
+            self._validator = None
+            self._config_loaders = None
+            for component in self.components.values():
+                component.project_path = path
+                component.resource_directory = path.joinpath(component.resource_name)
+
+    @property
+    def snapshots(self) -> SnapshotStore:
+        from app_project_maker.snapshot import SnapshotStore
+        return SnapshotStore(self.path, trash=self.trash)
+
+    def snapshot(self, label: Optional[str] = None, checksum: bool = False) -> SnapshotInfo:
+        """
+        プロジェクトのスナップショットを作成する.前回のスナップショットから変更されていないファイルはハードリンクで共有する
+        :param label: 任意の説明
+        :param checksum: Trueであればサイズと更新時刻が同じファイルもハッシュで変更を確認する
+        :return:
+        """
+        with METRICS.measure(Operation.SNAPSHOT) as measurement:
+            info = self.snapshots.create(label=label, checksum=checksum)
+            measurement.bytes = info.copied_bytes
+        return info
+
+    def restore(self, snapshot_id: str) -> RestoreResult:
+        """
+        プロジェクトのファイルをスナップショットの状態に戻す.スナップショットに無いファイルは削除する.
+        .prj(プロジェクト名,作成日,更新日)とスナップショット自体は戻さない
+        :param snapshot_id:
+        :return:
+        """
+        result = self.snapshots.restore(snapshot_id)
+        with self._meta_lock:
+            self._validator = None
+        self.refresh_usage()
+        self.update_config_date()
+        return result
+
+    def list_snapshots(self) -> List[SnapshotInfo]:
+        """
+        :return: スナップショットの一覧(古い順)
+        """
+        return self.snapshots.list()
+
+    def remove_snapshot(self, snapshot_id: str):
+        self.snapshots.remove(snapshot_id)
+
+    def prune_snapshots(self, keep_last: Optional[int] = None, keep_within: Optional[timedelta] = None) -> List[str]:
+        """
+        保持ポリシーに当てはまらないスナップショットを削除する.最新のスナップショットは常に残す
+        :param keep_last: 新しい方からこの数だけ残す
+        :param keep_within: 作成からこの期間内のものを残す
+        :return: 削除したスナップショットのID
+        """
+        from app_project_maker.snapshot import SnapshotRetention
+        return self.snapshots.prune(SnapshotRetention(keep_last, keep_within))
+
     def to_view(self, **kwargs):
         self.etc = kwargs
         return {'name': self.name, 'path': self.path, 'project': self, **self.etc}
 
 
+@dataclass
+class BulkCreateResult:
+    """
+    AppProjectMaker.create_projectsの結果.作成に失敗したプロジェクトはerrorsに入る
+    """
+    projects: Dict[str, Project] = field(default_factory=dict)
+    errors: Dict[str, Exception] = field(default_factory=dict)
+
+
 class AppProjectMaker:
     """
     アプリの設定データをプロジェクトフォルダを作成して管理するクラス
@@ -118,19 +713,157 @@ class AppProjectMaker:
 
     """
     PROJECT_CONFIG_PATH = "project.json"
+    LOCK_PATH = "project.json.lock"
+    # project_index.INDEX_FILE
+    INDEX_PATH = "project_index.db"
 
-    def __init__(self, cur_dir: str = os.path.curdir, base_dir_path: str = ".prj"):
+    def __init__(self, cur_dir: str = os.path.curdir, base_dir_path: str = ".prj", fsync: bool = False,
+                 delete_ops_per_sec: Optional[float] = None, meta_write_behind: Optional[float] = None,
+                 blob_store: bool = False, project_quota: Optional[int] = None, total_quota: Optional[int] = None,
+                 layout: Optional[Union[str, LayoutKind]] = None, root_timeout: Optional[float] = None):
+        """
+        :param cur_dir:
+        :param base_dir_path: プロジェクトを配置するディレクトリ
+        :param fsync: project.jsonの書き込み時にfsyncする
+        :param delete_ops_per_sec: バックグラウンド削除で1秒あたりに削除するファイル数の上限
+        :param meta_write_behind: 各プロジェクトのupdate_config_dateの書き込みをこの秒数に1回にまとめる
+        :param blob_store: コンポーネントのリソースをベースディレクトリ/.blobsに登録してプロジェクト間で共有する.
+        一度有効にしたベースディレクトリでは常に有効になる
+        :param project_quota: 1プロジェクトのディスク使用量の上限(byte).add_componentとcopy_projectで確認する
+        :param total_quota: 全プロジェクトのディスク使用量の上限(byte)
+        :param layout: プロジェクトの配置('flat','hash','date').ベースディレクトリのlayout.jsonに保存され,
+        省略時は保存されているレイアウトを使う.プロジェクトがある場合に変更するにはmigrate_layoutを使う
+        :param root_timeout: ベースディレクトリ外のプロジェクトを確認する際の親ディレクトリごとの待ち時間(秒).
+        超えたディレクトリは前回確認できた結果を使う.Noneであればroots.DEFAULT_ROOT_TIMEOUT
+        """
         self.working_dir_path = Path(cur_dir)
         self.base_dir_path = self.working_dir_path.joinpath(base_dir_path)
+        self.fsync = fsync
+        self.meta_write_behind = meta_write_behind
+        self.quota = Quota(project_quota, total_quota) if project_quota is not None or total_quota is not None else None
+        # batch()のネスト数と,保存が保留されている変更の有無
+        self._batch_depth = 0
+        self._dirty = False
+        # 最後に読み書きしたproject.jsonの内容.他プロセスの変更とのマージに使う
+        self._registry_paths: Set[str] = set()
+        self._registry_generation = 0
+        self._registry_stat: Optional[Tuple[int, int, int]] = None
+        self.watcher: Optional[ProjectWatcher] = None
+        # self.projectsとproject.jsonの同期状態はwatch()の監視スレッドからも更新されるので,読み書きはこのロック内で行う.
+        # registry_lockと両方取る場合は必ずこちらを先に取る
+        self.projects_lock = threading.RLock()
 
         if not self.base_dir_path.exists():
             self.base_dir_path.mkdir(parents=True, exist_ok=True)
 
-        self.projects: Dict[str, Project] = self.load_projects()
+        # project.jsonの読み書きはプロセス間でロックする
+        self.registry_lock = FileLock(self.base_dir_path.joinpath(self.LOCK_PATH))
+        # 置き換える場合は新しいProjectLayoutを代入し,中身は変更しない(ProjectRegistryが古いレイアウトを参照している)
+        self.layout = ProjectLayout.read(self.base_dir_path)
+        if layout is not None and LayoutKind(layout) != self.layout.kind:
+            self._init_layout(LayoutKind(layout))
+        # インデックス,ベースディレクトリ外のプロジェクトの確認,ブロブストアは最初に使う時点で作る
+        self._index: Optional[ProjectIndex] = None
+        self._roots: Optional[RootScanner] = None
+        self._root_timeout = root_timeout
+        self._blob_store: Optional[BlobStore] = None
+        self._blob_store_opened = False
+        # 削除したプロジェクトはゴミ箱に移動し,バックグラウンドで削除する.前回の残りは最初に削除する時点で再開する
+        self.reaper = TrashReaper([self.trash_dir_path, self.all_trash_dir_path], max_ops_per_sec=delete_ops_per_sec)
+        # Projectがスナップショットの削除に使う.プロジェクトごとに作らないよう1つを共有する
+        self._trash = functools.partial(self.reaper.trash, trash_dir=self.trash_dir_path)
+        if blob_store:
+            from app_project_maker.blob_store import BLOB_DIR
+            self.base_dir_path.joinpath(BLOB_DIR).mkdir(exist_ok=True)
+        # project.jsonは最初にprojectsにアクセスした時点で読み込む
+        self._projects: Optional[ProjectRegistry[Project]] = None
+
+    @property
+    def index(self) -> ProjectIndex:
+        """
+        メタデータインデックス(SQLite).最初のアクセス時に開く
+        :return:
+        """
+        if self._index is None:
+            with self.projects_lock:
+                if self._index is None:
+                    from app_project_maker.project_index import ProjectIndex
+                    self._index = ProjectIndex(self.base_dir_path.joinpath(self.INDEX_PATH))
+        return self._index
+
+    @property
+    def roots(self) -> RootScanner:
+        """
+        ベースディレクトリ外のプロジェクトの確認
+        :return:
+        """
+        if self._roots is None:
+            with self.projects_lock:
+                if self._roots is None:
+                    from app_project_maker.roots import DEFAULT_ROOT_TIMEOUT, RootScanner
+                    timeout = DEFAULT_ROOT_TIMEOUT if self._root_timeout is None else self._root_timeout
+                    self._roots = RootScanner(self.base_dir_path, timeout=timeout)
+        return self._roots
+
+    @property
+    def blob_store(self) -> Optional[BlobStore]:
+        """
+        ベースディレクトリ/.blobsがあればブロブストア,無ければNone
+        :return:
+        """
+        if not self._blob_store_opened:
+            with self.projects_lock:
+                if not self._blob_store_opened:
+                    from app_project_maker.blob_store import BLOB_DIR, BlobStore
+                    blob_dir = self.base_dir_path.joinpath(BLOB_DIR)
+                    self._blob_store = BlobStore(blob_dir) if blob_dir.is_dir() else None
+                    self._blob_store_opened = True
+        return self._blob_store
+
+    @property
+    @_synchronized
+    def projects(self) -> ProjectRegistry[Project]:
+        """
+        登録されているプロジェクト.最初のアクセス時にproject.jsonを読み込み,インデックスを同期する
+        Projectは名前でアクセスされるか列挙された時点で作成される.
+        watch()で監視している間に列挙する場合はprojects_lockを取ること
+        :return:
+        """
+        if self._projects is None:
+            self._load()
+        return self._projects
+
+    @projects.setter
+    @_synchronized
+    def projects(self, projects: Dict[str, Project]):
+        registry = self._new_registry()
+        for name, project in projects.items():
+            registry[name] = project
+        self._projects = registry
+
+    @property
+    def loaded(self) -> bool:
+        """
+        project.jsonを読み込み済みかどうか
+        :return:
+        """
+        return self._projects is not None
+
+    def _load(self):
+        self._projects = self.load_projects()
+        paths = self._projects.path_strings()
+        # 応答しないディレクトリのプロジェクトの.prjは読まない
+        stale = self.roots.stale_roots()
+        skip = {name for name, path in paths.items() if os.path.dirname(path) in stale} if stale else ()
+        self.index.sync(paths, skip=skip)
+        if self.quota is not None:
+            # クォータの確認に使う全体の使用量はインデックスの合計なので,記録の無いプロジェクトを数えておく
+            self._record_missing_usage(skip)
 
         if not os.path.exists(self.project_manage_config_path):
             self.save_project()
 
+    @_synchronized
     def __getitem__(self, project_name: str) -> Project:
         if type(project_name) is not str:
             raise TypeError(project_name, type(project_name))
@@ -141,14 +874,50 @@ class AppProjectMaker:
 
         return self.projects[project_name]
 
+    def _new_project(self, path: Union[str, Path], name: str = None) -> Project:
+        return Project(path, name=name, index=self.index, write_behind=self.meta_write_behind,
+                       blob_store=self.blob_store, quota=self.quota, trash=self._trash)
+
+    def _new_registry(self) -> ProjectRegistry[Project]:
+        # 全件を列挙する場合は件数分呼ばれるので,_new_projectと同じ引数を固定しておく.
+        # selfは参照しない(循環参照で__del__の保存が遅れないようにする)
+        factory = functools.partial(Project, index=self.index, write_behind=self.meta_write_behind,
+                                    blob_store=self.blob_store, quota=self.quota, trash=self._trash)
+        return ProjectRegistry(self.base_dir_path, factory, relative=self._layout_relative())
+
+    def _layout_relative(self) -> Optional[Callable[[str], str]]:
+        return None if self.layout.kind == LayoutKind.FLAT else self.layout.relative_path
+
+    def _init_layout(self, kind: LayoutKind):
+        with self.registry_lock:
+            if next(scan_projects(self.base_dir_path), None) is not None:
+                raise LayoutError(f'{self.base_dir_path} Has Projects In {self.layout.kind.value} Layout. '
+                                  f'Use migrate_layout To Change It To {kind.value}')
+            self.layout = ProjectLayout(kind)
+            self.layout.write(self.base_dir_path)
+
+    def project_path(self, project_name: str) -> Path:
+        """
+        レイアウトに従ったプロジェクトの配置パス.
+        レイアウトの移行中は,移行先に無く移行元にある場合は移行元のパスを返す
+        :param project_name:
+        :return:
+        """
+        layout = self.layout
+        paths = [self.base_dir_path.joinpath(relative) for relative in layout.candidates(project_name)]
+        if len(paths) > 1 and not paths[0].exists() and paths[1].exists():
+            return paths[1]
+        return paths[0]
+
     def exist_project(self, project_name: str) -> bool:
         """
         プロジェクトフォルダが既に存在しているかチェック
         :param project_name:
         :return:
         """
-        return self.base_dir_path.joinpath(project_name).exists()
+        return self.project_path(project_name).exists()
 
+    @_synchronized
     def create_project(self, project_name: str, exist_ok: bool = True) -> Project:
         """
         新しくプロジェクトを作成
@@ -157,10 +926,64 @@ class AppProjectMaker:
         Falseであれば，ProjectOverrideErrorを投げる
         :return:
         """
-        new_project_path = Path(self.base_dir_path).joinpath(project_name)
+        new_project_path, meta = self._prepare_project(project_name, exist_ok)
+
+        project = self._new_project(new_project_path, project_name)
+        self.projects[project_name] = project
+        self.index.upsert(project_name, new_project_path, meta)
+        self._record_usage(project)
+        self.save_project()
+
+        return project
+
+    def create_projects(self, project_names: Iterable[str], exist_ok: bool = True, workers: Optional[int] = None) \
+            -> BulkCreateResult:
+        """
+        複数のプロジェクトをまとめて作成
+        ディレクトリと.prjの作成はスレッドプールで並列に行い,project.jsonの保存は最後に1回だけ行う
+        :param project_names:
+        :param exist_ok: create_projectと同じ.Falseの場合,既存のプロジェクトはProjectOverrideErrorとしてerrorsに入る
+        :param workers: スレッド数.Noneの場合はThreadPoolExecutorの既定値
+        :return: 作成したプロジェクトと,プロジェクトごとのエラー
+        """
+        result = BulkCreateResult()
+        prepared: List[Tuple[str, Path, ProjectMeta]] = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {name: pool.submit(self._prepare_project, name, exist_ok)
+                       for name in dict.fromkeys(project_names)}
+            for name, future in futures.items():
+                try:
+                    new_project_path, meta = future.result()
+                except Exception as e:
+                    logger.warning(f"プロジェクト作成失敗: {name} {e!r}")
+                    result.errors[name] = e
+                else:
+                    prepared.append((name, new_project_path, meta))
+
+        with self.projects_lock, self.batch():
+            for name, new_project_path, _ in prepared:
+                project = self._new_project(new_project_path, name)
+                self.projects[name] = project
+                result.projects[name] = project
+            self.index.upsert_many(prepared)
+            for project in result.projects.values():
+                self._record_usage(project)
+            self.save_project()
+
+        return result
+
+    def _prepare_project(self, project_name: str, exist_ok: bool) -> Tuple[Path, ProjectMeta]:
+        """
+        プロジェクトのディレクトリと.prjを作成する.登録は行わない
+        :param project_name:
+        :param exist_ok:
+        :return: プロジェクトのパスとメタデータ
+        """
+        new_project_path = self.project_path(project_name)
         if not new_project_path.exists():
             logger.info(f"新規プロジェクト作成: {new_project_path.absolute()}")
-            new_project_path.mkdir(parents=True, exist_ok=True)
+            with METRICS.measure(Operation.MKDIR):
+                new_project_path.mkdir(parents=True, exist_ok=True)
         else:
             if exist_ok:
                 logger.info(f"既存プロジェクト使用: {new_project_path.absolute()}")
@@ -169,14 +992,12 @@ class AppProjectMaker:
 
         # このフォルダがAppMakerによって作成されたことを示す，隠しファイルを作成.中身はjson
         if not os.path.exists(ProjectMeta.meta_file_path(new_project_path)):
-            ProjectMeta.write(new_project_path, project_name)
-
-        project = Project(new_project_path, name=project_name)
-        self.projects[project_name] = project
-        self.save_project()
-
-        return project
+            meta = ProjectMeta.write(new_project_path, project_name)
+        else:
+            meta = ProjectMeta.read(new_project_path)
+        return new_project_path, meta
 
+    @_synchronized
     def open_project(self, project_name: str) -> Project:
         """
         既存のプロジェクトを開く.
@@ -184,50 +1005,268 @@ class AppProjectMaker:
         :param project_name:
         :return:
         """
-        project_path = Path(self.base_dir_path).joinpath(project_name)
+        project_path = self.project_path(project_name)
         if not project_path.exists():
             raise ProjectNotFoundError(f'Project Name: {project_path} Base Path: {self.base_dir_path.absolute()}')
 
-        project = Project(project_path, name=project_name)
+        project = self._new_project(project_path, project_name)
         self.projects[project_name] = project
+        self._record_usage(project)
+        self._dirty = True
 
         return project
 
-    def copy_project(self, project_name: str, src_project: Project) -> Project:
+    def copy_project(self, project_name: str, src_project: Project, mode: CopyMode = CopyMode.COPY,
+                     workers: Optional[int] = None, progress: Optional[ProgressCallback] = None,
+                     cancel: Optional[threading.Event] = None,
+                     immutable: Callable[[str], bool] = is_immutable) -> Project:
         """
         プロジェクトのコピーを作成
         :param project_name:
         :param src_project:
+        :param mode: コピー方法.HARDLINKは書き換えられないリソース(immutableで判定)をハードリンクし,
+        REFLINKはreflink/copy_file_rangeを使用(未対応のファイルシステムでは通常のコピー),PARALLELは複数スレッドでコピーする
+        :param workers: コピーのスレッド数
+        :param progress: 進捗(転送量,速度)を受け取るコールバック
+        :param cancel: セットされるとファイル単位でコピーを中断し,コピー途中のディレクトリを削除してCopyCancelledErrorを投げる
+        :param immutable: HARDLINKでハードリンクするファイルの判定.既定は動画・画像・音声ファイルのみ(copy_mode.is_immutable).
+        ハードリンクしたファイルはコピー元と共有するため,その場で書き換えてはならない
         :return:
         """
-        new_path = self.base_dir_path.joinpath(project_name)
+        new_path = self._copy_project_files(project_name, src_project, mode, workers, progress, cancel, immutable)
+        return self._register_copy(project_name, new_path)
+
+    def _copy_project_files(self, project_name: str, src_project: Project, mode: CopyMode, workers: Optional[int],
+                            progress: Optional[ProgressCallback], cancel: Optional[threading.Event],
+                            immutable: Callable[[str], bool] = is_immutable) -> Path:
+        """
+        copy_projectのうちファイルのコピーだけを行う.self.projectsは変更しない
+        :return: コピー先のパス
+        """
+        new_path = self.project_path(project_name)
         if new_path.exists():
             raise ProjectOverrideError(new_path)
 
-        shutil.copytree(src_project.path, new_path, dirs_exist_ok=True, )
-        new_project = Project(new_path, name=project_name)
+        if self.quota is not None:
+            # コピー先はコピー元と同じ大きさになる(ハードリンクで共有するファイルも数える)
+            size = src_project.disk_usage().bytes
+            self.quota.check(project_name, 0, self.index.total_usage(), size)
+
+        linked = None
+        if self.blob_store is not None:
+            # ブロブストアに登録したファイルはモードに関わらずハードリンクで共有する
+            from app_project_maker.blob_store import BlobManifest
+            shared = {os.path.join(src_project.path, *relative.split('/'))
+                      for relative in BlobManifest.read(src_project.path).entries}
+            linked = shared.__contains__
+        try:
+            with METRICS.measure(Operation.COPY) as measurement:
+                stats = copy_tree(src_project.path, new_path, mode=mode, workers=workers, progress=progress,
+                                  immutable=immutable, linked=linked, cancel=cancel, exclude=SNAPSHOT_FILES)
+                measurement.bytes = stats.bytes_done
+        except CopyCancelledError:
+            # コピー途中のディレクトリは残さない
+            if new_path.exists():
+                self.reaper.trash(new_path, self.trash_dir_path)
+            raise
+        logger.info(f"プロジェクトコピー({mode.name}): {stats}")
+        self.index.copy_usage(src_project.name, project_name)
+        return new_path
+
+    @_synchronized
+    def _register_copy(self, project_name: str, new_path: Path) -> Project:
+        new_project = self._new_project(new_path, project_name)
         self.projects[project_name] = new_project
         # メタファイルを上書き
-        ProjectMeta.write(new_path, project_name)
+        meta = ProjectMeta.write(new_path, project_name)
+        self.index.upsert(project_name, new_path, meta)
         logger.info(f"コピーされたプロジェクトを使用: {new_path.absolute()}")
         self.save_project()
         return new_project
 
+    def export_project(self, project_name: str, fileobj: BinaryIO, level: int = 6,
+                       workers: Optional[int] = None) -> ArchiveStats:
+        """
+        プロジェクトをtar.gzとしてfileobjに書き出す.import_projectで別のマシンに取り込める
+        :param project_name:
+        :param fileobj: 書き出し先.ファイル,ソケット,パイプなどシークできなくてもよい
+        :param level: gzipの圧縮レベル
+        :param workers: 圧縮スレッド数
+        :return:
+        """
+        return self.export_projects([project_name], fileobj, level=level, workers=workers)
+
+    def export_projects(self, project_names: Iterable[str], fileobj: BinaryIO, level: int = 6,
+                        workers: Optional[int] = None) -> ArchiveStats:
+        """
+        複数のプロジェクトを1つのtar.gzとして書き出す
+        :param project_names:
+        :param fileobj:
+        :param level:
+        :param workers:
+        :return:
+        """
+        from app_project_maker.archive import write_archive
+        projects = [self[name] for name in dict.fromkeys(project_names)]
+        for project in projects:
+            # 書き込みが遅延している.prjもアーカイブに含める
+            project.flush()
+        with METRICS.measure(Operation.EXPORT) as measurement:
+            stats = write_archive([(project.name, project.path) for project in projects], fileobj,
+                                  level=level, workers=workers)
+            measurement.bytes = stats.compressed_bytes
+        logger.info(f"プロジェクトエクスポート: {stats}")
+        return stats
+
+    def import_project(self, fileobj: BinaryIO, name: Optional[str] = None) -> Project:
+        """
+        export_projectで書き出したプロジェクトを取り込み,.prjとproject.jsonに登録する
+        :param fileobj:
+        :param name: 取り込み後のプロジェクト名.Noneであればアーカイブ内の名前
+        :return:
+        """
+        return self._import(fileobj, name=name, single=True)[0]
+
+    def import_projects(self, fileobj: BinaryIO) -> List[Project]:
+        """
+        export_projectsで書き出した全てのプロジェクトを取り込む
+        :param fileobj:
+        :return:
+        """
+        return self._import(fileobj)
+
+    def _import(self, fileobj: BinaryIO, name: Optional[str] = None, single: bool = False) -> List[Project]:
+        from app_project_maker.archive import read_archive
+        from app_project_maker.blob_store import BlobManifest
+        with METRICS.measure(Operation.IMPORT) as measurement:
+            imported, stats = read_archive(fileobj, self.base_dir_path, name=name, single=single,
+                                           project_path=self.project_path)
+            measurement.bytes = stats.compressed_bytes
+        logger.info(f"プロジェクトインポート: {stats}")
+        projects = []
+        with self.projects_lock, self.batch():
+            for project_name, path, _ in imported:
+                project = self._new_project(path, project_name)
+                if self.blob_store is not None:
+                    # アーカイブには実体が入っているので,登録されていたファイルをストアと共有し直す
+                    for relative in BlobManifest.read(path).entries:
+                        self.blob_store.add(path, path.joinpath(*relative.split('/')))
+                self.projects[project_name] = project
+                projects.append(project)
+            self.index.upsert_many(imported)
+            for project in projects:
+                self._record_usage(project)
+            self.save_project()
+        return projects
+
+    @_synchronized
     def remove_project(self, project: Union[str, Project]):
+        """
+        プロジェクトを削除.ディレクトリはゴミ箱に移動し,中身はバックグラウンドで削除する
+        削除の完了を待つ場合はwait_deletionsを使用する
+        :param project:
+        :return:
+        """
         if isinstance(project, Project):
             project = project.name
         if project in self.projects:
-            shutil.rmtree(self.projects[project].path)
+            on_deleted = None
+            if self.blob_store is not None:
+                # 削除が終わった時点で,他のプロジェクトから参照されていないブロブを解放する
+                digests = self.blob_store.digests(self.projects[project].path)
+                on_deleted = functools.partial(self.blob_store.release, digests)
+            self.reaper.trash(self.projects[project].path, self.trash_dir_path, on_deleted=on_deleted)
             self.projects.pop(project)
+            self.index.remove(project)
             self.save_project()
         else:
             raise KeyError(f'削除不可.{project}は 認識されていません')
 
+    @_synchronized
     def remove_all_project(self):
-        shutil.rmtree(self.base_dir_path, ignore_errors=True)
+        # インデックスファイルもベースディレクトリごと削除されるので先に閉じる
+        if self._index is not None:
+            self._index.close()
+        if self.base_dir_path.exists():
+            # ベースディレクトリ自体を移動するので,ゴミ箱はベースディレクトリの外に置く
+            self.reaper.trash(self.base_dir_path, self.all_trash_dir_path)
         self.projects = {}
         self.save_project()
 
+    @_synchronized
+    def total_usage(self) -> int:
+        """
+        登録されている全プロジェクトのディスク使用量(byte).使用量が記録されていないプロジェクトだけを走査する
+        :return:
+        """
+        self._record_missing_usage()
+        return self.index.total_usage(self.projects.keys())
+
+    def _record_missing_usage(self, skip: Collection[str] = ()):
+        """
+        使用量がインデックスに記録されていない登録済みのプロジェクトを走査して記録する.記録は次回以降の読み込みでも使う
+        :param skip: 走査しないプロジェクト(応答しないディレクトリのものなど)
+        """
+        measured = set(self.index.usage_projects())
+        for name in [name for name in self.projects if name not in measured and name not in skip]:
+            self.projects[name].refresh_usage()
+
+    def _record_usage(self, project: Project):
+        """
+        新しく登録したプロジェクトの使用量を記録する.クォータがある場合のみ(全体の使用量をインデックスの合計で確認するため)
+        """
+        if self.quota is not None:
+            project.refresh_usage()
+
+    def gc_blobs(self) -> GcResult:
+        """
+        ブロブストアから,どのプロジェクトからも参照されていないブロブを削除する
+        :return:
+        """
+        if self.blob_store is None:
+            from app_project_maker.blob_store import GcResult
+            return GcResult()
+        return self.blob_store.gc()
+
+    def blob_report(self) -> BlobReport:
+        """
+        ブロブストアの使用量と,共有によって節約できた容量
+        :return:
+        """
+        if self.blob_store is None:
+            from app_project_maker.blob_store import BlobReport
+            return BlobReport()
+        return self.blob_store.report()
+
+    def wait_deletions(self, timeout: Optional[float] = None) -> bool:
+        """
+        バックグラウンドで削除中のプロジェクトが全て削除されるまで待つ
+        :param timeout: 秒
+        :return: 全て削除されたらTrue,タイムアウトした場合はFalse
+        """
+        return self.reaper.wait(timeout)
+
+    def flush_deletions(self, timeout: Optional[float] = None) -> bool:
+        """
+        削除速度の制限を解除して,削除中のプロジェクトが全て削除されるまで待つ
+        :param timeout: 秒
+        :return: 全て削除されたらTrue,タイムアウトした場合はFalse
+        """
+        return self.reaper.flush(timeout)
+
+    @property
+    def pending_deletions(self) -> List[Path]:
+        return self.reaper.pending
+
+    @property
+    def trash_dir_path(self) -> Path:
+        return self.base_dir_path.joinpath(TRASH_DIR)
+
+    @property
+    def all_trash_dir_path(self) -> Path:
+        """remove_all_projectで移動したベースディレクトリを置くゴミ箱"""
+        return self.base_dir_path.with_name(f'.{self.base_dir_path.name}{TRASH_DIR}')
+
     def project_root_path(self, abs: bool = True) -> str:
         if abs:
             return str(self.base_dir_path.absolute())
@@ -239,49 +1278,522 @@ class AppProjectMaker:
         :param name:
         :return:
         """
-        return str(self.base_dir_path.joinpath(name))
+        return str(self.project_path(name))
 
     def list_projects(self, other_path: List[str] = ()) -> Tuple[Tuple[str], Tuple[Path]]:
         """
         既存のプロジェクトを列挙.
         フォルダがプロジェクトフォルダかそうでないかは,プロジェクト生成時に
         自動的に作成される隠しファイル'.prj'の存在をもって判定する．
+        :param other_path: ベースディレクトリ以外のプロジェクトのパス.親ディレクトリごとに並列に確認し,
+        応答しないディレクトリは前回の結果を使う(root_statusで確認できる)
         :return:
         """
-        dirs = list(self.base_dir_path.iterdir())
-        dirs.extend(other_path)
-        dirs = tuple(map(Path, dirs))
-        prj_dir_path = tuple(filter(lambda p: p.joinpath(META_HIDDEN_FILE).exists(), dirs))
+        dirs = [Path(path) for _, path in scan_projects(self.base_dir_path)]
+        dirs.extend(map(Path, self.roots.scan(map(str, other_path))))
+        prj_dir_path = tuple(dirs)
         prj_dir_name = tuple(map(lambda p: p.stem, prj_dir_path))
         return prj_dir_name, prj_dir_path
 
+    @_synchronized
     def list_projects_raw(self, sort: ProjectSort = ProjectSort.NONE) -> Tuple[Project]:
+        if sort == ProjectSort.NONE:
+            return tuple(self.projects.values())
+
+        # 更新日はインデックスから取得し,インデックスに無いプロジェクトだけ.prjを読む
+        update_dates = self.index.update_dates()
+        missing = [self.projects[name] for name in self.projects if name not in update_dates]
+        for project in missing:
+            meta = project.hidden_config()
+            self.index.upsert(project.name, project.path, meta)
+            update_dates[project.name] = meta.update_date.timestamp()
+
+        # 名前だけでソートし,Projectは結果の順に1回だけ取り出す
+        projects = self.projects
         if sort == ProjectSort.DESCENT:  # 新しい順
-            return tuple(sorted(self.projects.values(), key=lambda project: project.hidden_config().update_date.timestamp(), reverse=True))
+            return tuple(map(projects.__getitem__, sorted(projects, key=update_dates.__getitem__, reverse=True)))
         elif sort == ProjectSort.ASCENT:  # 古い順
-            return tuple(sorted(self.projects.values(), key=lambda project: project.hidden_config().update_date.timestamp(), reverse=False))
-        return tuple(self.projects.values())
+            return tuple(map(projects.__getitem__, sorted(projects, key=update_dates.__getitem__, reverse=False)))
+        return tuple(projects.values())
+
+    def iter_projects(self, pattern: Optional[str] = None, since: Optional[datetime] = None,
+                      until: Optional[datetime] = None, offset: int = 0, limit: Optional[int] = None,
+                      other_path: Iterable[str] = ()) -> Iterator[Project]:
+        """
+        プロジェクトを1つずつ列挙する.list_projectsと同じくベースディレクトリとother_pathの'.prj'を持つフォルダが対象
+        ディレクトリはos.scandirで走査し,全体のリストは作らない
+        :param pattern: プロジェクト名のパターン(fnmatch, 例: '2021_11_26_*')
+        :param since: この日時以降に更新されたプロジェクトのみ
+        :param until: この日時より前に更新されたプロジェクトのみ
+        :param offset: 先頭から読み飛ばす件数
+        :param limit: 最大件数
+        :param other_path:
+        :return:
+        """
+        if limit is not None and limit <= 0:
+            return
+        matched = 0
+        for name, path in self._scan_project_dirs(other_path):
+            if pattern is not None and not fnmatch.fnmatchcase(name, pattern):
+                continue
+            if since is not None or until is not None:
+                update_date = self._update_timestamp(name, path)
+                if since is not None and update_date < since.timestamp():
+                    continue
+                if until is not None and update_date >= until.timestamp():
+                    continue
+            matched += 1
+            if matched <= offset:
+                continue
+            yield self._project_for(name, path)
+            if limit is not None and matched - offset >= limit:
+                return
+
+    def most_recent(self, k: int, pattern: Optional[str] = None, other_path: Iterable[str] = ()) -> List[Project]:
+        """
+        更新日が新しい順にk件のプロジェクトを返す.全件をソートせずにk件のヒープで選ぶ
+        :param k:
+        :param pattern: プロジェクト名のパターン(fnmatch)
+        :param other_path:
+        :return:
+        """
+        entries = ((name, path) for name, path in self._scan_project_dirs(other_path)
+                   if pattern is None or fnmatch.fnmatchcase(name, pattern))
+        recent = heapq.nlargest(k, entries, key=lambda entry: self._update_timestamp(*entry))
+        return [self._project_for(name, path) for name, path in recent]
+
+    @_synchronized
+    def search(self, pattern: Optional[str] = None, prefix: Optional[str] = None, contains: Optional[str] = None,
+               user: Optional[str] = None, maker: Optional[str] = None,
+               since: Optional[datetime] = None, until: Optional[datetime] = None,
+               created_since: Optional[datetime] = None, created_until: Optional[datetime] = None,
+               limit: Optional[int] = None) -> List[Project]:
+        """
+        登録されているプロジェクトをメモリ上のインデックスで検索する.指定した条件を全て満たすものを名前順に返す
+        iter_projectsと異なり.prjもディレクトリも読まない.インデックスは最初の検索時に作り,作成・コピー・削除・更新に合わせて更新する
+        :param pattern: プロジェクト名のパターン(fnmatch, 例: '2021_11_26_*')
+        :param prefix: プロジェクト名の前方一致
+        :param contains: プロジェクト名の部分一致
+        :param user: .prjのuser
+        :param maker: .prjのmaker
+        :param since: この日時以降に更新されたプロジェクトのみ
+        :param until: この日時より前に更新されたプロジェクトのみ
+        :param created_since: この日時以降に作成されたプロジェクトのみ
+        :param created_until: この日時より前に作成されたプロジェクトのみ
+        :param limit: 最大件数
+        :return:
+        """
+        projects = self.projects
+        from app_project_maker.search import SearchQuery
+        query = SearchQuery(prefix, contains, pattern, user, maker, since, until, created_since, created_until)
+        names = [name for name in self.index.search(query) if name in projects]
+        return [projects[name] for name in names[:limit]]
+
+    def _scan_project_dirs(self, other_path: Iterable[str] = ()) -> Iterator[Tuple[str, Path]]:
+        for _, path in scan_projects(self.base_dir_path):
+            path = Path(path)
+            yield path.stem, path
+        for path in map(Path, self.roots.scan(map(str, other_path))):
+            yield path.stem, path
+
+    def root_status(self) -> Dict[str, RootStatus]:
+        """
+        ベースディレクトリ外のプロジェクトを置いているディレクトリごとの,最後の確認の所要時間と状態
+        :return: 親ディレクトリ -> 状態
+        """
+        return self.roots.status()
 
-    def load_projects(self) -> Dict[str, Project]:
-        if os.path.exists(self.PROJECT_CONFIG_PATH):
-            manage_config = ProjectManageConfig.read(self.project_manage_config_path)
+    def _update_timestamp(self, name: str, path: Path) -> float:
+        entry = self.index.get(name)
+        if entry is not None:
+            return entry.update_date
+        meta = ProjectMeta.read(path)
+        self.index.upsert(name, path, meta)
+        return meta.update_date.timestamp()
+
+    @_synchronized
+    def _project_for(self, name: str, path: Path) -> Project:
+        project = self.projects.get(name)
+        if project is not None and project.path == path:
+            return project
+        return self._new_project(path, name)
+
+    @_synchronized
+    def rebuild_index(self, full: bool = True):
+        """
+        .prjからメタデータインデックスを再構築
+        :param full: Trueであれば全ての.prjを読み直す.Falseであれば更新時刻が変わった.prjのみ読み直す
+        :return:
+        """
+        projects = self.projects.path_strings()
+        if full:
+            self.index.rebuild(projects)
         else:
-            manage_config = ProjectManageConfig(set())
+            self.index.sync(projects, verify=True)
+
+    def migrate_layout(self, kind: Union[str, LayoutKind], batch_size: int = 500,
+                       progress: Optional[Callable[[int, int], None]] = None) -> MigrationResult:
+        """
+        既存のプロジェクトを新しいレイアウトの場所に移動する.他のプロセスがプロジェクトを使用中でも実行できる
+        移動はbatch_size件ごとにproject.jsonのロックを取り,同じファイルシステム内のrenameで行う.
+        移行中はlayout.jsonに移行元を記録し,project_pathなどは両方の場所を探す.
+        中断した場合は同じkindで再実行すれば残りを移動する
+        :param kind: 移行先のレイアウト
+        :param batch_size: 1回のロックで移動するプロジェクト数
+        :param progress: (移動済み, 全体)を受け取るコールバック
+        :return:
+        """
+        kind = LayoutKind(kind)
+        result = MigrationResult(kind)
+        start = time_module.perf_counter()
+        with self.projects_lock, self.registry_lock:
+            current = ProjectLayout.read(self.base_dir_path)
+            if current.kind != kind or current.migrating:
+                previous = current.previous if current.kind == kind else current.kind
+                current = replace(current, kind=kind, previous=previous)
+                current.write(self.base_dir_path)
+        self.layout = current
+        if not current.migrating:
+            return result
 
-        project_names, project_path = self.list_projects(list(manage_config.project_list))
+        pending = [(relative, path) for relative, path in scan_projects(self.base_dir_path)
+                   if relative != current.relative_path(os.path.basename(relative))]
+        logger.info(f'Layout Migration: {current.previous.value} -> {kind.value} {len(pending)} projects')
+        for i in range(0, len(pending), batch_size):
+            with self.projects_lock, self.registry_lock, self.batch():
+                for relative, path in pending[i:i + batch_size]:
+                    if self._move_project(relative, path):
+                        result.moved += 1
+                    else:
+                        result.conflicts.append(relative)
+            if progress is not None:
+                progress(min(i + batch_size, len(pending)), len(pending))
 
-        projects: Dict[str, Project] = {name: Project(path) for name, path in zip(project_names, project_path)}
+        with self.projects_lock, self.registry_lock:
+            if not result.conflicts:
+                self.layout = replace(current, previous=None)
+                self.layout.write(self.base_dir_path)
+                # 移行元のシャードディレクトリのうち空になったもの
+                for entry in os.scandir(self.base_dir_path):
+                    if entry.is_dir(follow_symlinks=False) and is_shard_dir(entry.name):
+                        try:
+                            os.rmdir(entry.path)
+                        except OSError:
+                            pass
+            self.save_project()
+            if self._projects is not None:
+                self._projects.relayout(self._layout_relative())
+        result.elapsed = time_module.perf_counter() - start
+        if result.conflicts:
+            logger.warning(f'Layout Migration Conflicts: {result.conflicts}')
+        return result
+
+    def _move_project(self, relative: str, path: str) -> bool:
+        """
+        1つのプロジェクトをレイアウト通りの場所に移動する.projects_lockとregistry_lockを取ってから呼ぶ
+        :return: 移動先が既に存在する場合はFalse
+        """
+        target = self.base_dir_path.joinpath(self.layout.relative_path(os.path.basename(relative)))
+        if target.exists() or target.parent.joinpath(META_HIDDEN_FILE).exists():
+            # 移動先,またはシャードと同じ名前のプロジェクトがある
+            return False
+        name = path_stem(relative)
+        registered = name in self.projects and \
+            os.path.abspath(self.projects.path_string(name)) == os.path.abspath(path)
+        if registered and self.projects.peek(name) is not None:
+            # 遅延している.prjの書き込みは移動前に済ませる
+            self.projects.peek(name).flush()
+        target.parent.mkdir(exist_ok=True)
+        try:
+            os.rename(path, target)
+        except FileNotFoundError:
+            # 他のプロセスが削除・移動した
+            return True
+        if registered:
+            self._relocate_registered(name, target)
+            self.index.move(name, target)
+            self._dirty = True
+        return True
+
+    @_synchronized
+    def load_projects(self) -> ProjectRegistry[Project]:
+        with METRICS.measure(Operation.REGISTRY_LOAD) as measurement, self.registry_lock:
+            manage_config, stat = self._read_registry()
+            measurement.bytes = stat[1] if stat is not None else 0
+        if self._registry_stat is None:
+            self._mark_synced(manage_config, stat)
+        if manage_config is None:
+            manage_config = ProjectManageConfig(set())
 
+        projects = self._new_registry()
+        for name, path in self._scan_registered(manage_config.project_list):
+            projects.add(name, path)
         return projects
 
+    def _scan_registered(self, registered: Iterable[str]) -> Iterator[Tuple[str, str]]:
+        """
+        list_projectsと同じプロジェクトを(名前, パスの文字列)で列挙する.Pathは作らない
+        ベースディレクトリ内で見つかったプロジェクトは,project.jsonのパスでは確認し直さない.
+        それ以外のパスはRootScannerで親ディレクトリごとに並列に確認する
+        :param registered: project.jsonに登録されているパス
+        :return:
+        """
+        found = set()
+        for relative, path in scan_projects(self.base_dir_path):
+            found.add(relative)
+            yield path_stem(relative), path
+        abs_prefix = os.path.join(str(self.base_dir_path.absolute()), '')
+        external = [path for path in registered
+                    if not (path.startswith(abs_prefix) and path[len(abs_prefix):] in found)]
+        for path in self.roots.scan(external):
+            yield path_stem(path), path
+
+    @contextmanager
+    def batch(self) -> Iterator['AppProjectMaker']:
+        """
+        ブロック内のproject.jsonの保存をまとめ,抜けた時に1回だけ書き込む
+        with maker.batch():
+            for name in names:
+                maker.create_project(name)
+        :return:
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            # 例外時もディレクトリは作成済みなので登録内容は保存する
+            if self._batch_depth == 0 and self._dirty:
+                self.save_project()
+
+    @_synchronized
+    def flush(self):
+        """
+        遅延している.prjの書き込みとproject.jsonの保存を実行
+        :return:
+        """
+        # 作成されていないProjectには遅延している書き込みが無い
+        for project in self.projects.materialized():
+            project.flush()
+        if self._dirty:
+            self.save_project()
+
+    @_synchronized
     def save_project(self):
-        logger.debug(f'Save Project:{list(self.projects.keys())}')
-        manage_config = ProjectManageConfig(set(map(lambda p: str(p.path.absolute()), self.projects.values())))
-        manage_config.write(self.project_manage_config_path)
+        """
+        project.jsonを保存.
+        ロックを取ってからproject.jsonを読み直し,前回の読み書き以降にこのインスタンスで追加・削除したプロジェクトだけを反映する.
+        他のプロセスが追加・削除したプロジェクトはself.projectsにも取り込む
+        :return:
+        """
+        if self._batch_depth > 0:
+            self._dirty = True
+            return
+        if not self.base_dir_path.exists():
+            if not self.projects:
+                # remove_all_projectでベースディレクトリごと削除済み
+                self._dirty = False
+                return
+            self.base_dir_path.mkdir(parents=True, exist_ok=True)
+
+        logger.debug(f'Save Project:{len(self.projects)} projects')
+        local = set(self.projects.absolute_paths())
+        with METRICS.measure(Operation.REGISTRY_SAVE) as measurement, self.registry_lock:
+            disk, _ = self._read_registry()
+            if disk is None:
+                merged, generation = local, 1
+            else:
+                added = local - self._registry_paths
+                removed = self._registry_paths - local
+                merged = (disk.project_list - removed) | added
+                generation = disk.generation + 1
+                self._apply_remote_changes(merged)
+            manage_config = ProjectManageConfig(merged, generation)
+            manage_config.write(self.project_manage_config_path, fsync=self.fsync)
+            stat = self._registry_file_stat()
+            measurement.bytes = stat[1]
+            self._mark_synced(manage_config, stat)
+        self._dirty = False
+
+    def registry_changed(self) -> bool:
+        """
+        前回の読み書き以降に他のプロセスがproject.jsonを変更したかどうか(statのみで判定)
+        :return:
+        """
+        return self._registry_file_stat() != self._registry_stat
+
+    @_synchronized
+    def refresh(self, force: bool = False) -> bool:
+        """
+        他のプロセスが追加・削除したプロジェクトをself.projectsに反映
+        :param force: Trueであればproject.jsonのstatが変わっていなくても読み直す
+        :return: 反映する変更があればTrue
+        """
+        if not force and not self.registry_changed():
+            return False
+        with self.registry_lock:
+            disk, stat = self._read_registry()
+            # 他のプロセスがレイアウトを移行した場合
+            layout = ProjectLayout.read(self.base_dir_path)
+        if layout != self.layout:
+            self.layout = layout
+            if self._projects is not None:
+                self._projects.relayout(self._layout_relative())
+        if disk is None or (disk.generation == self._registry_generation and not force):
+            self._registry_stat = stat
+            return False
+        changed = self._apply_remote_changes(disk.project_list)
+        self._mark_synced(disk, stat)
+        return changed
+
+    def _apply_remote_changes(self, registered: Set[str]) -> bool:
+        """
+        他のプロセスによる追加・削除をself.projectsとインデックスに反映
+        :param registered: 反映後に登録されているべきプロジェクトのパス
+        :return:
+        """
+        local = self.projects.absolute_paths()
+        # このインスタンスが知っていて,他のプロセスが削除したもの
+        removed = [name for path, name in local.items() if path in self._registry_paths and path not in registered]
+        added = [p for p in map(Path, registered - local.keys()) if p.joinpath(META_HIDDEN_FILE).exists()]
+        # migrate_layoutで移動されたもの.インデックスは移動したプロセスが更新済み
+        moved = {path.stem: path for path in added if path.stem in removed}
+        for name, path in moved.items():
+            self._relocate_registered(name, path)
+        removed = [name for name in removed if name not in moved]
+        added = [path for path in added if path.stem not in moved]
+        for name in removed:
+            self.projects.pop(name)
+            self.index.remove(name)
+        for path in added:
+            if path.stem not in self.projects:
+                project = self._new_project(path)
+                self.projects[project.name] = project
+                self.index.upsert(project.name, path, project.hidden_config())
+                self._record_usage(project)
+        if removed or added or moved:
+            logger.debug(f'Registry Merged: +{[p.stem for p in added]} -{removed} ~{list(moved)}')
+        return bool(removed or added or moved)
+
+    def _relocate_registered(self, name: str, path: Path):
+        """
+        登録されているプロジェクトのパスを移動先に更新する.作成済みのProjectはそのまま使えるようにする
+        """
+        project = self.projects.peek(name)
+        self.projects.add(name, path)
+        if project is not None:
+            project.relocate(path)
+            self.projects[name] = project
+
+    def watch(self, callback: Optional[ChangeCallback] = None, backend: str = 'auto',
+              interval: float = 1.0) -> ProjectWatcher:
+        """
+        ベースディレクトリの監視を開始し,他のツールが作成・削除したプロジェクトをself.projectsに反映する
+        :param callback: 変更ごとに監視スレッドから呼ばれる
+        :param backend: 'inotify','polling','auto'
+        :param interval: pollingの間隔(秒)
+        :return:
+        """
+        if self.watcher is None:
+            from app_project_maker.watch import ProjectWatcher
+            self.watcher = ProjectWatcher(self, backend=backend, interval=interval).start()
+        if callback is not None:
+            self.watcher.add_callback(callback)
+        return self.watcher
+
+    def unwatch(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+
+    @_synchronized
+    def _watch_names(self) -> List[str]:
+        """
+        ベースディレクトリ内の登録されているプロジェクトの相対パス.監視でイベントを取りこぼした場合に全て確認する
+        """
+        prefix = os.path.join(str(self.base_dir_path.absolute()), '')
+        return [path[len(prefix):] for path in self.projects.absolute_paths() if path.startswith(prefix)]
+
+    @_synchronized
+    def _apply_directory_changes(self, names: Iterable[str]) -> List[ProjectChange]:
+        """
+        ベースディレクトリ直下(とシャードディレクトリ内)の変更されたディレクトリだけを確認してself.projectsを更新
+        :param names: 変更された可能性のあるディレクトリ(ベースディレクトリからの相対パス)
+        :return:
+        """
+        from app_project_maker.watch import ProjectChange, ChangeKind
+        changes = []
+        for name in names:
+            path = self.base_dir_path.joinpath(name)
+            key = path.stem
+            registered = key in self.projects
+            if path.joinpath(META_HIDDEN_FILE).exists():
+                if not registered:
+                    project = self._new_project(path)
+                    self.projects[key] = project
+                    try:
+                        self.index.upsert(key, path, project.hidden_config())
+                        self._record_usage(project)
+                    except FileNotFoundError:
+                        pass
+                    changes.append(ProjectChange(ChangeKind.CREATED, key, path))
+            elif registered and self.projects.path(key).absolute() == path.absolute():
+                self.projects.pop(key)
+                self.index.remove(key)
+                changes.append(ProjectChange(ChangeKind.REMOVED, key, path))
+        return changes
+
+    def _registry_file_stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.project_manage_config_path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _read_registry(self) -> Tuple[Optional[ProjectManageConfig], Optional[Tuple[int, int, int]]]:
+        stat = self._registry_file_stat()
+        if stat is None:
+            return None, None
+        return ProjectManageConfig.read(self.project_manage_config_path), stat
+
+    def _mark_synced(self, manage_config: Optional[ProjectManageConfig], stat: Optional[Tuple[int, int, int]]):
+        self._registry_paths = set(manage_config.project_list) if manage_config else set()
+        self._registry_generation = manage_config.generation if manage_config else 0
+        self._registry_stat = stat
 
     @property
     def project_manage_config_path(self) -> str:
         return str(self.base_dir_path.joinpath(self.PROJECT_CONFIG_PATH))
 
+    def stats(self) -> Dict[str, OperationStats]:
+        """
+        操作(mkdir,.prjの読み書き,project.jsonの読み書き,コピー,削除,コンポーネントの作成・検証など)ごとの
+        回数,エラー数,転送量,処理時間のヒストグラム.プロセス内の全てのAppProjectMakerの合計
+        :return: 操作名 -> 集計
+        """
+        return METRICS.snapshot()
+
+    def metrics_text(self, prefix: str = 'app_project_maker') -> str:
+        """
+        statsをPrometheusのテキスト形式で出力
+        :param prefix: メトリクス名の接頭辞
+        :return:
+        """
+        return METRICS.to_prometheus(prefix)
+
+    @staticmethod
+    def add_metrics_hook(hook: OperationHook):
+        """
+        操作が終わるたびに呼ばれる関数を登録する.操作を行ったスレッドから呼ばれる
+        :param hook:
+        :return:
+        """
+        METRICS.add_hook(hook)
+
+    @staticmethod
+    def remove_metrics_hook(hook: OperationHook):
+        METRICS.remove_hook(hook)
+
     def __del__(self):
-        self.save_project()
+        if getattr(self, '_dirty', False):
+            self.save_project()
@@ -0,0 +1,257 @@
+"""
+プロジェクトをマシン間で移動するためのアーカイブ(tar.gz)
+書き出しはtarをストリームで作成し,一定サイズのブロックごとにスレッドプールでgzipのメンバーとして圧縮する.
+連結したgzipメンバーは通常のgzipとして読めるため,tar -xzfでも展開できる
+"""
+from __future__ import annotations
+
+import gzip
+import os
+import posixpath
+import shutil
+import tarfile
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Callable, Deque, Iterable, List, Optional, Tuple
+
+from app_project_maker.error import ArchiveError, ProjectOverrideError
+from app_project_maker.hidden_project_config import ProjectMeta, SNAPSHOT_FILES
+
+# 圧縮の単位.ブロックごとに独立したgzipメンバーになる
+DEFAULT_BLOCK_SIZE = 4 * 2 ** 20
+IMPORT_DIR_PREFIX = '.import-'
+
+
+@dataclass
+class ArchiveStats:
+    projects: List[str] = field(default_factory=list)
+    files: int = 0
+    # tarの(非圧縮の)サイズ
+    bytes: int = 0
+    # gzipのサイズ
+    compressed_bytes: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def bytes_per_sec(self) -> float:
+        return self.bytes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        return (f'{len(self.projects)} projects {self.files} files '
+                f'{self.bytes / 2 ** 20:.1f} MiB -> {self.compressed_bytes / 2 ** 20:.1f} MiB '
+                f'{self.bytes_per_sec / 2 ** 20:.1f} MiB/s')
+
+
+class ParallelGzipWriter:
+    """
+    書き込まれたデータをblock_sizeごとに並列で圧縮し,順番通りにfileobjへ書き出す
+    圧縮待ちのブロックはworkersの2倍までに制限するため,メモリ使用量は(workers * 2 + 1) * block_size程度
+    :param fileobj: 書き出し先.writeだけを使う
+    :param level: gzipの圧縮レベル
+    :param workers: 圧縮スレッド数.Noneであればcpu数(最大8)
+    :param block_size:
+    """
+
+    def __init__(self, fileobj: BinaryIO, level: int = 6, workers: Optional[int] = None,
+                 block_size: int = DEFAULT_BLOCK_SIZE):
+        self.fileobj = fileobj
+        self.level = level
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.block_size = block_size
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._buffer = bytearray()
+        self._pending: Deque[Future] = deque()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ArchiveCompress')
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        self.bytes_in += len(data)
+        while len(self._buffer) >= self.block_size:
+            self._submit(bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+        return len(data)
+
+    def _submit(self, block: bytes):
+        # zlibは圧縮中にGILを解放するのでスレッドで並列に圧縮できる
+        self._pending.append(self._pool.submit(gzip.compress, block, self.level, mtime=0))
+        while len(self._pending) > self.workers * 2:
+            self._write_next()
+
+    def _write_next(self):
+        member = self._pending.popleft().result()
+        self.fileobj.write(member)
+        self.bytes_out += len(member)
+
+    def close(self):
+        try:
+            if self._buffer:
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+            while self._pending:
+                self._write_next()
+        finally:
+            self._pool.shutdown()
+
+    def abort(self):
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._buffer.clear()
+        self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class _CountingReader:
+    """読み込んだバイト数を数える"""
+
+    def __init__(self, fileobj: BinaryIO):
+        self.fileobj = fileobj
+        self.bytes = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.fileobj.read(size)
+        self.bytes += len(data)
+        return data
+
+
+def write_archive(projects: Iterable[Tuple[str, Path]], fileobj: BinaryIO, level: int = 6,
+                  workers: Optional[int] = None, block_size: int = DEFAULT_BLOCK_SIZE) -> ArchiveStats:
+    """
+    プロジェクトディレクトリをtar.gzとしてfileobjに書き出す.アーカイブ内では'プロジェクト名/...'に配置する
+    :param projects: (プロジェクト名,プロジェクトのパス)
+    :param fileobj: 書き出し先.シークできなくてもよい
+    :param level: gzipの圧縮レベル
+    :param workers: 圧縮スレッド数
+    :param block_size: 圧縮の単位
+    :return:
+    """
+    started = time.monotonic()
+    stats = ArchiveStats()
+
+    def count(info: tarfile.TarInfo) -> Optional[tarfile.TarInfo]:
+        # スナップショットは書き出さない
+        parts = info.name.split('/', 2)
+        if len(parts) > 1 and parts[1] in SNAPSHOT_FILES:
+            return None
+        if info.isfile():
+            stats.files += 1
+        return info
+
+    with ParallelGzipWriter(fileobj, level=level, workers=workers, block_size=block_size) as writer:
+        with tarfile.open(fileobj=writer, mode='w|', format=tarfile.PAX_FORMAT) as tar:
+            for name, path in projects:
+                # プロジェクト間で共有しているファイル(ハードリンク)もプロジェクトごとに実体を格納し,
+                # 1つのプロジェクトだけを取り込めるようにする
+                tar.inodes = {}
+                tar.add(str(path), arcname=name, filter=count)
+                stats.projects.append(name)
+    stats.bytes = writer.bytes_in
+    stats.compressed_bytes = writer.bytes_out
+    stats.elapsed = time.monotonic() - started
+    return stats
+
+
+def _project_of(member: tarfile.TarInfo) -> str:
+    """
+    展開してよいメンバーか確認し,先頭のディレクトリ名(プロジェクト名)を返す
+    :param member:
+    :return:
+    """
+    path = PurePosixPath(member.name)
+    if path.is_absolute() or '..' in path.parts or not path.parts or path.parts[0] in ('.', ''):
+        raise ArchiveError(f'Unsafe Path: {member.name}')
+    if not (member.isfile() or member.isdir() or member.issym() or member.islnk()):
+        raise ArchiveError(f'Unsupported Member: {member.name}')
+    if member.issym():
+        # リンク先がプロジェクトの外を指していないか
+        target = PurePosixPath(posixpath.normpath(posixpath.join(str(path.parent), member.linkname)))
+        if PurePosixPath(member.linkname).is_absolute() or target.parts[:1] != path.parts[:1] or '..' in target.parts:
+            raise ArchiveError(f'Unsafe Link: {member.name} -> {member.linkname}')
+    if member.islnk() and PurePosixPath(member.linkname).parts[:1] != path.parts[:1]:
+        raise ArchiveError(f'Unsafe Link: {member.name} -> {member.linkname}')
+    return path.parts[0]
+
+
+def _restore_meta(path: Path, name: str) -> ProjectMeta:
+    """
+    展開したプロジェクトの.prjの名前を書き換える.無い,または読めない場合は作り直す
+    """
+    try:
+        meta = ProjectMeta.read(path)
+    except (FileNotFoundError, ValueError, TypeError, KeyError):
+        return ProjectMeta.write(path, name)
+    meta.name = name
+    meta.write_current(path)
+    return meta
+
+
+def read_archive(fileobj: BinaryIO, base_dir: Path, name: Optional[str] = None, single: bool = False,
+                 project_path: Optional[Callable[[str], Path]] = None) \
+        -> Tuple[List[Tuple[str, Path, ProjectMeta]], ArchiveStats]:
+    """
+    write_archiveで書き出したアーカイブをbase_dirに展開する
+    一時ディレクトリに展開してから移動するため,途中で失敗してもbase_dirに不完全なプロジェクトは残らない
+    :param fileobj: 読み込み元.シークできなくてもよい
+    :param base_dir: 展開先(AppProjectMakerのベースディレクトリ)
+    :param name: 展開後のプロジェクト名.アーカイブに1つのプロジェクトしか無い場合のみ指定できる
+    :param single: Trueであればプロジェクトが1つだけのアーカイブのみ受け付ける
+    :param project_path: プロジェクト名 -> 展開先のパス(AppProjectMaker.project_path).省略時はbase_dir/プロジェクト名
+    :return: (プロジェクト名,パス,メタデータ)と統計
+    """
+    project_path = project_path or base_dir.joinpath
+    started = time.monotonic()
+    stats = ArchiveStats()
+    single = single or name is not None
+    staging = base_dir.joinpath(f'{IMPORT_DIR_PREFIX}{uuid.uuid4().hex}')
+    extract_args = {'filter': 'data'} if hasattr(tarfile, 'data_filter') else {}
+    names = {}
+    try:
+        staging.mkdir(parents=True)
+        reader = _CountingReader(fileobj)
+        with gzip.GzipFile(fileobj=reader, mode='rb') as gz, tarfile.open(fileobj=gz, mode='r|') as tar:
+            for member in tar:
+                top = _project_of(member)
+                if top not in names:
+                    if single and names:
+                        raise ArchiveError(f'Archive Contains Multiple Projects: {list(names)} {top}')
+                    target = name or top
+                    if project_path(target).exists():
+                        raise ProjectOverrideError(project_path(target))
+                    names[top] = target
+                if member.isfile():
+                    stats.files += 1
+                    stats.bytes += member.size
+                tar.extract(member, staging, **extract_args)
+        if not names:
+            raise ArchiveError('Empty Archive')
+
+        for target in names.values():
+            if project_path(target).exists():
+                raise ProjectOverrideError(project_path(target))
+        imported = []
+        for top, target in names.items():
+            path = project_path(target)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.rename(staging.joinpath(top), path)
+            imported.append((target, path, _restore_meta(path, target)))
+            stats.projects.append(target)
+    except (tarfile.TarError, EOFError, gzip.BadGzipFile) as e:
+        raise ArchiveError(f'Broken Archive: {e!r}') from e
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    stats.compressed_bytes = reader.bytes
+    stats.elapsed = time.monotonic() - started
+    return imported, stats
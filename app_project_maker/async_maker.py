@@ -0,0 +1,285 @@
+"""
+asyncioから使うためのAppProjectMaker
+ディスクI/Oを伴う処理は上限付きのスレッドプールで実行し,イベントループを止めない.
+project.jsonと登録内容(AppProjectMaker.projects)を変更する処理はasyncio.Lockで1つずつ実行する.
+コピーのファイル転送とゴミ箱の削除はロックの外で行うため,長いコピーの間も一覧の取得などは待たされない
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Type, TypeVar, Union
+
+from app_project_maker.app_project_maker import AbstractComponent, AppProjectMaker, BulkCreateResult, \
+    ComponentResult, ComponentSpec, Project
+from app_project_maker.copy_mode import CopyMode, ProgressCallback
+from app_project_maker.error import ProjectOverrideError
+from app_project_maker.hidden_project_config import ProjectMeta
+from app_project_maker.snapshot import RestoreResult, SnapshotInfo
+from app_project_maker.sort import ProjectSort
+
+T = TypeVar('T')
+
+
+class AsyncProject:
+    """
+    Projectの非同期版.同期版はprojectで取り出せる
+    """
+
+    def __init__(self, project: Project, maker: AsyncAppProjectMaker):
+        self.project = project
+        self._maker = maker
+
+    @property
+    def name(self) -> str:
+        return self.project.name
+
+    @property
+    def path(self) -> Path:
+        return self.project.path
+
+    @property
+    def components(self) -> Dict[str, AbstractComponent]:
+        return self.project.components
+
+    async def hidden_config(self) -> ProjectMeta:
+        return await self._maker._run(self.project.hidden_config)
+
+    async def update_config_date(self, time: Optional[datetime] = None) -> None:
+        await self._maker._run(self.project.update_config_date, time)
+
+    async def flush(self) -> None:
+        await self._maker._run(self.project.flush)
+
+    async def add_component(self, resource_path: str, source_name: str, new_project: Type[AbstractComponent],
+                            **kwargs):
+        return await self._maker._run(self.project.add_component, resource_path, source_name, new_project, **kwargs)
+
+    async def add_components(self, specs: Iterable[Union[ComponentSpec, tuple]], max_workers: Optional[int] = None) \
+            -> Dict[str, ComponentResult]:
+        return await self._maker._run(self.project.add_components, list(specs), max_workers=max_workers)
+
+    async def snapshot(self, label: Optional[str] = None, checksum: bool = False) -> SnapshotInfo:
+        return await self._maker._run(self.project.snapshot, label, checksum)
+
+    async def restore(self, snapshot_id: str) -> RestoreResult:
+        return await self._maker._run(self.project.restore, snapshot_id)
+
+    def __repr__(self):
+        return f'AsyncProject({self.name!r}, {str(self.path)!r})'
+
+
+class AsyncAppProjectMaker:
+    """
+    maker = await AsyncAppProjectMaker.open(cur_dir, base_dir_path='projects')
+    project = await maker.create_project('NewCompany')
+    await maker.copy_project('Copied', project)
+    await maker.aclose()
+    """
+
+    def __init__(self, maker: AppProjectMaker, max_workers: int = 4, executor: Optional[Executor] = None):
+        """
+        イベントループ内で作る場合はopenを使う(AppProjectMakerの作成もディスクI/Oを伴うため)
+        :param maker:
+        :param max_workers: 同時に実行するディスクI/Oの数
+        :param executor: 実行に使うExecutor.省略時はmax_workersのThreadPoolExecutorを作成する
+        """
+        self.maker = maker
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=max_workers,
+                                                        thread_name_prefix='AsyncAppProjectMaker')
+        # Executorの待ち行列も上限を設け,待っている間はキャンセルできるようにする
+        self._slots = asyncio.Semaphore(max_workers)
+        self._lock = asyncio.Lock()
+        # コピー中のプロジェクト名.同じ名前へのコピーを同時に始めない
+        self._reserved: Set[str] = set()
+
+    @classmethod
+    async def open(cls, cur_dir: str, base_dir_path: str = '.prj', max_workers: int = 4,
+                   executor: Optional[Executor] = None, **kwargs) -> AsyncAppProjectMaker:
+        """
+        AppProjectMakerを作成し,project.jsonを読み込む
+        :param cur_dir:
+        :param base_dir_path:
+        :param max_workers:
+        :param executor:
+        :param kwargs: AppProjectMakerのその他の引数
+        :return:
+        """
+        def load() -> AppProjectMaker:
+            maker = AppProjectMaker(cur_dir=cur_dir, base_dir_path=base_dir_path, **kwargs)
+            # project.jsonは最初のアクセスで読み込まれるので,ここで読み込んでおく
+            maker.projects
+            return maker
+
+        loop = asyncio.get_running_loop()
+        own_executor = executor is None
+        executor = executor or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='AsyncAppProjectMaker')
+        try:
+            maker = await loop.run_in_executor(executor, load)
+        except BaseException:
+            if own_executor:
+                executor.shutdown(wait=False)
+            raise
+        self = cls(maker, max_workers=max_workers, executor=executor)
+        self._own_executor = own_executor
+        return self
+
+    async def _run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    def _registered(self, project_name: str) -> bool:
+        # 最初のアクセスではproject.jsonを読み込むため,スレッドプールから呼ぶ
+        return project_name in self.maker.projects
+
+    async def _locked(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """
+        self.maker.projectsを読み書きする処理はロックを取って1つずつ実行する
+        """
+        async with self._lock:
+            return await self._run_to_completion(fn, *args, **kwargs)
+
+    async def _run_to_completion(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """
+        キャンセルされても実行中の処理が終わるまで待ってから戻る.
+        登録内容の変更が途中の状態で次の変更を始めないようにする
+        """
+        future = asyncio.ensure_future(self._run(fn, *args, **kwargs))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            await asyncio.wait([future])
+            raise
+
+    def _wrap(self, project: Project) -> AsyncProject:
+        return AsyncProject(project, self)
+
+    async def get_project(self, project_name: str) -> AsyncProject:
+        """
+        AppProjectMaker[project_name]と同じ
+        """
+        return self._wrap(await self._locked(self.maker.__getitem__, project_name))
+
+    async def exist_project(self, project_name: str) -> bool:
+        return await self._run(self.maker.exist_project, project_name)
+
+    async def list_projects(self, sort: ProjectSort = ProjectSort.NONE) -> List[AsyncProject]:
+        """
+        AppProjectMaker.list_projects_rawと同じ
+        """
+        projects = await self._locked(self.maker.list_projects_raw, sort)
+        return [self._wrap(project) for project in projects]
+
+    async def most_recent(self, k: int, pattern: Optional[str] = None) -> List[AsyncProject]:
+        projects = await self._locked(self.maker.most_recent, k, pattern)
+        return [self._wrap(project) for project in projects]
+
+    async def create_project(self, project_name: str, exist_ok: bool = True) -> AsyncProject:
+        return self._wrap(await self._locked(self.maker.create_project, project_name, exist_ok))
+
+    async def create_projects(self, project_names: Iterable[str], exist_ok: bool = True,
+                              workers: Optional[int] = None) -> BulkCreateResult:
+        return await self._locked(self.maker.create_projects, list(project_names), exist_ok, workers)
+
+    async def open_project(self, project_name: str) -> AsyncProject:
+        return self._wrap(await self._locked(self.maker.open_project, project_name))
+
+    async def copy_project(self, project_name: str, src_project: Union[AsyncProject, Project],
+                           mode: CopyMode = CopyMode.COPY, workers: Optional[int] = None,
+                           progress: Optional[ProgressCallback] = None) -> AsyncProject:
+        """
+        AppProjectMaker.copy_projectと同じ.ファイルのコピーはロックの外で行う
+        キャンセルするとファイル単位でコピーを中断し,コピー途中のディレクトリを削除してからCancelledErrorを投げる
+        :param project_name:
+        :param src_project:
+        :param mode:
+        :param workers:
+        :param progress: コピーを実行するスレッドから呼ばれる
+        :return:
+        """
+        if isinstance(src_project, AsyncProject):
+            src_project = src_project.project
+        async with self._lock:
+            if project_name in self._reserved or await self._run(self._registered, project_name):
+                raise ProjectOverrideError(self.maker.base_dir_path.joinpath(project_name))
+            self._reserved.add(project_name)
+        try:
+            cancel = threading.Event()
+            future = asyncio.ensure_future(self._run(self.maker._copy_project_files, project_name, src_project,
+                                                     mode, workers, progress, cancel))
+            try:
+                new_path = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                cancel.set()
+                # コピーが止まり,途中のディレクトリがゴミ箱に移動されるまで待つ
+                await asyncio.wait([future])
+                raise
+            return self._wrap(await self._locked(self.maker._register_copy, project_name, new_path))
+        finally:
+            self._reserved.discard(project_name)
+
+    async def remove_project(self, project: Union[str, AsyncProject, Project], wait: bool = False) -> None:
+        """
+        AppProjectMaker.remove_projectと同じ.登録の解除とゴミ箱への移動はすぐに終わり,中身はバックグラウンドで削除される
+        :param project:
+        :param wait: Trueであれば中身の削除が終わるまで待つ.待っている間にキャンセルしても削除は続く
+        :return:
+        """
+        if isinstance(project, AsyncProject):
+            project = project.project
+        await self._locked(self.maker.remove_project, project)
+        if wait:
+            await self.wait_deletions()
+
+    async def remove_all_project(self, wait: bool = False) -> None:
+        await self._locked(self.maker.remove_all_project)
+        if wait:
+            await self.wait_deletions()
+
+    async def wait_deletions(self, poll_interval: float = 0.05) -> None:
+        """
+        バックグラウンドの削除が全て終わるまで待つ.スレッドを占有しないように短い間隔で確認する
+        :param poll_interval: 秒
+        :return:
+        """
+        while not await self._run(self.maker.wait_deletions, 0):
+            await asyncio.sleep(poll_interval)
+
+    async def refresh(self, force: bool = False) -> bool:
+        return await self._locked(self.maker.refresh, force)
+
+    async def flush(self) -> None:
+        await self._locked(self.maker.flush)
+
+    async def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """
+        このクラスに無い操作を,登録内容の変更と競合しないように実行する
+        await maker.run(maker.maker.export_project, 'NewCompany', fp)
+        """
+        return await self._locked(fn, *args, **kwargs)
+
+    async def aclose(self) -> None:
+        """
+        遅延している書き込みを保存し,作成したExecutorを終了する
+        :return:
+        """
+        try:
+            await self.flush()
+        finally:
+            if self._own_executor:
+                self._executor.shutdown(wait=False)
+
+    async def __aenter__(self) -> AsyncAppProjectMaker:
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    def __repr__(self):
+        return f'AsyncAppProjectMaker({str(self.maker.base_dir_path)!r})'
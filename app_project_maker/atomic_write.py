@@ -0,0 +1,69 @@
+"""
+書き込み途中でプロセスが落ちても壊れたファイルを残さないための書き込み関数
+同じディレクトリの一時ファイルに書き込んでからrenameで置き換える
+"""
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional, Union
+
+
+def _fsync_directory(directory: str):
+    # renameをディスクに反映させるためにディレクトリもfsyncする(Windowsでは不可)
+    if os.name != 'posix':
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write_text(path: Union[str, Path], text: str, fsync: bool = False, encoding: str = 'UTF-8'):
+    """
+    ファイルをアトミックに書き換える
+    :param path: 書き込み先
+    :param text: 書き込む内容
+    :param fsync: Trueであればrename前にデータを,rename後にディレクトリをfsyncする
+    :param encoding:
+    :return:
+    """
+    atomic_write_bytes(path, text.encode(encoding), fsync=fsync)
+
+
+def atomic_write_bytes(path: Union[str, Path], data: bytes, fsync: bool = False, mode: Optional[int] = None):
+    """
+    ファイルをアトミックに書き換える.既存のファイルは書き換えずに新しいファイルで置き換えるため,
+    ハードリンクで共有しているファイル(ブロブ,HARDLINKコピー)の他のリンクは変更されない
+    :param path: 書き込み先
+    :param data: 書き込む内容
+    :param fsync: Trueであればrename前にデータを,rename後にディレクトリをfsyncする
+    :param mode: パーミッション.省略時は既存のファイルと同じ(無ければ0o644)
+    :return:
+    """
+    path = os.path.abspath(os.fspath(path))
+    directory = os.path.dirname(path)
+    if mode is None:
+        try:
+            mode = os.stat(path).st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o644
+
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(path)}.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(data)
+            if fsync:
+                fp.flush()
+                os.fsync(fp.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    if fsync:
+        _fsync_directory(directory)
@@ -0,0 +1,261 @@
+"""
+コンポーネントのリソース(元動画,モデルの重みなど)をハッシュで管理し,プロジェクト間で重複して保存しないためのストア
+ストアにはベースディレクトリ/.blobs/<sha256の先頭2文字>/<sha256>として1つだけ保存し,プロジェクト内のファイルはそのハードリンクにする.
+ハードリンク数-1がそのブロブを参照しているファイル数になるため,参照数を別に保存する必要はない
+
+プロジェクトごとに登録したファイルとハッシュを.blobs.jsonに保存し,プロジェクトの削除後に参照の無くなったブロブを解放する.
+ブロブは他のプロジェクトと共有しているため読み取り専用にする.書き換える場合はdetachで独立したファイルに戻す
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import stat
+import threading
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+from app_project_maker import codec
+from app_project_maker.atomic_write import atomic_write_text
+from app_project_maker.codec import LazyDataClassJsonMixin
+from app_project_maker.file_lock import FileLock
+from app_project_maker.log import logger
+
+BLOB_DIR = '.blobs'
+BLOB_MANIFEST_FILE = '.blobs.json'
+_HASH_CHUNK = 2 ** 20
+_READ_ONLY = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+
+
+@dataclass()
+class BlobManifest(LazyDataClassJsonMixin):
+    """
+    プロジェクトディレクトリからの相対パス(/区切り) -> ブロブのハッシュ
+    """
+    entries: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def manifest_file_path(cls, directory_path: Union[str, Path]) -> str:
+        return os.path.join(directory_path, BLOB_MANIFEST_FILE)
+
+    @classmethod
+    def read(cls, directory_path: Union[str, Path]) -> BlobManifest:
+        try:
+            with open(cls.manifest_file_path(directory_path), 'r', encoding='UTF-8') as fp:
+                return codec.loads(BlobManifest, fp.read())
+        except FileNotFoundError:
+            return BlobManifest()
+
+    def write(self, directory_path: Union[str, Path]):
+        atomic_write_text(self.manifest_file_path(directory_path), codec.dumps(self))
+
+
+@dataclass
+class BlobReport:
+    """
+    ストアの使用状況.logical_bytesはプロジェクトごとにコピーした場合のサイズ
+    """
+    blobs: int = 0
+    references: int = 0
+    # 参照の無いブロブ(gcで削除される)
+    unreferenced: int = 0
+    stored_bytes: int = 0
+    logical_bytes: int = 0
+
+    @property
+    def saved_bytes(self) -> int:
+        return max(0, self.logical_bytes - self.stored_bytes)
+
+    def __str__(self):
+        return (f'{self.blobs} blobs {self.references} references {self.unreferenced} unreferenced '
+                f'{self.stored_bytes / 2 ** 20:.1f} MiB stored '
+                f'{self.saved_bytes / 2 ** 20:.1f} MiB saved')
+
+
+@dataclass
+class GcResult:
+    removed: List[str] = field(default_factory=list)
+    freed_bytes: int = 0
+
+
+def hash_file(path: Union[str, Path]) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(_HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BlobStore:
+    """
+    :param root: ストアのディレクトリ.プロジェクトと同じファイルシステム上にあること
+    """
+
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root)
+        # 登録と解放が競合しないようにプロセス間でロックする
+        self.lock = FileLock(self.root.joinpath('.lock'))
+        self._manifest_lock = threading.Lock()
+
+    def blob_path(self, digest: str) -> Path:
+        return self.root.joinpath(digest[:2], digest)
+
+    def add(self, project_path: Union[str, Path], file_path: Union[str, Path]) -> str:
+        """
+        ファイルをストアに登録し,プロジェクト内のファイルをブロブへのハードリンクに置き換える
+        :param project_path: ファイルを持つプロジェクトのディレクトリ
+        :param file_path: 登録するファイル
+        :return: ハッシュ
+        """
+        digest = self._link(Path(file_path))
+        self._update_manifest(project_path, {self._relative(project_path, file_path): digest})
+        return digest
+
+    def add_tree(self, project_path: Union[str, Path], directory: Union[str, Path]) -> Dict[str, str]:
+        """
+        ディレクトリ以下の全てのファイルを登録
+        :return: 相対パス -> ハッシュ
+        """
+        added = {}
+        for root, _, file_names in os.walk(directory):
+            for file_name in file_names:
+                path = Path(root, file_name)
+                added[self._relative(project_path, path)] = self._link(path)
+        self._update_manifest(project_path, added)
+        return added
+
+    def _link(self, file_path: Path) -> str:
+        digest = hash_file(file_path)
+        blob = self.blob_path(digest)
+        with self.lock:
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            if not blob.exists():
+                # 最初の1つはファイル自体をストアに入れる
+                os.link(file_path, blob)
+                os.chmod(blob, _READ_ONLY)
+            elif not os.path.samefile(blob, file_path):
+                tmp_path = file_path.with_name(f'.{file_path.name}.{uuid.uuid4().hex}.tmp')
+                os.link(blob, tmp_path)
+                os.replace(tmp_path, file_path)
+        return digest
+
+    def detach(self, project_path: Union[str, Path], file_path: Union[str, Path]):
+        """
+        ブロブへのリンクを独立したファイルに戻して書き換えられるようにする
+        :param project_path:
+        :param file_path:
+        :return:
+        """
+        file_path = Path(file_path)
+        tmp_path = file_path.with_name(f'.{file_path.name}.{uuid.uuid4().hex}.tmp')
+        shutil.copyfile(file_path, tmp_path)
+        shutil.copystat(file_path, tmp_path)
+        os.chmod(tmp_path, os.stat(tmp_path).st_mode | stat.S_IWUSR)
+        os.replace(tmp_path, file_path)
+        self._update_manifest(project_path, {self._relative(project_path, file_path): None})
+
+    def forget(self, project_path: Union[str, Path], file_path: Union[str, Path]):
+        """
+        ファイルをマニフェストから外す.ファイル自体は変更しない(別のファイルで置き換えた後に呼ぶ)
+        :param project_path:
+        :param file_path:
+        :return:
+        """
+        relative = self._relative(project_path, file_path)
+        if relative in BlobManifest.read(project_path).entries:
+            self._update_manifest(project_path, {relative: None})
+
+    def digests(self, project_path: Union[str, Path]) -> List[str]:
+        """
+        プロジェクトが参照しているブロブのハッシュ
+        """
+        return sorted(set(BlobManifest.read(project_path).entries.values()))
+
+    def references(self, digest: str) -> int:
+        """
+        ブロブを参照しているファイル数
+        """
+        try:
+            return os.stat(self.blob_path(digest)).st_nlink - 1
+        except FileNotFoundError:
+            return 0
+
+    def release(self, digests: Iterable[str]) -> GcResult:
+        """
+        参照が無くなったブロブを削除する.プロジェクトの削除後に呼ぶ
+        :param digests:
+        :return:
+        """
+        result = GcResult()
+        with self.lock:
+            for digest in digests:
+                self._remove_if_unreferenced(digest, result)
+        return result
+
+    def gc(self) -> GcResult:
+        """
+        ストア全体から参照の無いブロブを削除する
+        :return:
+        """
+        result = GcResult()
+        with self.lock:
+            for blob in list(self._blobs()):
+                self._remove_if_unreferenced(blob.name, result)
+        if result.removed:
+            logger.info(f'Blob GC: {len(result.removed)} blobs {result.freed_bytes / 2 ** 20:.1f} MiB')
+        return result
+
+    def report(self) -> BlobReport:
+        report = BlobReport()
+        for blob in self._blobs():
+            try:
+                st = blob.stat()
+            except FileNotFoundError:
+                continue
+            references = st.st_nlink - 1
+            report.blobs += 1
+            report.references += references
+            report.unreferenced += references == 0
+            report.stored_bytes += st.st_size
+            report.logical_bytes += st.st_size * references
+        return report
+
+    def _remove_if_unreferenced(self, digest: str, result: GcResult):
+        blob = self.blob_path(digest)
+        try:
+            st = blob.stat()
+        except FileNotFoundError:
+            return
+        if st.st_nlink > 1:
+            return
+        blob.unlink()
+        result.removed.append(digest)
+        result.freed_bytes += st.st_size
+        try:
+            blob.parent.rmdir()
+        except OSError:
+            pass
+
+    def _blobs(self) -> Iterator[Path]:
+        if not self.root.is_dir():
+            return
+        for prefix in self.root.iterdir():
+            if prefix.is_dir():
+                yield from (blob for blob in prefix.iterdir() if not blob.name.startswith('.'))
+
+    def _update_manifest(self, project_path: Union[str, Path], entries: Dict[str, Optional[str]]):
+        with self._manifest_lock:
+            manifest = BlobManifest.read(project_path)
+            for relative, digest in entries.items():
+                if digest is None:
+                    manifest.entries.pop(relative, None)
+                else:
+                    manifest.entries[relative] = digest
+            manifest.write(project_path)
+
+    @staticmethod
+    def _relative(project_path: Union[str, Path], file_path: Union[str, Path]) -> str:
+        return Path(os.path.relpath(file_path, project_path)).as_posix()
@@ -0,0 +1,287 @@
+"""
+永続化するdataclass(ProjectMeta,ProjectManageConfig,ProjectConfigなど)のjsonコーデック
+
+dataclasses_jsonは型情報をエンコード・デコードのたびに解析するため,多数のプロジェクトを読み込むと遅い.
+CompiledCodecはクラスごとに型ヒントから変換関数を一度だけ作り,orjsonがインストールされていればそれを使う.
+どちらのコーデックでも書き込まれるファイルはバイト単位で同じになる
+"""
+from __future__ import annotations
+
+import json
+import math
+import os
+import typing
+from dataclasses import fields, is_dataclass
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Any, Callable, Dict, Optional, Type, TypeVar, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+T = TypeVar('T')
+
+Converter = Callable[[Any], Any]
+
+
+class LazyDataClassJsonMixin:
+    """
+    dataclasses_jsonの@dataclass_jsonと同じto_json/from_json/to_dict/from_dict/schemaを提供するmixin.
+    dataclasses_json(とmarshmallow)はこれらが最初に呼ばれた時点で読み込む
+    """
+    dataclass_json_config = None
+
+    def to_json(self, *args, **kwargs) -> str:
+        from dataclasses_json import DataClassJsonMixin
+        return DataClassJsonMixin.to_json(self, *args, **kwargs)
+
+    @classmethod
+    def from_json(cls, *args, **kwargs):
+        from dataclasses_json import DataClassJsonMixin
+        return DataClassJsonMixin.from_json.__func__(cls, *args, **kwargs)
+
+    def to_dict(self, *args, **kwargs) -> Dict[str, Any]:
+        from dataclasses_json import DataClassJsonMixin
+        return DataClassJsonMixin.to_dict(self, *args, **kwargs)
+
+    @classmethod
+    def from_dict(cls, *args, **kwargs):
+        from dataclasses_json import DataClassJsonMixin
+        return DataClassJsonMixin.from_dict.__func__(cls, *args, **kwargs)
+
+    @classmethod
+    def schema(cls, *args, **kwargs):
+        from dataclasses_json import DataClassJsonMixin
+        return DataClassJsonMixin.schema.__func__(cls, *args, **kwargs)
+
+
+class Codec:
+    """jsonコーデックの基底クラス"""
+    name = ''
+
+    def encode(self, obj: Any, indent: Optional[int] = 2) -> str:
+        raise NotImplementedError()
+
+    def decode(self, cls: Type[T], text: Union[str, bytes]) -> T:
+        raise NotImplementedError()
+
+
+class DataclassesJsonCodec(Codec):
+    """dataclasses_jsonのto_json/from_jsonをそのまま使用する"""
+    name = 'dataclasses_json'
+
+    def encode(self, obj: Any, indent: Optional[int] = 2) -> str:
+        return obj.to_json(indent=indent, ensure_ascii=False)
+
+    def decode(self, cls: Type[T], text: Union[str, bytes]) -> T:
+        return cls.from_json(text)
+
+
+def _local_tz():
+    # dataclasses_jsonと同じく,デコード時点のローカルタイムゾーンを使用する
+    return datetime.now(timezone.utc).astimezone().tzinfo
+
+
+def _orjson_compatible(value: Any) -> bool:
+    """
+    orjsonの出力がjson.dumps(indent=2, ensure_ascii=False)と一致する値かどうか
+    指数表記になる浮動小数点数と64bitを超える整数は表記が異なる
+    """
+    if isinstance(value, str) or value is None or isinstance(value, bool):
+        return True
+    if isinstance(value, float):
+        return value == 0.0 or (math.isfinite(value) and 1e-4 <= abs(value) < 1e16)
+    if isinstance(value, int):
+        return -2 ** 63 <= value < 2 ** 64
+    if isinstance(value, list):
+        return all(_orjson_compatible(v) for v in value)
+    if isinstance(value, dict):
+        return all(isinstance(k, str) and _orjson_compatible(v) for k, v in value.items())
+    return False
+
+
+class CompiledCodec(Codec):
+    """
+    クラスごとに型ヒントから作った変換関数を使うコーデック
+    :param backend: 'json','orjson','auto'(orjsonがあれば使用)
+    """
+    name = 'compiled'
+
+    def __init__(self, backend: str = 'auto'):
+        if backend == 'auto':
+            backend = 'orjson' if orjson is not None else 'json'
+        if backend == 'orjson' and orjson is None:
+            raise ImportError('orjson is not installed')
+        self.backend = backend
+        self._encoders: Dict[type, Converter] = {}
+        self._decoders: Dict[type, Converter] = {}
+
+    def to_dict(self, obj: Any) -> Dict[str, Any]:
+        return self.encoder(type(obj))(obj)
+
+    def from_dict(self, cls: Type[T], value: Dict[str, Any]) -> T:
+        return self.decoder(cls)(value)
+
+    def encode(self, obj: Any, indent: Optional[int] = 2) -> str:
+        value = self.to_dict(obj)
+        if self.backend == 'orjson' and indent == 2 and _orjson_compatible(value):
+            return orjson.dumps(value, option=orjson.OPT_INDENT_2).decode('UTF-8')
+        return json.dumps(value, indent=indent, ensure_ascii=False)
+
+    def decode(self, cls: Type[T], text: Union[str, bytes]) -> T:
+        value = orjson.loads(text) if self.backend == 'orjson' else json.loads(text)
+        return self.decoder(cls)(value)
+
+    def encoder(self, cls: type) -> Converter:
+        encoder = self._encoders.get(cls)
+        if encoder is None:
+            encoder = self._encoders[cls] = self._compile_encoder(cls)
+        return encoder
+
+    def decoder(self, cls: type) -> Converter:
+        decoder = self._decoders.get(cls)
+        if decoder is None:
+            decoder = self._decoders[cls] = self._compile_decoder(cls)
+        return decoder
+
+    def _compile_encoder(self, cls: type) -> Converter:
+        hints = typing.get_type_hints(cls)
+        converters = [(f.name, self._value_encoder(hints.get(f.name, Any))) for f in fields(cls)]
+
+        def encode(obj):
+            return {name: convert(getattr(obj, name)) for name, convert in converters}
+
+        return encode
+
+    def _compile_decoder(self, cls: type) -> Converter:
+        hints = typing.get_type_hints(cls)
+        converters = [(f.name, self._value_decoder(hints.get(f.name, Any)))
+                      for f in fields(cls) if f.init]
+
+        def decode(value):
+            if isinstance(value, cls):
+                return value
+            kwargs = {}
+            for name, convert in converters:
+                if name in value:
+                    kwargs[name] = convert(value[name])
+            # 必須フィールドが無い場合はdataclassのTypeErrorになる
+            return cls(**kwargs)
+
+        return decode
+
+    def _value_encoder(self, tp: Any) -> Converter:
+        # 型に依らずdataclasses_jsonと同じ変換を行う.型ヒントは分岐を減らすために使う
+        origin = typing.get_origin(tp)
+        if tp in (str, int, float, bool):
+            return _encode_any
+        if tp is datetime:
+            return _encode_datetime
+        if is_dataclass(tp):
+            encode_dataclass = self.encoder(tp)
+            return lambda v: None if v is None else encode_dataclass(v)
+        if origin in (list, set, frozenset, tuple):
+            args = [a for a in typing.get_args(tp) if a is not Ellipsis]
+            item = self._value_encoder(args[0]) if len(set(args)) == 1 else _encode_any
+            return lambda v: None if v is None else [item(i) for i in v]
+        return _encode_any
+
+    def _value_decoder(self, tp: Any) -> Converter:
+        origin = typing.get_origin(tp)
+        args = typing.get_args(tp)
+        if tp is Any:
+            return _identity
+        if origin is Union:
+            not_none = [a for a in args if a is not type(None)]
+            if len(not_none) == 1:
+                inner = self._value_decoder(not_none[0])
+                return lambda v: None if v is None else inner(v)
+            return _identity
+        if tp is datetime:
+            return _decode_datetime
+        if tp in (str, int, float, bool):
+            return lambda v: v if isinstance(v, tp) else tp(v)
+        if isinstance(tp, type) and issubclass(tp, Enum):
+            return lambda v: v if isinstance(v, tp) else tp(v)
+        if is_dataclass(tp):
+            return self.decoder(tp)
+        if origin in (list, set, frozenset):
+            item = self._value_decoder(args[0]) if args else _identity
+            return lambda v: None if v is None else origin(item(i) for i in v)
+        if origin is tuple:
+            if not args:
+                return lambda v: None if v is None else tuple(v)
+            if len(args) == 2 and args[1] is Ellipsis:
+                item = self._value_decoder(args[0])
+                return lambda v: None if v is None else tuple(item(i) for i in v)
+            items = [self._value_decoder(a) for a in args]
+            return lambda v: None if v is None else tuple(convert(i) for convert, i in zip(items, v))
+        if origin is dict:
+            key = self._value_decoder(args[0]) if args else _identity
+            item = self._value_decoder(args[1]) if args else _identity
+            return lambda v: None if v is None else {key(k): item(i) for k, i in v.items()}
+        return _identity
+
+
+def _identity(v):
+    return v
+
+
+def _encode_datetime(v):
+    return v.timestamp() if isinstance(v, datetime) else _encode_any(v)
+
+
+def _decode_datetime(v):
+    if v is None or isinstance(v, datetime):
+        return v
+    return datetime.fromtimestamp(v, tz=_local_tz())
+
+
+def _encode_any(v):
+    if v is None or isinstance(v, (str, int, float, bool)):
+        return v
+    if isinstance(v, datetime):
+        return v.timestamp()
+    if isinstance(v, Enum):
+        return v.value
+    if is_dataclass(v):
+        return {f.name: _encode_any(getattr(v, f.name)) for f in fields(v)}
+    if isinstance(v, dict):
+        return {_encode_any(k): _encode_any(i) for k, i in v.items()}
+    if isinstance(v, (list, tuple, set, frozenset)):
+        return [_encode_any(i) for i in v]
+    return v
+
+
+CODECS: Dict[str, Callable[[], Codec]] = {
+    DataclassesJsonCodec.name: DataclassesJsonCodec,
+    CompiledCodec.name: CompiledCodec,
+}
+
+_codec: Codec = CODECS[os.environ.get('APP_PROJECT_MAKER_CODEC', CompiledCodec.name)]()
+
+
+def get_codec() -> Codec:
+    return _codec
+
+
+def set_codec(codec: Union[str, Codec]) -> Codec:
+    """
+    永続化に使用するコーデックを変更
+    :param codec: コーデックまたはCODECSの名前
+    :return: 変更前のコーデック
+    """
+    global _codec
+    previous = _codec
+    _codec = CODECS[codec]() if isinstance(codec, str) else codec
+    return previous
+
+
+def dumps(obj: Any, indent: Optional[int] = 2) -> str:
+    return _codec.encode(obj, indent=indent)
+
+
+def loads(cls: Type[T], text: Union[str, bytes]) -> T:
+    return _codec.decode(cls, text)
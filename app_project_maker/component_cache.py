@@ -0,0 +1,102 @@
+"""
+AbstractComponent.valid()の結果をリソースのフィンガープリントと共にプロジェクトディレクトリに保存するキャッシュ
+リソースが変更されていなければ,次にプロジェクトを開いた時にvalid()を呼ばない
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Union
+
+from app_project_maker import codec
+from app_project_maker.codec import LazyDataClassJsonMixin
+from app_project_maker.atomic_write import atomic_write_text
+
+COMPONENT_CACHE_FILE = '.component_cache.json'
+
+
+def stat_fingerprint(base_path: Union[str, Path], files: Iterable[Union[str, Path]]) -> str:
+    """
+    ファイルの相対パス,サイズ,更新時刻からフィンガープリントを作成.ファイルの中身は読まない
+    :param base_path: 相対パスの基準
+    :param files:
+    :return:
+    """
+    digest = hashlib.sha1()
+    for file_path in sorted(map(str, files)):
+        try:
+            st = os.stat(file_path)
+        except FileNotFoundError:
+            continue
+        digest.update(f'{os.path.relpath(file_path, base_path)}\0{st.st_size}\0{st.st_mtime_ns}\n'.encode('UTF-8'))
+    return digest.hexdigest()
+
+
+@dataclass()
+class ValidationEntry(LazyDataClassJsonMixin):
+    # コンポーネントのクラス名.クラスが変わった場合はキャッシュを使わない
+    component: str
+    fingerprint: str
+    valid: bool
+
+
+@dataclass()
+class ComponentValidationCache(LazyDataClassJsonMixin):
+    """
+    コンポーネントのディレクトリ名 -> 最後の検証結果
+    """
+    entries: Dict[str, ValidationEntry] = field(default_factory=dict)
+
+    @classmethod
+    def cache_file_path(cls, directory_path: Union[str, Path]) -> str:
+        return os.path.join(directory_path, COMPONENT_CACHE_FILE)
+
+    @classmethod
+    def read(cls, directory_path: Union[str, Path]) -> ComponentValidationCache:
+        try:
+            with open(cls.cache_file_path(directory_path), 'r', encoding='UTF-8') as fp:
+                return codec.loads(ComponentValidationCache, fp.read())
+        except (FileNotFoundError, ValueError, TypeError, AttributeError):
+            # 壊れたキャッシュは無視して作り直す
+            return ComponentValidationCache()
+
+    def write(self, directory_path: Union[str, Path]):
+        atomic_write_text(self.cache_file_path(directory_path), codec.dumps(self))
+
+
+class ComponentValidator:
+    """
+    プロジェクトごとの検証キャッシュ.add_componentsから並列に呼ばれる
+    """
+
+    def __init__(self, project_path: Path):
+        self.project_path = project_path
+        self._cache: Optional[ComponentValidationCache] = None
+        self._lock = threading.Lock()
+
+    def validate(self, component) -> tuple:
+        """
+        :param component: AbstractComponent
+        :return: (valid()の結果, キャッシュを使用したか)
+        """
+        if not component.cache_validation:
+            return component.valid(), False
+
+        name = component.resource_name
+        kind = f'{type(component).__module__}.{type(component).__qualname__}'
+        fingerprint = component.fingerprint()
+        with self._lock:
+            if self._cache is None:
+                self._cache = ComponentValidationCache.read(self.project_path)
+            entry = self._cache.entries.get(name)
+        if entry is not None and entry.component == kind and entry.fingerprint == fingerprint:
+            return entry.valid, True
+
+        valid = component.valid()
+        with self._lock:
+            self._cache.entries[name] = ValidationEntry(kind, fingerprint, valid)
+            self._cache.write(self.project_path)
+        return valid, False
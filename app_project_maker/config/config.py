@@ -4,12 +4,11 @@ command: C:\Users\sg-okubo\miniconda3\envs\optical-flow\Scripts\json2models -m C
 """
 from dataclasses import dataclass
 
-from dataclasses_json import dataclass_json
+from app_project_maker.codec import LazyDataClassJsonMixin
 
 
-@dataclass_json
 @dataclass
-class OutputVideoSize:
+class OutputVideoSize(LazyDataClassJsonMixin):
     height: int
     width: int
 
@@ -0,0 +1,287 @@
+"""
+プロジェクトの設定ファイル(ProjectConfig,RecordConfig,DetectionConfig)のローダー
+デコードした設定を保持し,ファイルが変更された場合だけ読み直す.
+ファイルのstatはdebounce秒に1回だけ確認するため,録画・検出のループから毎回呼んでもディスクにアクセスしない.
+型の検証は読み込み時に1回だけ,デコードで変換される前のjsonの値に対して行い,変更されたフィールドを購読者に通知する
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+import typing
+from dataclasses import MISSING, fields, is_dataclass
+from datetime import datetime
+from enum import Enum
+from pathlib import Path
+from typing import Any, Callable, Dict, Generic, List, Optional, Set, Tuple, Type, TypeVar, Union
+
+from app_project_maker import codec
+from app_project_maker.atomic_write import atomic_write_text
+from app_project_maker.config.project_config import DetectionConfig, ProjectConfig, RecordConfig
+from app_project_maker.error import ConfigValidationError
+from app_project_maker.log import logger
+
+T = TypeVar('T')
+
+# 設定クラスごとのプロジェクト内のファイル名
+CONFIG_FILES: Dict[type, str] = {
+    ProjectConfig: 'project_config.json',
+    RecordConfig: 'record_config.json',
+    DetectionConfig: 'detection_config.json',
+}
+
+# (新しい設定, 前の設定, 変更されたフィールド名('record.interval_minutes'のように.区切り))
+ConfigCallback = Callable[[Any, Optional[Any], Set[str]], None]
+
+
+def validate(value: Any, tp: Any = None, path: str = '') -> None:
+    """
+    dataclassの値が型ヒントと一致するか確認する.一致しなければConfigValidationErrorを投げる
+    :param value:
+    :param tp: 型.省略時はvalueのクラス
+    :param path: エラーメッセージ用のフィールド名
+    :return:
+    """
+    tp = type(value) if tp is None else tp
+    origin = typing.get_origin(tp)
+    args = typing.get_args(tp)
+    if tp is Any:
+        return
+    if is_dataclass(tp):
+        if not isinstance(value, tp):
+            raise ConfigValidationError(f'{path or tp.__name__}: expected {tp.__name__}, got {value!r}')
+        hints = typing.get_type_hints(tp)
+        for f in fields(tp):
+            validate(getattr(value, f.name), hints.get(f.name, Any), f'{path}.{f.name}' if path else f.name)
+        return
+    if origin is Union:
+        for arg in args:
+            try:
+                validate(value, arg, path)
+                return
+            except ConfigValidationError:
+                continue
+        raise ConfigValidationError(f'{path}: expected {tp}, got {value!r}')
+    if origin in (list, set, frozenset):
+        if not isinstance(value, origin):
+            raise ConfigValidationError(f'{path}: expected {origin.__name__}, got {value!r}')
+        for i, item in enumerate(value):
+            validate(item, args[0] if args else Any, f'{path}[{i}]')
+        return
+    if origin is tuple:
+        if not isinstance(value, (tuple, list)):
+            raise ConfigValidationError(f'{path}: expected tuple, got {value!r}')
+        if args and args[-1] is not Ellipsis:
+            if len(value) != len(args):
+                raise ConfigValidationError(f'{path}: expected {len(args)} items, got {value!r}')
+            for i, (item, arg) in enumerate(zip(value, args)):
+                validate(item, arg, f'{path}[{i}]')
+        return
+    if origin is dict:
+        if not isinstance(value, dict):
+            raise ConfigValidationError(f'{path}: expected dict, got {value!r}')
+        return
+    if tp is type(None):
+        if value is not None:
+            raise ConfigValidationError(f'{path}: expected None, got {value!r}')
+        return
+    if tp is float:
+        ok = isinstance(value, (int, float)) and not isinstance(value, bool)
+    elif tp is int:
+        ok = isinstance(value, int) and not isinstance(value, bool)
+    elif isinstance(tp, type):
+        ok = isinstance(value, tp)
+    else:
+        ok = True
+    if not ok:
+        raise ConfigValidationError(f'{path}: expected {getattr(tp, "__name__", tp)}, got {value!r}')
+
+
+def validate_json(value: Any, tp: Any, path: str = '') -> None:
+    """
+    json.loadsした値がデコード前の時点で型ヒントと一致するか確認する.一致しなければConfigValidationErrorを投げる
+    codecのデコードはプリミティブ型を変換する("false" -> True, 1.5 -> 1)ため,変換前の値で確認する
+    :param value: json.loadsの結果
+    :param tp: 型
+    :param path: エラーメッセージ用のフィールド名
+    :return:
+    """
+    origin = typing.get_origin(tp)
+    args = typing.get_args(tp)
+    if tp is Any:
+        return
+    if is_dataclass(tp):
+        if not isinstance(value, dict):
+            raise ConfigValidationError(f'{path or tp.__name__}: expected {tp.__name__}, got {value!r}')
+        hints = typing.get_type_hints(tp)
+        for f in fields(tp):
+            name = f'{path}.{f.name}' if path else f.name
+            if f.name in value:
+                validate_json(value[f.name], hints.get(f.name, Any), name)
+            elif f.init and f.default is MISSING and f.default_factory is MISSING:
+                raise ConfigValidationError(f'{name}: missing')
+        return
+    if origin is Union:
+        for arg in args:
+            try:
+                validate_json(value, arg, path)
+                return
+            except ConfigValidationError:
+                continue
+        raise ConfigValidationError(f'{path}: expected {tp}, got {value!r}')
+    if origin in (list, set, frozenset, tuple):
+        if not isinstance(value, list):
+            raise ConfigValidationError(f'{path}: expected {origin.__name__}, got {value!r}')
+        if origin is tuple and args and args[-1] is not Ellipsis:
+            if len(value) != len(args):
+                raise ConfigValidationError(f'{path}: expected {len(args)} items, got {value!r}')
+            items = args
+        else:
+            items = [args[0] if args else Any] * len(value)
+        for i, (item, arg) in enumerate(zip(value, items)):
+            validate_json(item, arg, f'{path}[{i}]')
+        return
+    if origin is dict:
+        if not isinstance(value, dict):
+            raise ConfigValidationError(f'{path}: expected dict, got {value!r}')
+        return
+    if tp is type(None):
+        ok = value is None
+    elif tp is bool or tp is str:
+        ok = isinstance(value, tp)
+    elif tp is int:
+        ok = isinstance(value, int) and not isinstance(value, bool)
+    elif tp is float or tp is datetime:
+        # datetimeはタイムスタンプで保存される
+        ok = isinstance(value, (int, float)) and not isinstance(value, bool)
+    elif isinstance(tp, type) and issubclass(tp, Enum):
+        ok = value in {member.value for member in tp}
+    else:
+        ok = True
+    if not ok:
+        raise ConfigValidationError(f'{path}: expected {getattr(tp, "__name__", tp)}, got {value!r}')
+
+
+def changed_fields(old: Any, new: Any, prefix: str = '') -> Set[str]:
+    """
+    2つの設定で値が異なるフィールド名.dataclassのフィールドは.区切りで再帰的に比較する
+    """
+    changed = set()
+    for f in fields(new):
+        name = f'{prefix}.{f.name}' if prefix else f.name
+        old_value, new_value = getattr(old, f.name), getattr(new, f.name)
+        if is_dataclass(new_value) and type(old_value) is type(new_value):
+            changed |= changed_fields(old_value, new_value, name)
+        elif old_value != new_value:
+            changed.add(name)
+    return changed
+
+
+class ConfigLoader(Generic[T]):
+    """
+    1つの設定ファイルのローダー.スレッドセーフ
+    getが返す設定は他の呼び出し元と共有しているため書き換えないこと.変更する場合はwriteを使う
+    :param path: 設定ファイルのパス
+    :param cls: 設定のdataclass
+    :param debounce: ファイルの変更を確認する最短の間隔(秒).0であれば毎回statする
+    """
+
+    def __init__(self, path: Union[str, Path], cls: Type[T], debounce: float = 0.5):
+        self.path = Path(path)
+        self.cls = cls
+        self.debounce = debounce
+        self._lock = threading.Lock()
+        self._config: Optional[T] = None
+        self._stat: Optional[Tuple[int, int, int]] = None
+        self._checked = -float('inf')
+        self._callbacks: List[ConfigCallback] = []
+        self.loads = 0
+
+    def get(self) -> T:
+        """
+        デコード済みの設定.debounce秒以内の呼び出しではファイルを確認しない
+        ファイルが壊れている場合は前回読み込んだ設定を返し続ける(初回はConfigValidationError)
+        :return:
+        """
+        now = time.monotonic()
+        config = self._config
+        if config is not None and now - self._checked < self.debounce:
+            return config
+        return self._check(now)
+
+    def reload(self) -> T:
+        """debounceに関わらずファイルを確認する"""
+        return self._check(time.monotonic())
+
+    def _check(self, now: float) -> T:
+        notify = None
+        with self._lock:
+            self._checked = now
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                if self._config is None:
+                    raise
+                return self._config
+            stat = (st.st_mtime_ns, st.st_size, st.st_ino)
+            if self._config is not None and stat == self._stat:
+                return self._config
+            try:
+                config = self._load()
+            except ConfigValidationError:
+                if self._config is None:
+                    raise
+                logger.warning(f'Invalid Config Ignored: {self.path}')
+                self._stat = stat
+                return self._config
+            old, self._config, self._stat = self._config, config, stat
+            if old is not None:
+                changed = changed_fields(old, config)
+                if changed:
+                    notify = (config, old, changed, list(self._callbacks))
+        if notify is not None:
+            config, old, changed, callbacks = notify
+            for callback in callbacks:
+                try:
+                    callback(config, old, changed)
+                except Exception as e:
+                    logger.warning(f'Config Callback Failed: {e!r}')
+        return config
+
+    def _load(self) -> T:
+        with open(self.path, 'r', encoding='UTF-8') as fp:
+            text = fp.read()
+        try:
+            validate_json(json.loads(text), self.cls)
+            config = codec.loads(self.cls, text)
+        except ConfigValidationError as e:
+            raise ConfigValidationError(f'{self.path}: {e}') from e
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            raise ConfigValidationError(f'{self.path}: {e!r}') from e
+        self.loads += 1
+        return config
+
+    def write(self, config: T) -> None:
+        """
+        設定を検証してから保存し,購読者に通知する
+        :param config:
+        :return:
+        """
+        validate(config)
+        atomic_write_text(self.path, codec.dumps(config))
+        self.reload()
+
+    def subscribe(self, callback: ConfigCallback) -> None:
+        """
+        設定が変更された時に呼ばれる関数を登録する.変更を検出したスレッド(getの呼び出し元)から呼ばれる
+        :param callback: (新しい設定, 前の設定, 変更されたフィールド名)
+        :return:
+        """
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def unsubscribe(self, callback: ConfigCallback) -> None:
+        with self._lock:
+            self._callbacks.remove(callback)
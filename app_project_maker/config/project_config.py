@@ -2,14 +2,13 @@ from dataclasses import dataclass
 from typing import List
 
 import typing
-from dataclasses_json import dataclass_json
+from app_project_maker.codec import LazyDataClassJsonMixin
 
 Color = typing.Tuple[int, int, int]
 
 
-@dataclass_json()
 @dataclass()
-class DetectionConfig:
+class DetectionConfig(LazyDataClassJsonMixin):
     # TODO RGB or #RRRGGGBBB
     gpu: bool
     text_color: Color
@@ -17,24 +16,21 @@ class DetectionConfig:
     size_h: int
 
 
-@dataclass_json()
 @dataclass()
-class ComponentConfig:
+class ComponentConfig(LazyDataClassJsonMixin):
     resource_path: str
 
 
-@dataclass_json()
 @dataclass()
-class RecordConfig:
+class RecordConfig(LazyDataClassJsonMixin):
     directory: str
     interval_minutes: int
     record_raw: bool
     record_detection: bool
 
 
-@dataclass_json()
 @dataclass
-class ProjectConfig:
+class ProjectConfig(LazyDataClassJsonMixin):
     components: List[ComponentConfig]
     record: RecordConfig
     # detection: DetectionConfig
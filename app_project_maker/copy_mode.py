@@ -0,0 +1,222 @@
+"""
+プロジェクトディレクトリのコピー方法
+大きなコンポーネントリソース(動画,検出結果など)を持つプロジェクトを高速に複製するために,
+ハードリンク,reflink(copy_file_range),並列コピーを選択できる
+"""
+from __future__ import annotations
+
+import errno
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Callable, Collection, List, Optional, Tuple, Union
+
+from app_project_maker.error import CopyCancelledError
+from app_project_maker.hidden_project_config import META_HIDDEN_FILE
+
+# 一度書き込んだら変更しないメディアファイル.HARDLINKモードで既定でハードリンクするのはこれらだけで,
+# それ以外(.npy,.pkl,.h5,拡張子の無いファイルなど)はコピーする
+IMMUTABLE_SUFFIXES = frozenset({
+    # 動画
+    '.mp4', '.m4v', '.mov', '.avi', '.mkv', '.webm', '.mts', '.m2ts',
+    # 画像
+    '.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.webp',
+    # 音声
+    '.wav', '.mp3', '.flac', '.aac', '.m4a', '.ogg',
+})
+
+# linux/fs.h FICLONE
+_FICLONE = 0x40049409
+# reflink,copy_file_rangeが使えないことを示すエラー
+_UNSUPPORTED_ERRNOS = frozenset(
+    code for code in (getattr(errno, name, None) for name in
+                      ('EOPNOTSUPP', 'ENOTSUP', 'EXDEV', 'EINVAL', 'ENOTTY', 'ENOSYS', 'EBADF', 'EPERM'))
+    if code is not None)
+
+
+class CopyMode(Enum):
+    COPY = 0  # 1ファイルずつ通常のコピー(shutil.copy2)
+    HARDLINK = 1  # 書き換えられないファイル(is_immutable)はハードリンク,それ以外はコピー
+    REFLINK = 2  # reflink,copy_file_rangeを使用.使えないファイルシステムでは通常のコピー
+    PARALLEL = 3  # 複数スレッドで通常のコピー
+
+
+@dataclass
+class CopyProgress:
+    files_done: int
+    files_total: int
+    bytes_done: int
+    bytes_total: int
+    elapsed: float
+    linked_files: int = 0
+    cloned_files: int = 0
+
+    @property
+    def bytes_per_sec(self) -> float:
+        return self.bytes_done / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        return (f'{self.files_done}/{self.files_total} files '
+                f'{self.bytes_done / 2 ** 20:.1f}/{self.bytes_total / 2 ** 20:.1f} MiB '
+                f'{self.bytes_per_sec / 2 ** 20:.1f} MiB/s')
+
+
+ProgressCallback = Callable[[CopyProgress], None]
+
+
+def is_immutable(path: Union[str, Path]) -> bool:
+    """
+    HARDLINKモードでハードリンクしてよいファイルかどうか.IMMUTABLE_SUFFIXESのメディアファイルのみ
+    ハードリンクしたファイルはコピー元と同じ実体なので,その場で書き換えるとコピー元も変わる.
+    書き換える場合はAbstractComponent.write_resourceのように別のファイルに書き込んでから置き換えること
+    :param path:
+    :return:
+    """
+    name = os.path.basename(path)
+    return name != META_HIDDEN_FILE and os.path.splitext(name)[1].lower() in IMMUTABLE_SUFFIXES
+
+
+class _FileCopier:
+    """1ファイルのコピー処理.reflink等が使えないと判明したら以降は試さない"""
+
+    def __init__(self, mode: CopyMode, immutable: Callable[[str], bool], linked: Optional[Callable[[str], bool]]):
+        self.mode = mode
+        self.immutable = immutable
+        self.linked = linked
+        self.can_link = True
+        self.can_reflink = sys.platform.startswith('linux')
+        self.can_copy_file_range = hasattr(os, 'copy_file_range')
+
+    def __call__(self, src: str, dst: str) -> str:
+        """
+        :return: 'link','clone','copy'のいずれか
+        """
+        if self.can_link and (self.mode == CopyMode.HARDLINK and self.immutable(src)
+                              or self.linked is not None and self.linked(src)):
+            try:
+                os.link(src, dst)
+                return 'link'
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED_ERRNOS and e.errno != errno.EMLINK:
+                    raise
+                self.can_link = e.errno == errno.EMLINK
+        if self.mode == CopyMode.REFLINK and self._clone(src, dst):
+            shutil.copystat(src, dst)
+            return 'clone'
+        shutil.copy2(src, dst)
+        return 'copy'
+
+    def _clone(self, src: str, dst: str) -> bool:
+        if not (self.can_reflink or self.can_copy_file_range):
+            return False
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            if self.can_reflink:
+                import fcntl
+                try:
+                    fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+                    return True
+                except OSError as e:
+                    if e.errno not in _UNSUPPORTED_ERRNOS:
+                        raise
+                    self.can_reflink = False
+            if self.can_copy_file_range:
+                size = os.fstat(fsrc.fileno()).st_size
+                offset = 0
+                try:
+                    while offset < size:
+                        copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - offset)
+                        if copied == 0:
+                            break
+                        offset += copied
+                    if offset >= size:
+                        return True
+                except OSError as e:
+                    if e.errno not in _UNSUPPORTED_ERRNOS or offset > 0:
+                        raise
+                    self.can_copy_file_range = False
+        return False
+
+
+def _scan(src: Path, dst: Path,
+          exclude: Collection[str] = ()) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str, int]]]:
+    directories = []
+    files = []
+    for root, dir_names, file_names in os.walk(src, followlinks=True):
+        relative_root = os.path.relpath(root, src)
+        if exclude and relative_root == '.':
+            dir_names[:] = [name for name in dir_names if name not in exclude]
+            file_names = [name for name in file_names if name not in exclude]
+        dst_root = os.path.join(dst, relative_root)
+        directories.append((root, dst_root))
+        for file_name in file_names:
+            src_file = os.path.join(root, file_name)
+            files.append((src_file, os.path.join(dst_root, file_name), os.stat(src_file).st_size))
+    return directories, files
+
+
+def copy_tree(src: Union[str, Path], dst: Union[str, Path], mode: CopyMode = CopyMode.COPY,
+              workers: Optional[int] = None, progress: Optional[ProgressCallback] = None,
+              immutable: Callable[[str], bool] = is_immutable,
+              linked: Optional[Callable[[str], bool]] = None,
+              cancel: Optional[threading.Event] = None, exclude: Collection[str] = ()) -> CopyProgress:
+    """
+    ディレクトリツリーをコピー.コピー先が既に存在していても上書きする(shutil.copytreeのdirs_exist_ok=True相当)
+    :param src:
+    :param dst:
+    :param mode: コピー方法
+    :param workers: ファイルコピーのスレッド数.省略時はPARALLELのみ複数スレッド
+    :param progress: 1ファイルごとに進捗を受け取るコールバック
+    :param immutable: HARDLINKモードでハードリンクしてよいファイルの判定.ハードリンクしたファイルはその場で書き換えてはならない
+    :param linked: モードに関わらずハードリンクするファイルの判定(ブロブストアに登録したファイルなど)
+    :param cancel: セットされると次のファイルのコピー前にCopyCancelledErrorを投げる.コピー済みのファイルは残る
+    :param exclude: コピーしないsrc直下のファイル・ディレクトリ名
+    :return: 最終的な進捗(転送量,速度)
+    """
+    start = time.perf_counter()
+    directories, files = _scan(Path(src), Path(dst), exclude)
+    for _, dst_dir in directories:
+        os.makedirs(dst_dir, exist_ok=True)
+
+    if workers is None:
+        workers = min(32, (os.cpu_count() or 1) * 4) if mode == CopyMode.PARALLEL else 1
+
+    stats = CopyProgress(0, len(files), 0, sum(size for _, _, size in files), 0.0)
+    lock = threading.Lock()
+    copier = _FileCopier(mode, immutable, linked)
+
+    def copy_one(item: Tuple[str, str, int]):
+        src_file, dst_file, size = item
+        if cancel is not None and cancel.is_set():
+            raise CopyCancelledError(src_file)
+        if os.path.lexists(dst_file):
+            os.remove(dst_file)
+        kind = copier(src_file, dst_file)
+        with lock:
+            stats.files_done += 1
+            stats.bytes_done += size
+            stats.linked_files += kind == 'link'
+            stats.cloned_files += kind == 'clone'
+            stats.elapsed = time.perf_counter() - start
+            if progress is not None:
+                progress(stats)
+
+    if workers > 1 and len(files) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # 例外を呼び出し元に伝える
+            for _ in pool.map(copy_one, files):
+                pass
+    else:
+        for item in files:
+            copy_one(item)
+
+    # ディレクトリの更新日時はファイルのコピー後に合わせる
+    for src_dir, dst_dir in reversed(directories):
+        shutil.copystat(src_dir, dst_dir)
+    stats.elapsed = time.perf_counter() - start
+    return stats
@@ -8,3 +8,31 @@ class ProjectNotFoundError(Exception):
 
 class ProjectOverrideError(Exception):
     pass
+
+
+class ComponentDependencyError(Exception):
+    pass
+
+
+class ArchiveError(Exception):
+    pass
+
+
+class CopyCancelledError(Exception):
+    pass
+
+
+class QuotaExceededError(Exception):
+    pass
+
+
+class ConfigValidationError(Exception):
+    pass
+
+
+class LayoutError(Exception):
+    pass
+
+
+class SnapshotNotFoundError(Exception):
+    pass
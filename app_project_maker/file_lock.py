@@ -0,0 +1,92 @@
+"""
+複数プロセスから同じベースディレクトリを操作するためのファイルロック
+"""
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+
+class LockTimeoutError(TimeoutError):
+    pass
+
+
+class FileLock:
+    """
+    プロセス間の排他ロック.同じインスタンスであれば同一スレッドから再入できる
+    with FileLock(path):
+        ...
+    :param path: ロックファイルのパス
+    :param timeout: ロック取得を待つ秒数.Noneであれば無制限に待つ
+    :param reentrant: Falseであれば再入できない代わりに,取得したスレッド以外からも解放できる
+    """
+
+    def __init__(self, path: Union[str, Path], timeout: Optional[float] = None, poll_interval: float = 0.01,
+                 reentrant: bool = True):
+        self.path = str(path)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._thread_lock = threading.RLock() if reentrant else threading.Lock()
+        self._depth = 0
+        self._fd: Optional[int] = None
+
+    def acquire(self):
+        if not self._thread_lock.acquire(timeout=-1 if self.timeout is None else self.timeout):
+            raise LockTimeoutError(self.path)
+        if self._depth == 0:
+            try:
+                self._acquire_file()
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            self._release_file()
+        self._thread_lock.release()
+
+    def _acquire_file(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            try:
+                if os.name == 'nt':
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                elif deadline is None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                else:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except OSError:
+                if deadline is not None and time.monotonic() > deadline:
+                    os.close(fd)
+                    raise LockTimeoutError(self.path)
+                time.sleep(self.poll_interval)
+        self._fd = fd
+
+    def _release_file(self):
+        fd, self._fd = self._fd, None
+        try:
+            if os.name == 'nt':
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
@@ -11,9 +11,16 @@ from datetime import datetime, timezone
 from pathlib import Path
 from typing import Union
 
-from dataclasses_json import dataclass_json
+from app_project_maker import codec
+from app_project_maker.codec import LazyDataClassJsonMixin
+from app_project_maker.atomic_write import atomic_write_text
+from app_project_maker.metrics import METRICS, Operation
 
 META_HIDDEN_FILE = '.prj'
+# スナップショット(snapshot.py)の保存先.プロジェクトのコピー・書き出し・使用量には含めない
+SNAPSHOT_DIR = '.snapshots'
+SNAPSHOT_META_FILE = '.snapshots.json'
+SNAPSHOT_FILES = frozenset({SNAPSHOT_DIR, SNAPSHOT_META_FILE})
 
 
 def as_hidden_file_windows(full_path: str):
@@ -44,9 +51,8 @@ def as_hidden_file_windows(full_path: str):
 
 # https://stackoverflow.com/questions/56931738/python-crash-on-windows-with-a-datetime-close-to-the-epoch
 # datetime.minだとwindowsでエラー
-@dataclass_json()
 @dataclass()
-class ProjectMeta:
+class ProjectMeta(LazyDataClassJsonMixin):
     name: str
     create_date: datetime
     update_date: datetime = datetime.fromtimestamp(86400, tz=timezone.utc)
@@ -59,20 +65,29 @@ class ProjectMeta:
 
     def write_current(self, directory_path: Union[str, Path]):
         file_path = ProjectMeta.meta_file_path(directory_path)
-        with open(file_path, 'w', encoding='UTF-8') as fp:
-            fp.write(ProjectMeta.to_json(self, indent=2, ensure_ascii=False))
+        with METRICS.measure(Operation.META_WRITE) as measurement:
+            text = codec.dumps(self)
+            measurement.bytes = len(text)
+            atomic_write_text(file_path, text)
 
     @classmethod
-    def write(cls, directory_path: Union[str, Path], name: str, user: str = 'No Name', maker: str = 'Project Maker'):
+    def write(cls, directory_path: Union[str, Path], name: str, user: str = 'No Name', maker: str = 'Project Maker') \
+            -> ProjectMeta:
         now = datetime.now()
         meta = ProjectMeta(name, now, now, user, maker)
         file_path = ProjectMeta.meta_file_path(directory_path)
-        with open(file_path, 'w', encoding='UTF-8') as fp:
-            fp.write(ProjectMeta.to_json(meta, indent=2, ensure_ascii=False))
+        with METRICS.measure(Operation.META_WRITE) as measurement:
+            text = codec.dumps(meta)
+            measurement.bytes = len(text)
+            atomic_write_text(file_path, text)
 
         # as_hidden_file_windows(os.path.abspath(file_path))
+        return meta
 
     @classmethod
     def read(cls, directory_path: Union[str, Path]) -> ProjectMeta:
-        with open(os.path.join(directory_path, META_HIDDEN_FILE), 'r', encoding='UTF-8') as fp:
-            return ProjectMeta.from_json(fp.read())
+        with METRICS.measure(Operation.META_READ) as measurement:
+            with open(os.path.join(directory_path, META_HIDDEN_FILE), 'r', encoding='UTF-8') as fp:
+                text = fp.read()
+            measurement.bytes = len(text)
+            return codec.loads(ProjectMeta, text)
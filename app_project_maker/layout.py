@@ -0,0 +1,141 @@
+"""
+ベースディレクトリ内のプロジェクトの配置(レイアウト)
+10万件以上のプロジェクトを1つのディレクトリに置くと列挙や.prjの確認が遅くなるため,
+プロジェクト名から決まるシャードディレクトリ(hash-ab,date-2021_11など)に分けて配置できるようにする.
+レイアウトはベースディレクトリ/layout.jsonに保存し,無ければ従来通りベースディレクトリ直下(FLAT)に置く
+
+移行中はlayout.jsonに移行元のレイアウト(previous)を記録し,移行が終わるまで両方の場所を探す
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+
+from app_project_maker import codec
+from app_project_maker.atomic_write import atomic_write_text
+from app_project_maker.codec import LazyDataClassJsonMixin
+from app_project_maker.hidden_project_config import META_HIDDEN_FILE
+
+LAYOUT_FILE = 'layout.json'
+HASH_SHARD_PREFIX = 'hash-'
+DATE_SHARD_PREFIX = 'date-'
+
+# シャードディレクトリ名.この形式のディレクトリはプロジェクトとしてではなく,中のプロジェクトを列挙する
+_SHARD_DIR = re.compile(r'(hash-[0-9a-f]{1,8}|date-\d{4}_\d{2})')
+# '2021_11_26_camera00'のような日付で始まるプロジェクト名
+_DATE_NAME = re.compile(r'(\d{4}_\d{2})(?!\d)')
+
+
+class LayoutKind(Enum):
+    # ベース/名前
+    FLAT = 'flat'
+    # ベース/hash-<sha1(名前)の先頭hash_width文字>/名前
+    HASH = 'hash'
+    # ベース/date-<YYYY_MM>/名前.名前が'YYYY_MM'で始まらない場合はHASHと同じ
+    DATE = 'date'
+
+
+def is_shard_dir(name: str) -> bool:
+    return _SHARD_DIR.fullmatch(name) is not None
+
+
+@dataclass()
+class ProjectLayout(LazyDataClassJsonMixin):
+    kind: LayoutKind = LayoutKind.FLAT
+    # HASHのシャード名の文字数.2であれば256ディレクトリ
+    hash_width: int = 2
+    # 移行中の移行元のレイアウト.移行中でなければNone
+    previous: Optional[LayoutKind] = None
+
+    @classmethod
+    def layout_file_path(cls, base_dir: Union[str, Path]) -> str:
+        return os.path.join(base_dir, LAYOUT_FILE)
+
+    @classmethod
+    def read(cls, base_dir: Union[str, Path]) -> ProjectLayout:
+        """
+        :param base_dir:
+        :return: layout.jsonが無ければFLAT
+        """
+        try:
+            with open(cls.layout_file_path(base_dir), 'r', encoding='UTF-8') as fp:
+                return codec.loads(ProjectLayout, fp.read())
+        except FileNotFoundError:
+            return ProjectLayout()
+
+    def write(self, base_dir: Union[str, Path]):
+        atomic_write_text(self.layout_file_path(base_dir), codec.dumps(self))
+
+    @property
+    def migrating(self) -> bool:
+        return self.previous is not None
+
+    def shard(self, name: str, kind: Optional[LayoutKind] = None) -> Optional[str]:
+        """
+        :param name: プロジェクト名
+        :param kind: 省略時は現在のレイアウト
+        :return: シャードディレクトリ名.FLATであればNone
+        """
+        kind = kind or self.kind
+        if kind == LayoutKind.FLAT:
+            return None
+        if kind == LayoutKind.DATE:
+            match = _DATE_NAME.match(name)
+            if match:
+                return DATE_SHARD_PREFIX + match.group(1)
+        return HASH_SHARD_PREFIX + hashlib.sha1(name.encode('UTF-8')).hexdigest()[:self.hash_width]
+
+    def relative_path(self, name: str, kind: Optional[LayoutKind] = None) -> str:
+        """
+        ベースディレクトリからのプロジェクトの相対パス
+        """
+        shard = self.shard(name, kind)
+        return name if shard is None else shard + os.sep + name
+
+    def candidates(self, name: str) -> List[str]:
+        """
+        プロジェクトがありうる相対パス.移行中は移行先,移行元の順
+        """
+        if self.previous is None:
+            return [self.relative_path(name)]
+        return [self.relative_path(name), self.relative_path(name, self.previous)]
+
+
+def scan_projects(base_dir: Union[str, Path]) -> Iterator[Tuple[str, str]]:
+    """
+    ベースディレクトリ直下とシャードディレクトリ内のプロジェクト(.prjを持つディレクトリ)を列挙する
+    レイアウトに関わらず両方を探すため,移行中でも全てのプロジェクトが見つかる
+    :param base_dir:
+    :return: (ベースディレクトリからの相対パス, パス)
+    """
+    return _scan(base_dir, '', True)
+
+
+def _scan(directory: Union[str, Path], prefix: str, shards: bool) -> Iterator[Tuple[str, str]]:
+    meta_suffix = os.sep + META_HIDDEN_FILE
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.is_dir():
+                    continue
+                if os.path.exists(entry.path + meta_suffix):
+                    yield prefix + entry.name, entry.path
+                elif shards and is_shard_dir(entry.name):
+                    yield from _scan(entry.path, entry.name + os.sep, False)
+    except FileNotFoundError:
+        return
+
+
+@dataclass
+class MigrationResult:
+    """AppProjectMaker.migrate_layoutの結果"""
+    kind: LayoutKind
+    moved: int = 0
+    # 移動先が既に存在したため移動しなかったプロジェクト(ベースディレクトリからの相対パス)
+    conflicts: List[str] = field(default_factory=list)
+    elapsed: float = 0.0
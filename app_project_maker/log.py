@@ -0,0 +1,13 @@
+"""
+loguruの遅延読み込み
+loguruの読み込みは起動時間の大部分を占めるため,最初にログを出力する時点で読み込む
+"""
+
+
+class _LazyLogger:
+    def __getattr__(self, name: str):
+        from loguru import logger
+        return getattr(logger, name)
+
+
+logger = _LazyLogger()
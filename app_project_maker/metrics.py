@@ -0,0 +1,186 @@
+"""
+ファイルシステム操作の計測
+操作の種類ごとに回数,エラー数,転送量,処理時間のヒストグラムを集計し,
+AppProjectMaker.stats()やPrometheusのテキスト形式で取り出せるようにする.
+ProjectMetaなどAppProjectMakerを持たない場所からも記録するため,集計はプロセスで1つ(METRICS)
+"""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 処理時間のヒストグラムの境界(秒)
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, math.inf)
+
+
+class Operation(Enum):
+    MKDIR = 'mkdir'
+    META_READ = 'meta_read'
+    META_WRITE = 'meta_write'
+    REGISTRY_LOAD = 'registry_load'
+    REGISTRY_SAVE = 'registry_save'
+    COPY = 'copy'
+    DELETE = 'delete'
+    COMPONENT_CREATE = 'component_create'
+    COMPONENT_VALID = 'component_valid'
+    EXPORT = 'export'
+    IMPORT = 'import'
+    SNAPSHOT = 'snapshot'
+    ROOT_SCAN = 'root_scan'
+
+
+@dataclass(frozen=True)
+class OperationEvent:
+    """フックに渡す1回の操作の結果"""
+    operation: Operation
+    seconds: float
+    bytes: int = 0
+    error: Optional[BaseException] = None
+
+
+OperationHook = Callable[[OperationEvent], None]
+
+
+@dataclass
+class OperationStats:
+    count: int = 0
+    errors: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+    # DEFAULT_BUCKETSの各区間に入った回数(累積ではない)
+    buckets: List[int] = field(default_factory=lambda: [0] * len(DEFAULT_BUCKETS))
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.seconds / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """
+        ヒストグラムから求めた分位点の上限(秒)
+        :param q: 0-1
+        :return:
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(DEFAULT_BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max_seconds)
+        return self.max_seconds
+
+
+class Measurement:
+    """
+    with METRICS.measure(Operation.COPY) as measurement:
+        ...
+        measurement.bytes = copied
+    """
+    __slots__ = ('metrics', 'operation', 'bytes', '_start')
+
+    def __init__(self, metrics: Metrics, operation: Operation, bytes: int = 0):
+        self.metrics = metrics
+        self.operation = operation
+        self.bytes = bytes
+        self._start = 0.0
+
+    def __enter__(self) -> Measurement:
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.metrics.record(self.operation, time.perf_counter() - self._start, self.bytes, exc_val)
+
+
+class Metrics:
+    """
+    操作ごとの集計.スレッドセーフ
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._stats: Dict[Operation, OperationStats] = {}
+        self._hooks: List[OperationHook] = []
+
+    def measure(self, operation: Operation, bytes: int = 0) -> Measurement:
+        return Measurement(self, operation, bytes)
+
+    def record(self, operation: Operation, seconds: float, bytes: int = 0, error: Optional[BaseException] = None):
+        if not self.enabled:
+            return
+        bucket = next(i for i, bound in enumerate(DEFAULT_BUCKETS) if seconds <= bound)
+        with self._lock:
+            stats = self._stats.get(operation)
+            if stats is None:
+                stats = self._stats[operation] = OperationStats()
+            stats.count += 1
+            stats.errors += error is not None
+            stats.bytes += bytes
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.buckets[bucket] += 1
+            hooks = list(self._hooks)
+        if hooks:
+            event = OperationEvent(operation, seconds, bytes, error)
+            for hook in hooks:
+                try:
+                    hook(event)
+                except Exception:
+                    # 計測のフックで本来の処理を失敗させない
+                    pass
+
+    def add_hook(self, hook: OperationHook):
+        with self._lock:
+            self._hooks.append(hook)
+
+    def remove_hook(self, hook: OperationHook):
+        with self._lock:
+            self._hooks.remove(hook)
+
+    def snapshot(self) -> Dict[str, OperationStats]:
+        """
+        :return: 操作名 -> 集計のコピー
+        """
+        with self._lock:
+            return {operation.value: OperationStats(stats.count, stats.errors, stats.bytes, stats.seconds,
+                                                    stats.max_seconds, list(stats.buckets))
+                    for operation, stats in self._stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def to_prometheus(self, prefix: str = 'app_project_maker') -> str:
+        """
+        Prometheusのテキスト形式(version 0.0.4)
+        :param prefix: メトリクス名の接頭辞
+        :return:
+        """
+        snapshot = self.snapshot()
+        lines = [f'# HELP {prefix}_operation_seconds Latency of project filesystem operations.',
+                 f'# TYPE {prefix}_operation_seconds histogram']
+        for name, stats in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(DEFAULT_BUCKETS, stats.buckets):
+                cumulative += count
+                le = '+Inf' if math.isinf(bound) else repr(bound)
+                lines.append(f'{prefix}_operation_seconds_bucket{{operation="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'{prefix}_operation_seconds_sum{{operation="{name}"}} {stats.seconds!r}')
+            lines.append(f'{prefix}_operation_seconds_count{{operation="{name}"}} {stats.count}')
+        for metric, help_text, attribute in (('operation_errors_total', 'Failed operations.', 'errors'),
+                                             ('operation_bytes_total', 'Bytes moved by operations.', 'bytes')):
+            lines.append(f'# HELP {prefix}_{metric} {help_text}')
+            lines.append(f'# TYPE {prefix}_{metric} counter')
+            for name, stats in sorted(snapshot.items()):
+                lines.append(f'{prefix}_{metric}{{operation="{name}"}} {getattr(stats, attribute)}')
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
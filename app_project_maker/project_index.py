@@ -0,0 +1,279 @@
+"""
+プロジェクトのメタデータ(名前・パス・作成日・更新日・user・maker)とディスク使用量を保持するSQLiteインデックス
+ソート付きの列挙時に全プロジェクトの.prjを読み直さないために,project.jsonと同じディレクトリに配置する
+検索用のメモリ上のインデックス(SearchIndex)は最初の検索時に作り,このインデックスの更新に合わせて更新する
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Collection, Dict, Iterable, List, Optional, Tuple, Union
+
+from app_project_maker.hidden_project_config import ProjectMeta
+from app_project_maker.search import SearchEntry, SearchIndex, SearchQuery
+
+INDEX_FILE = 'project_index.db'
+
+
+@dataclass(frozen=True)
+class IndexEntry:
+    name: str
+    path: str
+    create_date: float
+    update_date: float
+    meta_mtime_ns: int
+    user: str = ''
+    maker: str = ''
+
+
+class ProjectIndex:
+    """
+    プロジェクトのメタデータインデックス
+    接続は最初に使用した時点で開く(ベースディレクトリが削除されている間はファイルを作らない)
+    """
+    SCHEMA_VERSION = 3
+
+    def __init__(self, db_path: Union[str, Path]):
+        self.db_path = str(db_path)
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._search: Optional[SearchIndex] = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version != self.SCHEMA_VERSION:
+                # スキーマが古い場合は作り直す.中身は.prjから再構築できる
+                conn.execute('DROP TABLE IF EXISTS projects')
+                conn.execute('DROP TABLE IF EXISTS usage')
+            conn.execute('CREATE TABLE IF NOT EXISTS projects ('
+                         'name TEXT PRIMARY KEY, '
+                         'path TEXT NOT NULL, '
+                         'create_date REAL NOT NULL, '
+                         'update_date REAL NOT NULL, '
+                         'meta_mtime_ns INTEGER NOT NULL, '
+                         "user TEXT NOT NULL DEFAULT '', "
+                         "maker TEXT NOT NULL DEFAULT '')")
+            conn.execute('CREATE INDEX IF NOT EXISTS projects_update_date ON projects (update_date)')
+            # コンポーネントごとのディスク使用量.プロジェクトを走査すれば作り直せる
+            conn.execute('CREATE TABLE IF NOT EXISTS usage ('
+                         'project TEXT NOT NULL, '
+                         'component TEXT NOT NULL, '
+                         'bytes INTEGER NOT NULL, '
+                         'files INTEGER NOT NULL, '
+                         'PRIMARY KEY (project, component))')
+            conn.execute(f'PRAGMA user_version={self.SCHEMA_VERSION}')
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _row(name: str, path: Union[str, Path], meta: ProjectMeta) -> Tuple[str, str, float, float, int, str, str]:
+        try:
+            mtime_ns = os.stat(ProjectMeta.meta_file_path(path)).st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = 0
+        return (name, str(Path(path).absolute()), meta.create_date.timestamp(), meta.update_date.timestamp(), mtime_ns,
+                meta.user, meta.maker)
+
+    def upsert(self, name: str, path: Union[str, Path], meta: ProjectMeta):
+        self.upsert_many([(name, path, meta)])
+
+    def upsert_many(self, items: Iterable[Tuple[str, Union[str, Path], ProjectMeta]]):
+        rows = [self._row(name, path, meta) for name, path, meta in items]
+        if not rows:
+            return
+        with self._lock:
+            with self.connection as conn:
+                conn.executemany('INSERT OR REPLACE INTO projects VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+            if self._search is not None:
+                for name, _, create_date, update_date, _, user, maker in rows:
+                    self._search.upsert(name, SearchEntry(create_date, update_date, user, maker))
+
+    def move(self, name: str, path: Union[str, Path]):
+        """
+        プロジェクトのパスだけを更新する.ディレクトリを移動した場合(.prjの内容とmtimeは変わらない)
+        """
+        with self._lock:
+            with self.connection as conn:
+                conn.execute('UPDATE projects SET path = ? WHERE name = ?', (str(Path(path).absolute()), name))
+
+    def remove(self, name: str):
+        with self._lock:
+            with self.connection as conn:
+                conn.execute('DELETE FROM projects WHERE name = ?', (name,))
+                conn.execute('DELETE FROM usage WHERE project = ?', (name,))
+            if self._search is not None:
+                self._search.remove(name)
+
+    def clear(self):
+        with self._lock:
+            with self.connection as conn:
+                conn.execute('DELETE FROM projects')
+                conn.execute('DELETE FROM usage')
+            self._search = SearchIndex() if self._search is not None else None
+
+    def get(self, name: str) -> Optional[IndexEntry]:
+        with self._lock:
+            row = self.connection.execute('SELECT * FROM projects WHERE name = ?', (name,)).fetchone()
+        return IndexEntry(*row) if row else None
+
+    def entries(self) -> List[IndexEntry]:
+        with self._lock:
+            return [IndexEntry(*row) for row in self.connection.execute('SELECT * FROM projects')]
+
+    def update_dates(self) -> Dict[str, float]:
+        """
+        プロジェクト名 -> 更新日(timestamp)
+        :return:
+        """
+        with self._lock:
+            return dict(self.connection.execute('SELECT name, update_date FROM projects'))
+
+    def set_usage(self, project: str, usage: Dict[str, Tuple[int, int]], replace: bool = False):
+        """
+        コンポーネントの使用量を上書き
+        :param project:
+        :param usage: コンポーネント -> (byte, ファイル数)
+        :param replace: Trueであればusageに無いコンポーネントを削除する(プロジェクト全体を走査した場合)
+        :return:
+        """
+        with self._lock:
+            with self.connection as conn:
+                if replace:
+                    conn.execute('DELETE FROM usage WHERE project = ?', (project,))
+                conn.executemany('INSERT OR REPLACE INTO usage VALUES (?, ?, ?, ?)',
+                                 [(project, component, size, files) for component, (size, files) in usage.items()])
+
+    def add_usage(self, project: str, component: str, size: int, files: int = 0):
+        """
+        コンポーネントの使用量に加算する
+        """
+        with self._lock:
+            with self.connection as conn:
+                conn.execute('INSERT INTO usage VALUES (?, ?, ?, ?) ON CONFLICT (project, component) DO UPDATE SET '
+                             'bytes = MAX(0, bytes + excluded.bytes), files = MAX(0, files + excluded.files)',
+                             (project, component, size, files))
+
+    def copy_usage(self, src: str, dst: str):
+        with self._lock:
+            with self.connection as conn:
+                conn.execute('DELETE FROM usage WHERE project = ?', (dst,))
+                conn.execute('INSERT INTO usage SELECT ?, component, bytes, files FROM usage WHERE project = ?',
+                             (dst, src))
+
+    def usage(self, project: str) -> Dict[str, Tuple[int, int]]:
+        """
+        :param project:
+        :return: コンポーネント -> (byte, ファイル数).走査していないプロジェクトは空
+        """
+        with self._lock:
+            return {component: (size, files) for component, size, files in self.connection.execute(
+                'SELECT component, bytes, files FROM usage WHERE project = ?', (project,))}
+
+    def usage_projects(self) -> List[str]:
+        """使用量が記録されているプロジェクト"""
+        with self._lock:
+            return [row[0] for row in self.connection.execute('SELECT DISTINCT project FROM usage')]
+
+    def total_usage(self, projects: Optional[Iterable[str]] = None) -> int:
+        """
+        :param projects: 集計するプロジェクト.Noneであれば記録されている全て
+        :return: byte
+        """
+        with self._lock:
+            if projects is None:
+                return self.connection.execute('SELECT COALESCE(SUM(bytes), 0) FROM usage').fetchone()[0]
+            totals = dict(self.connection.execute('SELECT project, SUM(bytes) FROM usage GROUP BY project'))
+        return sum(totals.get(project, 0) for project in projects)
+
+    def sync(self, projects: Dict[str, Union[str, Path]], verify: bool = False, skip: Collection[str] = ()):
+        """
+        インデックスを登録済みプロジェクトに合わせる.
+        インデックスに無いプロジェクトの.prjだけを読み,登録されていないものは削除する
+        :param projects: プロジェクト名 -> プロジェクトパス
+        :param verify: Trueであれば全ての.prjのmtimeを確認し,変更されたものを読み直す
+        :param skip: .prjを読まないプロジェクト名(応答しないディレクトリにあるものなど).インデックスの内容はそのまま残す
+        :return:
+        """
+        with self._lock:
+            # 名前 -> .prjのmtime.件数が多いのでIndexEntryは作らない
+            indexed = dict(self.connection.execute('SELECT name, meta_mtime_ns FROM projects'))
+            stale = [name for name in indexed if name not in projects]
+            if stale:
+                with self.connection as conn:
+                    conn.executemany('DELETE FROM projects WHERE name = ?', [(name,) for name in stale])
+                    conn.executemany('DELETE FROM usage WHERE project = ?', [(name,) for name in stale])
+                if self._search is not None:
+                    for name in stale:
+                        self._search.remove(name)
+
+            targets = []
+            for name, path in projects.items():
+                indexed_mtime_ns = indexed.get(name)
+                if indexed_mtime_ns is not None and not verify or name in skip:
+                    continue
+                if indexed_mtime_ns is not None:
+                    try:
+                        mtime_ns = os.stat(ProjectMeta.meta_file_path(path)).st_mtime_ns
+                    except FileNotFoundError:
+                        continue
+                    if mtime_ns == indexed_mtime_ns:
+                        continue
+                targets.append((name, path))
+            self.upsert_many(self._read_metas(targets))
+
+    def rebuild(self, projects: Dict[str, Union[str, Path]]):
+        """
+        全ての.prjを読み直してインデックスを作り直す
+        :param projects: プロジェクト名 -> プロジェクトパス
+        :return:
+        """
+        with self._lock:
+            self.clear()
+            self.upsert_many(self._read_metas(projects.items()))
+
+    @staticmethod
+    def _read_metas(projects: Iterable[Tuple[str, Union[str, Path]]]) \
+            -> List[Tuple[str, Union[str, Path], ProjectMeta]]:
+        items = []
+        for name, path in projects:
+            try:
+                items.append((name, path, ProjectMeta.read(path)))
+            except FileNotFoundError:
+                continue
+        return items
+
+    def search(self, query: SearchQuery) -> List[str]:
+        """
+        :param query:
+        :return: 条件に一致するプロジェクト名(名前順)
+        """
+        with self._lock:
+            return self.search_index().search(query)
+
+    def search_index(self) -> SearchIndex:
+        """
+        検索用のメモリ上のインデックス.最初に呼ばれた時にインデックスの全件から作る
+        """
+        with self._lock:
+            if self._search is None:
+                self._search = SearchIndex(
+                    (name, SearchEntry(create_date, update_date, user, maker))
+                    for name, create_date, update_date, user, maker in self.connection.execute(
+                        'SELECT name, create_date, update_date, user, maker FROM projects'))
+            return self._search
+
+    def close(self):
+        with self._lock:
+            self._search = None
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -3,23 +3,25 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import List, Set
 
-from dataclasses_json import dataclass_json
+from app_project_maker import codec
+from app_project_maker.codec import LazyDataClassJsonMixin
+from app_project_maker.atomic_write import atomic_write_text
 
 
-@dataclass_json()
 @dataclass()
-class ProjectManageConfig:
+class ProjectManageConfig(LazyDataClassJsonMixin):
     """
     プロジェクトを管理するためのコンフィグ
     """
     # プロジェクトのフォルダのパス
     project_list: Set[str]
+    # 保存のたびに増える世代番号.他のプロセスによる変更の検出に使う
+    generation: int = 0
 
     @classmethod
     def read(cls, json_path: str) -> ProjectManageConfig:
         with open(json_path, 'r', encoding='UTF-8') as fp:
-            return ProjectManageConfig.from_json(fp.read())
+            return codec.loads(ProjectManageConfig, fp.read())
 
-    def write(self, json_path: str):
-        with open(json_path, 'w', encoding='UTF-8') as fp:
-            fp.write(self.to_json(indent=2, ensure_ascii=False))
+    def write(self, json_path: str, fsync: bool = False):
+        atomic_write_text(json_path, codec.dumps(self), fsync=fsync)
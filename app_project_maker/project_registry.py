@@ -0,0 +1,167 @@
+"""
+登録されているプロジェクト(AppProjectMaker.projects)の保持
+プロジェクト名とパスの文字列だけを保持し,Projectはアクセスされた時点で作成する.
+レイアウト通りの場所(ベースディレクトリ/名前など)にあるプロジェクト(ほとんどのプロジェクト)はパスを保存せず,名前から組み立てる.
+10万件を読み込んでもProjectとPathを作らないため,起動時間とメモリ使用量が件数に比例して増えにくい
+"""
+from __future__ import annotations
+
+import os
+import sys
+from pathlib import Path
+from typing import Callable, Dict, Generic, Iterator, List, MutableMapping, Optional, TypeVar, Union
+
+P = TypeVar('P')
+
+
+def path_stem(path: str) -> str:
+    """
+    Path(path).stemと同じ値をPathを作らずに求める
+    :param path: 末尾に区切り文字の無いパス
+    :return:
+    """
+    name = os.path.basename(path)
+    i = name.rfind('.')
+    if 0 < i < len(name) - 1:
+        return name[:i]
+    return name
+
+
+class ProjectRegistry(MutableMapping[str, P], Generic[P]):
+    """
+    プロジェクト名 -> Projectの辞書.
+    registry[name],values(),items()でアクセスしたProjectは保持し,以降は同じオブジェクトを返す.
+    パスだけが必要な場合はpath,path_strings,absolute_pathsを使うとProjectを作らない
+    :param base_dir: ベースディレクトリ
+    :param factory: (パスの文字列, 名前) -> Project
+    :param relative: 名前 -> ベースディレクトリからの相対パス(ProjectLayout.relative_path).省略時は名前
+    """
+    __slots__ = ('base_dir', '_factory', '_relative', '_prefix', '_abs_prefix', '_paths', '_projects', '_absolute')
+
+    def __init__(self, base_dir: Path, factory: Callable[[str, str], P],
+                 relative: Optional[Callable[[str], str]] = None):
+        self.base_dir = base_dir
+        self._factory = factory
+        self._relative = relative
+        # パスは件数分組み立てるのでos.path.joinではなく接頭辞の連結で作る.
+        # Path('.').joinpath(name)は'name'になるため,その場合は接頭辞を付けない
+        self._prefix = '' if str(base_dir) == '.' else os.path.join(str(base_dir), '')
+        self._abs_prefix = os.path.join(str(base_dir.absolute()), '')
+        # 名前 -> パス.レイアウト通りの場所であればNone
+        self._paths: Dict[str, Optional[str]] = {}
+        # 作成済みのProject
+        self._projects: Dict[str, P] = {}
+        # save_project用の絶対パス -> 名前.変更時に差分だけ更新する
+        self._absolute: Optional[Dict[str, str]] = None
+
+    def add(self, name: str, path: Union[str, Path]) -> None:
+        """
+        Projectを作らずに登録する.既に同じ名前があれば置き換える
+        :param name:
+        :param path: プロジェクトのパス
+        :return:
+        """
+        name = sys.intern(name)
+        if name in self._paths:
+            self._discard(name)
+        path = str(path)
+        self._paths[name] = None if path == self._prefix + self._relative_path(name) else path
+        if self._absolute is not None:
+            self._absolute[self._absolute_path(name)] = name
+
+    def path_string(self, name: str) -> str:
+        """
+        プロジェクトのパス(Project.pathの文字列と同じ).登録されていなければKeyError
+        """
+        path = self._paths[name]
+        return self._prefix + self._relative_path(name) if path is None else path
+
+    def path(self, name: str) -> Path:
+        project = self._projects.get(name)
+        if project is not None:
+            return project.path
+        return Path(self.path_string(name))
+
+    def path_strings(self) -> Dict[str, str]:
+        """
+        :return: プロジェクト名 -> パスの文字列
+        """
+        return {name: self.path_string(name) for name in self._paths}
+
+    def absolute_paths(self) -> Dict[str, str]:
+        """
+        project.jsonに保存する絶対パス -> プロジェクト名.結果は保持し,次回以降は再計算しない.
+        呼び出し元で変更しないこと
+        :return:
+        """
+        if self._absolute is None:
+            self._absolute = {self._absolute_path(name): name for name in self._paths}
+        return self._absolute
+
+    def peek(self, name: str) -> Optional[P]:
+        """
+        作成済みであればProjectを返す.作成はしない
+        """
+        return self._projects.get(name)
+
+    def materialized(self) -> List[P]:
+        """
+        作成済みのProject(アクセスされていないプロジェクトは作らない)
+        """
+        return list(self._projects.values())
+
+    def relayout(self, relative: Optional[Callable[[str], str]]) -> None:
+        """
+        レイアウトを変更する.各プロジェクトのパスは変わらず,新しいレイアウト通りの場所にあるものだけパスを保存しなくなる
+        :param relative:
+        :return:
+        """
+        paths = self.path_strings()
+        self._relative = relative
+        self._paths = {}
+        self._absolute = None
+        for name, path in paths.items():
+            self._paths[name] = None if path == self._prefix + self._relative_path(name) else path
+
+    def _relative_path(self, name: str) -> str:
+        return name if self._relative is None else self._relative(name)
+
+    def _absolute_path(self, name: str) -> str:
+        path = self._paths[name]
+        if path is None:
+            return self._abs_prefix + self._relative_path(name)
+        return path if os.path.isabs(path) else str(Path(path).absolute())
+
+    def _discard(self, name: str) -> None:
+        if self._absolute is not None:
+            self._absolute.pop(self._absolute_path(name), None)
+        del self._paths[name]
+        self._projects.pop(name, None)
+
+    def __getitem__(self, name: str) -> P:
+        project = self._projects.get(name)
+        if project is None:
+            project = self._factory(self.path_string(name), name)
+            self._projects[name] = project
+        return project
+
+    def __setitem__(self, name: str, project: P) -> None:
+        self.add(name, project.path)
+        self._projects[sys.intern(name)] = project
+
+    def __delitem__(self, name: str) -> None:
+        if name not in self._paths:
+            raise KeyError(name)
+        self._discard(name)
+
+    def __contains__(self, name) -> bool:
+        return name in self._paths
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._paths)
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def __repr__(self):
+        return f'ProjectRegistry({str(self.base_dir)!r}, {len(self._paths)} projects, {len(self._projects)} materialized)'
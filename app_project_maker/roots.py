@@ -0,0 +1,222 @@
+"""
+ベースディレクトリ以外のプロジェクト(project.jsonに登録された外部のパス,list_projectsのother_path)の確認
+外部のプロジェクトは親ディレクトリ(ルート)ごとにまとめ,ルートごとのスレッドで並列に.prjを確認する.
+ネットワークドライブなどが応答しない場合も,ルートごとのタイムアウトを過ぎたら前回の結果(roots.json)を使い,
+そのルートを古い(stale)とみなして起動を止めない.応答しないルートの確認は裏で続け,終われば次回から反映する
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+from app_project_maker import codec
+from app_project_maker.atomic_write import atomic_write_text
+from app_project_maker.codec import LazyDataClassJsonMixin
+from app_project_maker.hidden_project_config import META_HIDDEN_FILE
+from app_project_maker.log import logger
+from app_project_maker.metrics import METRICS, Operation
+
+ROOTS_FILE = 'roots.json'
+DEFAULT_ROOT_TIMEOUT = 2.0
+
+
+@dataclass()
+class RootEntry(LazyDataClassJsonMixin):
+    """1つのルートの最後に成功した確認の結果"""
+    scanned_at: datetime
+    latency: float
+    # プロジェクトのパス -> .prjが有るか
+    projects: Dict[str, bool] = field(default_factory=dict)
+
+
+@dataclass()
+class RootCache(LazyDataClassJsonMixin):
+    roots: Dict[str, RootEntry] = field(default_factory=dict)
+
+    @classmethod
+    def cache_file_path(cls, base_dir: Union[str, Path]) -> str:
+        return os.path.join(base_dir, ROOTS_FILE)
+
+    @classmethod
+    def read(cls, base_dir: Union[str, Path]) -> RootCache:
+        try:
+            with open(cls.cache_file_path(base_dir), 'r', encoding='UTF-8') as fp:
+                return codec.loads(RootCache, fp.read())
+        except (FileNotFoundError, ValueError):
+            # キャッシュなので壊れていれば作り直す
+            return RootCache()
+
+    def write(self, base_dir: Union[str, Path]):
+        atomic_write_text(self.cache_file_path(base_dir), codec.dumps(self))
+
+
+@dataclass
+class RootStatus:
+    """AppProjectMaker.root_statusで返すルートごとの状態"""
+    root: str
+    # 見つかったプロジェクト数.staleであれば前回の結果
+    projects: int = 0
+    # 今回の確認にかかった秒数.タイムアウトした場合はNone
+    latency: Optional[float] = None
+    # タイムアウトまたはエラーで確認できず,前回の結果を使った
+    stale: bool = False
+    # 最後に確認できた日時.一度も確認できていなければNone
+    scanned_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+
+class _RootScan:
+    """1ルートの確認.応答しないファイルシステムで止まっても終了を妨げないようデーモンスレッドで実行する"""
+
+    def __init__(self, root: str, paths: List[str]):
+        self.root = root
+        self.paths = paths
+        self.done = threading.Event()
+        self.result: Dict[str, bool] = {}
+        self.latency = 0.0
+        self.error: Optional[OSError] = None
+        self.thread = threading.Thread(target=self._run, name=f'root-scan:{root}', daemon=True)
+
+    def _run(self):
+        start = time.perf_counter()
+        meta_suffix = os.sep + META_HIDDEN_FILE
+        try:
+            with METRICS.measure(Operation.ROOT_SCAN):
+                for path in self.paths:
+                    try:
+                        os.stat(path + meta_suffix)
+                        self.result[path] = True
+                    except (FileNotFoundError, NotADirectoryError):
+                        self.result[path] = False
+        except OSError as e:
+            # 接続が切れたなど.見つからないのとは区別して前回の結果を使う
+            self.error = e
+        finally:
+            self.latency = time.perf_counter() - start
+            self.done.set()
+
+
+class RootScanner:
+    """
+    外部のプロジェクトをルートごとに並列に確認する.AppProjectMakerが1つ持つ
+    :param base_dir: roots.jsonを置くディレクトリ
+    :param timeout: ルートごとの待ち時間(秒).全てのルートを同時に確認するため,全体でもこの時間しか待たない
+    """
+
+    def __init__(self, base_dir: Union[str, Path], timeout: float = DEFAULT_ROOT_TIMEOUT):
+        self.base_dir = base_dir
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._cache: Optional[RootCache] = None
+        # 実行中(前回タイムアウトしたものを含む)の確認.終わるまで同じルートの確認を新たに始めない
+        self._running: Dict[str, _RootScan] = {}
+        self._status: Dict[str, RootStatus] = {}
+
+    def scan(self, paths: Iterable[str]) -> List[str]:
+        """
+        .prjを持つプロジェクトのパスを返す.
+        タイムアウトしたルートは前回の結果で判定し,一度も確認できていないパスは有るとみなす(登録を消さないため)
+        :param paths: プロジェクトのパス
+        :return: pathsのうちプロジェクトであるもの(順序は保つ)
+        """
+        paths = list(dict.fromkeys(paths))
+        if not paths:
+            return []
+        groups: Dict[str, List[str]] = {}
+        for path in paths:
+            groups.setdefault(os.path.dirname(path), []).append(path)
+
+        scans: Dict[str, _RootScan] = {}
+        started = []
+        with self._lock:
+            for root, root_paths in groups.items():
+                running = self._running.get(root)
+                if running is not None and not running.done.is_set():
+                    # 前回から応答していないルートは新たに確認を始めず,前回の確認を待つ
+                    scans[root] = running
+                    continue
+                scans[root] = self._running[root] = _RootScan(root, root_paths)
+                started.append(scans[root])
+        for scan in started:
+            scan.thread.start()
+        deadline = time.perf_counter() + self.timeout
+        for scan in scans.values():
+            scan.done.wait(max(0.0, deadline - time.perf_counter()))
+
+        found: Dict[str, bool] = {}
+        with self._lock:
+            cache = self._read_cache()
+            changed = self._collect(cache)
+            for root, root_paths in groups.items():
+                scan = scans[root]
+                entry = cache.roots.get(root)
+                known = entry.projects if entry is not None else {}
+                # 前回の確認を待った場合は,その確認に含まれないパスを前回の結果で判定する
+                if scan.done.is_set() and scan.error is None:
+                    found.update((path, scan.result.get(path, known.get(path, True))) for path in root_paths)
+                    status = RootStatus(root, sum(found[path] for path in root_paths), scan.latency, False,
+                                        entry.scanned_at)
+                else:
+                    found.update((path, known.get(path, True)) for path in root_paths)
+                    status = RootStatus(root, sum(found[path] for path in root_paths), stale=True,
+                                        scanned_at=entry.scanned_at if entry is not None else None)
+                    if scan.done.is_set():
+                        status.latency = scan.latency
+                        status.error = str(scan.error)
+                    logger.warning(f'Root Unreachable: {root} ({status.error or "timeout"}), '
+                                   f'Use Last Known Listing: {status.scanned_at}')
+                self._status[root] = status
+            if changed:
+                self._write_cache(cache)
+        return [path for path in paths if found[path]]
+
+    def status(self) -> Dict[str, RootStatus]:
+        """
+        :return: ルート -> 最後のscanでの状態
+        """
+        with self._lock:
+            return dict(self._status)
+
+    def stale_roots(self) -> Set[str]:
+        """
+        :return: 最後のscanで応答せず,前回の結果を使ったルート
+        """
+        with self._lock:
+            return {root for root, status in self._status.items() if status.stale}
+
+    def _collect(self, cache: RootCache) -> bool:
+        """
+        終わった確認の結果をキャッシュに反映し,_runningから外す
+        :return: キャッシュを変更したか
+        """
+        changed = False
+        for root, scan in list(self._running.items()):
+            if not scan.done.is_set():
+                continue
+            del self._running[root]
+            if scan.error is not None:
+                continue
+            entry = cache.roots.get(root)
+            if entry is None:
+                entry = cache.roots[root] = RootEntry(datetime.now().astimezone(), scan.latency)
+            entry.scanned_at = datetime.now().astimezone()
+            entry.latency = scan.latency
+            entry.projects.update(scan.result)
+            changed = True
+        return changed
+
+    def _read_cache(self) -> RootCache:
+        if self._cache is None:
+            self._cache = RootCache.read(self.base_dir)
+        return self._cache
+
+    def _write_cache(self, cache: RootCache):
+        try:
+            cache.write(self.base_dir)
+        except OSError as e:
+            logger.warning(f'Failed To Write {ROOTS_FILE}: {e}')
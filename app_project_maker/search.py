@@ -0,0 +1,232 @@
+"""
+プロジェクトの検索用のメモリ上のインデックス
+ProjectIndex(SQLite)の内容から最初の検索時に作り,以降はProjectIndexの更新(作成・コピー・削除・更新日の変更)に合わせて差分だけ更新する
+
+- 名前の前方一致: ソート済みの名前の配列を二分探索する
+- 名前の部分一致: 3文字ずつ(trigram)の転置リストのうち最も短いものを候補にする.2文字以下は全件を確認する
+- 作成日・更新日の範囲: (日時, 名前)のソート済み配列を二分探索する
+- user,maker: 値 -> 名前の集合
+
+条件ごとに候補数を求め,最も少ない条件の候補だけを残りの条件で確認する
+"""
+from __future__ import annotations
+
+import bisect
+import fnmatch
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+NGRAM = 3
+# fnmatchのパターンで特別な意味を持つ文字
+_WILDCARDS = '*?['
+# 前方一致の上限に使う.どの文字よりも大きい
+_MAX_CHAR = '\U0010ffff'
+
+
+class SearchEntry(NamedTuple):
+    create_date: float
+    update_date: float
+    user: str
+    maker: str
+
+
+class _Plan(NamedTuple):
+    """1つの条件による候補の作り方"""
+    # 候補数
+    size: int
+    candidates: Callable[[], Iterable[str]]
+    check: Callable[[str, SearchEntry], bool]
+    # 候補が名前順に並んでいるか
+    ordered: bool
+
+
+@dataclass(frozen=True)
+class SearchQuery:
+    """
+    AppProjectMaker.searchの条件.指定した条件を全て満たすプロジェクトを返す
+    """
+    # 名前の前方一致
+    prefix: Optional[str] = None
+    # 名前の部分一致
+    contains: Optional[str] = None
+    # 名前のパターン(fnmatch, 例: '2021_11_26_*')
+    pattern: Optional[str] = None
+    user: Optional[str] = None
+    maker: Optional[str] = None
+    # 更新日の範囲 since <= 更新日 < until
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    # 作成日の範囲
+    created_since: Optional[datetime] = None
+    created_until: Optional[datetime] = None
+
+
+def ngrams(text: str) -> Set[str]:
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+def _literal_parts(pattern: str) -> Tuple[str, str]:
+    """
+    :return: (ワイルドカードより前の接頭辞, 最も長いワイルドカードを含まない部分)
+    """
+    parts = []
+    current = ''
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c in _WILDCARDS:
+            parts.append(current)
+            current = ''
+            if c == '[':
+                # 文字クラスは読み飛ばす.fnmatchと同じく'['または'[!'の直後の']'はクラス内の文字として扱う.
+                # 閉じていなければ'['自体を文字として扱うが,候補の絞り込みには使わない
+                j = i + 1
+                if j < len(pattern) and pattern[j] == '!':
+                    j += 1
+                if j < len(pattern) and pattern[j] == ']':
+                    j += 1
+                end = pattern.find(']', j)
+                i = end if end >= 0 else i
+        else:
+            current += c
+        i += 1
+    parts.append(current)
+    return parts[0], max(parts, key=len)
+
+
+class SearchIndex:
+    """
+    名前 -> (作成日, 更新日, user, maker)のインデックス.スレッドセーフではない(ProjectIndexのロック内で使う)
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, SearchEntry]] = ()):
+        self._entries: Dict[str, SearchEntry] = dict(entries)
+        self._names: List[str] = sorted(self._entries)
+        self._by_update: List[Tuple[float, str]] = sorted((e.update_date, n) for n, e in self._entries.items())
+        self._by_create: List[Tuple[float, str]] = sorted((e.create_date, n) for n, e in self._entries.items())
+        self._ngrams: Dict[str, Set[str]] = {}
+        self._users: Dict[str, Set[str]] = {}
+        self._makers: Dict[str, Set[str]] = {}
+        for name, entry in self._entries.items():
+            self._add_postings(name, entry)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, name) -> bool:
+        return name in self._entries
+
+    def get(self, name: str) -> Optional[SearchEntry]:
+        return self._entries.get(name)
+
+    def upsert(self, name: str, entry: SearchEntry):
+        old = self._entries.get(name)
+        if old == entry:
+            return
+        if old is not None:
+            self.remove(name)
+        self._entries[name] = entry
+        bisect.insort(self._names, name)
+        bisect.insort(self._by_update, (entry.update_date, name))
+        bisect.insort(self._by_create, (entry.create_date, name))
+        self._add_postings(name, entry)
+
+    def remove(self, name: str):
+        entry = self._entries.pop(name, None)
+        if entry is None:
+            return
+        self._remove_sorted(self._names, name)
+        self._remove_sorted(self._by_update, (entry.update_date, name))
+        self._remove_sorted(self._by_create, (entry.create_date, name))
+        for gram in ngrams(name):
+            self._discard(self._ngrams, gram, name)
+        self._discard(self._users, entry.user, name)
+        self._discard(self._makers, entry.maker, name)
+
+    def search(self, query: SearchQuery) -> List[str]:
+        """
+        :param query:
+        :return: 条件に一致するプロジェクト名(名前順)
+        """
+        plans: List[_Plan] = []
+        if query.prefix:
+            plans.append(self._prefix_plan(query.prefix))
+        if query.contains:
+            plans.append(self._contains_plan(query.contains))
+        if query.pattern is not None:
+            pattern = query.pattern
+            prefix, literal = _literal_parts(pattern)
+            plans.append(self._prefix_plan(prefix) if len(prefix) >= len(literal) or len(literal) < NGRAM
+                         else self._contains_plan(literal))
+            plans.append(_Plan(len(self._entries), lambda: self._names,
+                               lambda name, entry: fnmatch.fnmatchcase(name, pattern), True))
+        if query.user is not None:
+            plans.append(self._posting_plan(self._users, query.user, lambda name, entry: entry.user == query.user))
+        if query.maker is not None:
+            plans.append(self._posting_plan(self._makers, query.maker, lambda name, entry: entry.maker == query.maker))
+        if query.since is not None or query.until is not None:
+            plans.append(self._range_plan(self._by_update, query.since, query.until, lambda entry: entry.update_date))
+        if query.created_since is not None or query.created_until is not None:
+            plans.append(self._range_plan(self._by_create, query.created_since, query.created_until,
+                                          lambda entry: entry.create_date))
+        if not plans:
+            return list(self._names)
+
+        # 候補数が最も少ない条件で候補を作り,全ての条件で確認する
+        driver = min(plans, key=lambda plan: plan.size)
+        checks = [plan.check for plan in plans]
+        entries = self._entries
+        matched = [name for name in driver.candidates() if all(check(name, entries[name]) for check in checks)]
+        if not driver.ordered:
+            matched.sort()
+        return matched
+
+    def _prefix_plan(self, prefix: str) -> _Plan:
+        lo = bisect.bisect_left(self._names, prefix)
+        hi = bisect.bisect_left(self._names, prefix + _MAX_CHAR, lo)
+        return _Plan(hi - lo, lambda: self._names[lo:hi], lambda name, entry: name.startswith(prefix), True)
+
+    def _contains_plan(self, text: str) -> _Plan:
+        def check(name: str, entry: SearchEntry) -> bool:
+            return text in name
+
+        if len(text) < NGRAM:
+            return _Plan(len(self._entries), lambda: self._names, check, True)
+        smallest = min((self._ngrams.get(gram, set()) for gram in ngrams(text)), key=len)
+        return _Plan(len(smallest), lambda: smallest, check, False)
+
+    @staticmethod
+    def _posting_plan(postings: Dict[str, Set[str]], value: str, check: Callable[[str, SearchEntry], bool]) -> _Plan:
+        names = postings.get(value, set())
+        return _Plan(len(names), lambda: names, check, False)
+
+    @staticmethod
+    def _range_plan(array: List[Tuple[float, str]], since: Optional[datetime], until: Optional[datetime],
+                    key: Callable[[SearchEntry], float]) -> _Plan:
+        start = since.timestamp() if since is not None else float('-inf')
+        end = until.timestamp() if until is not None else float('inf')
+        lo = bisect.bisect_left(array, (start, ''))
+        hi = bisect.bisect_left(array, (end, ''), lo)
+        return _Plan(hi - lo, lambda: [name for _, name in array[lo:hi]],
+                     lambda name, entry: start <= key(entry) < end, False)
+
+    def _add_postings(self, name: str, entry: SearchEntry):
+        for gram in ngrams(name):
+            self._ngrams.setdefault(gram, set()).add(name)
+        self._users.setdefault(entry.user, set()).add(name)
+        self._makers.setdefault(entry.maker, set()).add(name)
+
+    @staticmethod
+    def _discard(postings: Dict[str, Set[str]], key: str, name: str):
+        names = postings.get(key)
+        if names is not None:
+            names.discard(name)
+            if not names:
+                del postings[key]
+
+    @staticmethod
+    def _remove_sorted(array: list, item):
+        i = bisect.bisect_left(array, item)
+        if i < len(array) and array[i] == item:
+            del array[i]
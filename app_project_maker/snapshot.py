@@ -0,0 +1,344 @@
+"""
+プロジェクトのスナップショット
+スナップショットはプロジェクト/.snapshots/<id>/にプロジェクトのファイルツリーとして保存する.
+前回のスナップショットから変更されていないファイル(サイズと更新時刻が同じ)は前回のファイルへのハードリンクにし,
+変更されたファイルだけをコピー(reflinkが使えればreflink)するため,2回目以降はほとんど容量を使わない.
+どのスナップショットも完全なツリーなので,古いスナップショットはディレクトリごと削除するだけで他に影響しない
+
+スナップショットの一覧は.prjと同じくプロジェクト直下の.snapshots.jsonに,
+各スナップショットのファイル一覧は.snapshots/<id>.jsonに保存する.
+スナップショット内のファイルは書き換えない(ハードリンクで他のスナップショットと共有している)
+"""
+from __future__ import annotations
+
+import errno
+import os
+import shutil
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Union
+
+from app_project_maker import codec
+from app_project_maker.atomic_write import atomic_write_text
+from app_project_maker.blob_store import BLOB_MANIFEST_FILE, BlobManifest, hash_file
+from app_project_maker.codec import LazyDataClassJsonMixin
+from app_project_maker.copy_mode import CopyMode, _FileCopier
+from app_project_maker.error import SnapshotNotFoundError
+from app_project_maker.file_lock import FileLock
+from app_project_maker.hidden_project_config import META_HIDDEN_FILE, SNAPSHOT_DIR, SNAPSHOT_FILES, SNAPSHOT_META_FILE
+from app_project_maker.log import logger
+
+# スナップショットにも復元の対象にも含めないプロジェクト直下のファイル
+EXCLUDED = SNAPSHOT_FILES | {META_HIDDEN_FILE}
+_STAGING_PREFIX = '.tmp-'
+
+
+@dataclass()
+class SnapshotFile(LazyDataClassJsonMixin):
+    size: int
+    mtime_ns: int
+    # checksum=Trueで作成した場合のみ(sha256)
+    digest: Optional[str] = None
+
+
+@dataclass()
+class SnapshotManifest(LazyDataClassJsonMixin):
+    """
+    1つのスナップショットの内容.パスはプロジェクトからの相対パス(/区切り)
+    """
+    files: Dict[str, SnapshotFile] = field(default_factory=dict)
+    directories: List[str] = field(default_factory=list)
+
+
+@dataclass()
+class SnapshotInfo(LazyDataClassJsonMixin):
+    snapshot_id: str
+    created: datetime
+    files: int = 0
+    bytes: int = 0
+    # このスナップショットで新たにコピーしたファイル.それ以外は前回のスナップショット(またはブロブ)へのハードリンク
+    copied_files: int = 0
+    copied_bytes: int = 0
+    label: Optional[str] = None
+
+
+@dataclass()
+class SnapshotMeta(LazyDataClassJsonMixin):
+    """
+    プロジェクトのスナップショットの一覧(古い順)
+    """
+    snapshots: List[SnapshotInfo] = field(default_factory=list)
+
+    @classmethod
+    def meta_file_path(cls, directory_path: Union[str, Path]) -> str:
+        return os.path.join(directory_path, SNAPSHOT_META_FILE)
+
+    @classmethod
+    def read(cls, directory_path: Union[str, Path]) -> SnapshotMeta:
+        try:
+            with open(cls.meta_file_path(directory_path), 'r', encoding='UTF-8') as fp:
+                return codec.loads(SnapshotMeta, fp.read())
+        except FileNotFoundError:
+            return SnapshotMeta()
+
+    def write(self, directory_path: Union[str, Path]):
+        atomic_write_text(self.meta_file_path(directory_path), codec.dumps(self))
+
+
+@dataclass(frozen=True)
+class SnapshotRetention:
+    """
+    残すスナップショット.両方指定した場合はどちらかに当てはまれば残す.最新のスナップショットは常に残す
+    """
+    # 新しい方からこの数だけ残す
+    keep_last: Optional[int] = None
+    # 作成からこの期間内のものを残す
+    keep_within: Optional[timedelta] = None
+
+    def keep(self, snapshots: List[SnapshotInfo], now: datetime) -> Set[str]:
+        keep = {snapshots[-1].snapshot_id} if snapshots else set()
+        if self.keep_last is not None:
+            keep.update(info.snapshot_id for info in snapshots[-self.keep_last:] if self.keep_last > 0)
+        if self.keep_within is not None:
+            keep.update(info.snapshot_id for info in snapshots if now - info.created <= self.keep_within)
+        if self.keep_last is None and self.keep_within is None:
+            keep.update(info.snapshot_id for info in snapshots)
+        return keep
+
+
+@dataclass
+class RestoreResult:
+    snapshot_id: str
+    # 書き戻したファイル.内容が同じファイルはそのまま残す
+    restored_files: int = 0
+    restored_bytes: int = 0
+    removed_files: int = 0
+
+
+class SnapshotStore:
+    """
+    1プロジェクトのスナップショット.Project.snapshotなどから使う
+    :param project_path:
+    :param trash: 削除するディレクトリを受け取る関数(AppProjectMakerのゴミ箱に移動する).省略時はその場で削除する
+    """
+
+    def __init__(self, project_path: Union[str, Path], trash: Optional[Callable[[Path], Any]] = None):
+        self.project_path = Path(project_path)
+        self.root = self.project_path.joinpath(SNAPSHOT_DIR)
+        self.trash = trash or shutil.rmtree
+        # スナップショットの作成・削除・復元はプロセス間で1つずつ行う
+        self.lock = FileLock(self.root.joinpath('.lock'))
+
+    def list(self) -> List[SnapshotInfo]:
+        return SnapshotMeta.read(self.project_path).snapshots
+
+    def get(self, snapshot_id: str) -> SnapshotInfo:
+        for info in self.list():
+            if info.snapshot_id == snapshot_id:
+                return info
+        raise SnapshotNotFoundError(f'{self.project_path}: {snapshot_id}')
+
+    def snapshot_path(self, snapshot_id: str) -> Path:
+        return self.root.joinpath(snapshot_id)
+
+    def manifest(self, snapshot_id: str) -> SnapshotManifest:
+        try:
+            with open(self.root.joinpath(f'{snapshot_id}.json'), 'r', encoding='UTF-8') as fp:
+                return codec.loads(SnapshotManifest, fp.read())
+        except FileNotFoundError:
+            raise SnapshotNotFoundError(f'{self.project_path}: {snapshot_id}') from None
+
+    def create(self, label: Optional[str] = None, checksum: bool = False) -> SnapshotInfo:
+        """
+        スナップショットを作成する
+        :param label: 任意の説明
+        :param checksum: Trueであれば全てのファイルのハッシュを計算し,サイズと更新時刻が同じでも内容が異なるファイルを検出する
+        :return:
+        """
+        self.root.mkdir(exist_ok=True)
+        with self.lock:
+            meta = SnapshotMeta.read(self.project_path)
+            previous = meta.snapshots[-1] if meta.snapshots else None
+            previous_manifest = self.manifest(previous.snapshot_id) if previous is not None else SnapshotManifest()
+            previous_path = self.snapshot_path(previous.snapshot_id) if previous is not None else None
+            # ブロブは読み取り専用なので,変更の有無に関わらずハードリンクできる
+            blobs = set(BlobManifest.read(self.project_path).entries)
+            info = SnapshotInfo(self._new_id(meta), datetime.now().astimezone(), label=label)
+            manifest = SnapshotManifest()
+            staging = self.root.joinpath(f'{_STAGING_PREFIX}{uuid.uuid4().hex}')
+            copier = _FileCopier(CopyMode.REFLINK, lambda _: False, None)
+            try:
+                for root, dir_names, file_names in os.walk(self.project_path):
+                    relative_root = os.path.relpath(root, self.project_path)
+                    if relative_root == '.':
+                        relative_root = ''
+                        dir_names[:] = [name for name in dir_names if name not in EXCLUDED]
+                        file_names = [name for name in file_names if name not in EXCLUDED]
+                    os.makedirs(staging.joinpath(relative_root), exist_ok=True)
+                    if relative_root:
+                        manifest.directories.append(Path(relative_root).as_posix())
+                    for file_name in file_names:
+                        relative = Path(relative_root, file_name).as_posix()
+                        source = os.path.join(root, file_name)
+                        target = staging.joinpath(relative_root, file_name)
+                        st = os.stat(source)
+                        entry = SnapshotFile(st.st_size, st.st_mtime_ns, hash_file(source) if checksum else None)
+                        old = previous_manifest.files.get(relative)
+                        unchanged = old is not None and old.size == entry.size and \
+                            old.mtime_ns == entry.mtime_ns and (not checksum or old.digest == entry.digest)
+                        if not (unchanged and self._link(previous_path.joinpath(relative_root, file_name), target)
+                                or relative in blobs and self._link(Path(source), target)):
+                            copier(source, str(target))
+                            info.copied_files += 1
+                            info.copied_bytes += entry.size
+                        manifest.files[relative] = entry
+                        info.files += 1
+                        info.bytes += entry.size
+                atomic_write_text(self.root.joinpath(f'{info.snapshot_id}.json'), codec.dumps(manifest))
+                os.rename(staging, self.snapshot_path(info.snapshot_id))
+            except BaseException:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+            meta.snapshots.append(info)
+            meta.write(self.project_path)
+        logger.info(f'Snapshot: {self.project_path} {info.snapshot_id} {info.files} files '
+                    f'{info.copied_bytes / 2 ** 20:.1f} MiB copied')
+        return info
+
+    def restore(self, snapshot_id: str) -> RestoreResult:
+        """
+        プロジェクトのファイルをスナップショットの状態に戻す.
+        スナップショットに無いファイルは削除し,サイズか更新時刻が異なるファイルだけを書き戻す
+        :param snapshot_id:
+        :return:
+        """
+        result = RestoreResult(snapshot_id)
+        # 存在しなければロックファイル(.snapshots/.lock)を作る前にSnapshotNotFoundErrorを投げる
+        self.get(snapshot_id)
+        with self.lock:
+            manifest = self.manifest(snapshot_id)
+            snapshot_path = self.snapshot_path(snapshot_id)
+            blobs = set(codec.loads(BlobManifest, snapshot_path.joinpath(BLOB_MANIFEST_FILE).read_text('UTF-8'))
+                        .entries) if BLOB_MANIFEST_FILE in manifest.files else set()
+            directories = set(manifest.directories)
+            # スナップショットに無いファイルとディレクトリを削除する
+            extra_directories = []
+            for root, dir_names, file_names in os.walk(self.project_path):
+                relative_root = os.path.relpath(root, self.project_path)
+                if relative_root == '.':
+                    relative_root = ''
+                    dir_names[:] = [name for name in dir_names if name not in EXCLUDED]
+                    file_names = [name for name in file_names if name not in EXCLUDED]
+                for file_name in file_names:
+                    if Path(relative_root, file_name).as_posix() not in manifest.files:
+                        os.remove(os.path.join(root, file_name))
+                        result.removed_files += 1
+                extra_directories.extend(os.path.join(root, name) for name in dir_names
+                                         if Path(relative_root, name).as_posix() not in directories)
+            # 深い方から削除する
+            for path in reversed(extra_directories):
+                if not os.listdir(path):
+                    os.rmdir(path)
+            for directory in manifest.directories:
+                self.project_path.joinpath(*directory.split('/')).mkdir(parents=True, exist_ok=True)
+
+            copier = _FileCopier(CopyMode.REFLINK, lambda _: False, None)
+            for relative, entry in manifest.files.items():
+                target = self.project_path.joinpath(*relative.split('/'))
+                try:
+                    st = os.stat(target)
+                    if st.st_size == entry.size and st.st_mtime_ns == entry.mtime_ns:
+                        continue
+                except FileNotFoundError:
+                    pass
+                source = snapshot_path.joinpath(*relative.split('/'))
+                tmp_path = target.with_name(f'.{target.name}.{uuid.uuid4().hex}.tmp')
+                # スナップショットのファイルは書き換えられないようにコピーして戻す.ブロブはリンクのまま戻す
+                if not (relative in blobs and self._link(source, tmp_path)):
+                    copier(str(source), str(tmp_path))
+                os.replace(tmp_path, target)
+                result.restored_files += 1
+                result.restored_bytes += entry.size
+        logger.info(f'Restore Snapshot: {self.project_path} {snapshot_id} {result.restored_files} files')
+        return result
+
+    def remove(self, snapshot_id: str):
+        """
+        スナップショットを削除する.他のスナップショットと共有しているファイルは残る
+        """
+        self.get(snapshot_id)
+        with self.lock:
+            self._remove(SnapshotMeta.read(self.project_path), {snapshot_id})
+
+    def prune(self, retention: SnapshotRetention, now: Optional[datetime] = None) -> List[str]:
+        """
+        保持ポリシーに当てはまらないスナップショットを削除する.
+        ディレクトリはゴミ箱に移動するだけなので,スナップショットの大きさに関わらずすぐに終わる
+        :param retention:
+        :param now: 保持期間の基準(タイムゾーン付き).省略時は現在時刻
+        :return: 削除したスナップショット
+        """
+        if not self.root.exists():
+            return []
+        with self.lock:
+            meta = SnapshotMeta.read(self.project_path)
+            keep = retention.keep(meta.snapshots, now or datetime.now().astimezone())
+            removed = [info.snapshot_id for info in meta.snapshots if info.snapshot_id not in keep]
+            self._remove(meta, set(removed))
+            self._remove_orphans(meta)
+        return removed
+
+    def _remove(self, meta: SnapshotMeta, snapshot_ids: Set[str]):
+        if not snapshot_ids:
+            return
+        # 先に一覧から外し,削除の途中で中断しても一覧に壊れたスナップショットが残らないようにする
+        meta.snapshots = [info for info in meta.snapshots if info.snapshot_id not in snapshot_ids]
+        meta.write(self.project_path)
+        for snapshot_id in snapshot_ids:
+            self._discard(snapshot_id)
+
+    def _remove_orphans(self, meta: SnapshotMeta):
+        """作成の途中で中断したスナップショット"""
+        known = {info.snapshot_id for info in meta.snapshots}
+        for entry in os.scandir(self.root):
+            if entry.is_dir(follow_symlinks=False) and entry.name not in known:
+                self._discard(entry.name)
+
+    def _discard(self, snapshot_id: str):
+        try:
+            os.remove(self.root.joinpath(f'{snapshot_id}.json'))
+        except FileNotFoundError:
+            pass
+        path = self.snapshot_path(snapshot_id)
+        if path.exists():
+            self.trash(path)
+
+    @staticmethod
+    def _new_id(meta: SnapshotMeta) -> str:
+        """作成日時から作る.一覧の順に並ぶよう,同じ時刻であれば連番を付ける"""
+        snapshot_id = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+        last = meta.snapshots[-1].snapshot_id if meta.snapshots else ''
+        suffix = 0
+        candidate = snapshot_id
+        while candidate <= last:
+            suffix += 1
+            candidate = f'{snapshot_id}-{suffix:03d}'
+        return candidate
+
+    @staticmethod
+    def _link(source: Path, target: Path) -> bool:
+        """
+        :return: ハードリンクできなければ(リンク数の上限など)False
+        """
+        try:
+            os.link(source, target)
+            return True
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            if e.errno in (errno.EMLINK, errno.EXDEV, errno.EPERM, errno.EACCES):
+                return False
+            raise
+
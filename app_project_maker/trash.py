@@ -0,0 +1,306 @@
+"""
+プロジェクトの削除をバックグラウンドで行うためのゴミ箱
+削除対象はゴミ箱ディレクトリへrenameで即座に移動し,実際の削除は別スレッドで少しずつ行う
+削除途中で終了した場合は,次に削除する時にゴミ箱に残ったものから再開する
+同じゴミ箱を複数のプロセスが使うため,削除するものはプロセスごとの作業ディレクトリ(.reaping-*)へrenameで移してから削除する.
+作業ディレクトリは隣の.lockファイルをロックしている間だけ持ち主がいるとみなし,ロックが取れたものは終了したプロセスの残りとして引き取る
+"""
+from __future__ import annotations
+
+import errno
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple, Union
+
+from app_project_maker.file_lock import FileLock, LockTimeoutError
+from app_project_maker.log import logger
+from app_project_maker.metrics import METRICS, Operation
+
+TRASH_DIR = '.trash'
+CLAIM_PREFIX = '.reaping-'
+CLAIM_LOCK_SUFFIX = '.lock'
+
+
+class TrashReaper:
+    """
+    ゴミ箱に移動したディレクトリを削除するスレッド
+    :param trash_dirs: 再開時に走査するゴミ箱ディレクトリ
+    :param max_ops_per_sec: 1秒あたりに削除するファイル・ディレクトリ数の上限.Noneであれば制限しない
+    """
+
+    def __init__(self, trash_dirs: Iterable[Union[str, Path]], max_ops_per_sec: Optional[float] = None):
+        self.trash_dirs = [Path(d) for d in trash_dirs]
+        self.max_ops_per_sec = max_ops_per_sec
+        self._queue: Deque[Path] = deque()
+        self._current: Optional[Path] = None
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        # 削除が終わった後に呼ぶ関数
+        self._callbacks: Dict[Path, Callable[[], None]] = {}
+        # flush中は削除速度を制限しない
+        self._flushing = 0
+        # ゴミ箱ごとの作業ディレクトリとそのロック
+        self._claims: Dict[Path, Tuple[Path, FileLock]] = {}
+        # 残っていたものの走査は最初に削除する時点で1度だけ,削除スレッドで行う
+        self._resumed = False
+        self._scanning = False
+
+    def trash(self, path: Union[str, Path], trash_dir: Union[str, Path],
+              on_deleted: Optional[Callable[[], None]] = None) -> Optional[Path]:
+        """
+        ディレクトリをゴミ箱に移動し,削除を予約する
+        ゴミ箱と別のファイルシステムにある場合はその場で削除する
+        :param path: 削除するディレクトリ
+        :param trash_dir: 移動先のゴミ箱.pathと同じファイルシステム上にあること
+        :param on_deleted: 削除が終わった後に呼ぶ関数.途中で終了して次回起動時に再開した場合は呼ばれない
+        :return: ゴミ箱内のパス.その場で削除した場合はNone
+        """
+        path = Path(path)
+        trash_dir = Path(trash_dir)
+        self.resume()
+        with self._cond:
+            while True:
+                try:
+                    claim_dir = self._claim_dir(trash_dir)
+                except FileNotFoundError:
+                    # 他のインスタンスが空のゴミ箱を消した直後であれば作り直す
+                    continue
+                trashed = claim_dir.joinpath(f'{uuid.uuid4().hex}-{path.name}')
+                try:
+                    os.rename(path, trashed)
+                except FileNotFoundError:
+                    if not path.exists():
+                        raise
+                    # ゴミ箱ごと移動された場合などは作業ディレクトリを作り直す
+                    self._release_claim(trash_dir)
+                    continue
+                except OSError as e:
+                    if e.errno != errno.EXDEV:
+                        raise
+                    break
+                # 作業ディレクトリを片付ける前に予約する
+                logger.debug(f'Move To Trash: {path} -> {trashed}')
+                if on_deleted is not None:
+                    self._callbacks[trashed] = on_deleted
+                self._enqueue([trashed])
+                return trashed
+        logger.debug(f'Remove Directory: {path}')
+        with METRICS.measure(Operation.DELETE):
+            shutil.rmtree(path)
+        self._notify(on_deleted)
+        return None
+
+    def resume(self):
+        """
+        前回削除しきれなかったゴミ箱の中身の削除を再開する
+        走査は削除スレッドで行う.2回目以降は何もしない
+        :return:
+        """
+        with self._cond:
+            if self._resumed:
+                return
+            self._resumed = True
+            self._scanning = True
+        self._enqueue([])
+
+    @property
+    def pending(self) -> List[Path]:
+        with self._cond:
+            current = [self._current] if self._current is not None else []
+            return current + list(self._queue)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        予約された削除が全て終わるまで待つ
+        :param timeout: 秒
+        :return: 全て削除されたらTrue,タイムアウトした場合はFalse
+        """
+        self.resume()
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queue and self._current is None and not self._scanning,
+                                       timeout)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        速度制限を解除して,予約された削除が全て終わるまで待つ
+        :param timeout: 秒
+        :return:
+        """
+        with self._cond:
+            self._flushing += 1
+        try:
+            return self.wait(timeout)
+        finally:
+            with self._cond:
+                self._flushing -= 1
+
+    def _enqueue(self, paths: Iterable[Path]):
+        with self._cond:
+            self._queue.extend(paths)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='TrashReaper', daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                scanning = self._scanning
+            if scanning:
+                leftovers = self._claim_leftovers()
+                if leftovers:
+                    logger.info(f'Resume Deletion: {len(leftovers)} entries')
+                with self._cond:
+                    self._queue.extend(leftovers)
+                    self._scanning = False
+            with self._cond:
+                if not self._queue:
+                    self._release_claims()
+                    self._thread = None
+                    self._cond.notify_all()
+                    return
+                self._current = self._queue.popleft()
+                callback = self._callbacks.pop(self._current, None)
+            try:
+                with METRICS.measure(Operation.DELETE):
+                    self._delete(self._current)
+            except FileNotFoundError:
+                # remove_all_projectでゴミ箱ごと移動された場合など.移動先で削除される
+                logger.debug(f'Already Moved: {self._current}')
+            except Exception as e:
+                logger.warning(f'Failed To Delete: {self._current} {e!r}')
+            else:
+                self._notify(callback)
+            with self._cond:
+                self._current = None
+                if not self._queue:
+                    self._release_claims()
+                self._cond.notify_all()
+
+    def _claim_dir(self, trash_dir: Path) -> Path:
+        # self._condを取った状態で呼ぶ
+        claim = self._claims.get(trash_dir)
+        if claim is not None:
+            return claim[0]
+        trash_dir.mkdir(parents=True, exist_ok=True)
+        claim_dir = trash_dir.joinpath(f'{CLAIM_PREFIX}{uuid.uuid4().hex}')
+        claim_dir.mkdir()
+        # ロックを取るまでの間に引き取られた場合は,次のrenameが失敗して作り直す.解放は削除スレッドで行う
+        lock = FileLock(f'{claim_dir}{CLAIM_LOCK_SUFFIX}', reentrant=False)
+        lock.acquire()
+        self._claims[trash_dir] = (claim_dir, lock)
+        return claim_dir
+
+    def _release_claim(self, trash_dir: Path):
+        # self._condを取った状態で呼ぶ.ロックファイルを先に消し,途中で終了しても空の作業ディレクトリは引き取られるようにする
+        claim_dir, lock = self._claims.pop(trash_dir)
+        try:
+            os.unlink(lock.path)
+        except FileNotFoundError:
+            pass
+        try:
+            claim_dir.rmdir()
+        except OSError:
+            pass
+        lock.release()
+
+    def _release_claims(self):
+        # 削除が全て終わったら作業ディレクトリを片付け,空になったゴミ箱も消しておく(次にtrashする時に作り直す)
+        for trash_dir in list(self._claims):
+            self._release_claim(trash_dir)
+        for trash_dir in self.trash_dirs:
+            try:
+                trash_dir.rmdir()
+            except OSError:
+                pass
+
+    def _claim_leftovers(self) -> List[Path]:
+        leftovers = []
+        for trash_dir in self.trash_dirs:
+            try:
+                entries = [entry.name for entry in os.scandir(trash_dir)]
+            except FileNotFoundError:
+                continue
+            with self._cond:
+                claim = self._claims.get(trash_dir)
+            for name in entries:
+                path = trash_dir.joinpath(name)
+                if claim is not None and path == claim[0]:
+                    continue
+                if not name.startswith(CLAIM_PREFIX):
+                    claimed = self._take(trash_dir, path)
+                elif not name.endswith(CLAIM_LOCK_SUFFIX):
+                    claimed = self._take_abandoned(trash_dir, path)
+                else:
+                    continue
+                if claimed is not None:
+                    leftovers.append(claimed)
+        return leftovers
+
+    def _take(self, trash_dir: Path, path: Path) -> Optional[Path]:
+        # 作業ディレクトリへのrenameに成功したプロセスだけが削除する
+        with self._cond:
+            try:
+                claimed = self._claim_dir(trash_dir).joinpath(path.name)
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                return None
+        return claimed
+
+    def _take_abandoned(self, trash_dir: Path, claim_dir: Path) -> Optional[Path]:
+        # ロックが取れなければ持ち主のプロセスが削除中
+        lock = FileLock(f'{claim_dir}{CLAIM_LOCK_SUFFIX}', timeout=0)
+        try:
+            lock.acquire()
+        except LockTimeoutError:
+            return None
+        try:
+            return self._take(trash_dir, claim_dir)
+        finally:
+            try:
+                os.unlink(lock.path)
+            except FileNotFoundError:
+                pass
+            lock.release()
+
+    @staticmethod
+    def _notify(callback: Optional[Callable[[], None]]):
+        if callback is None:
+            return
+        try:
+            callback()
+        except Exception as e:
+            logger.warning(f'Deletion Callback Failed: {e!r}')
+
+    def _throttle(self, started: float, ops: int):
+        if self.max_ops_per_sec is None or self._flushing:
+            return
+        delay = ops / self.max_ops_per_sec - (time.monotonic() - started)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _delete(self, path: Path):
+        started = time.monotonic()
+        ops = 0
+        if path.is_symlink() or not path.is_dir():
+            path.unlink()
+            return
+        for root, dir_names, file_names in os.walk(path, topdown=False):
+            for file_name in file_names:
+                os.unlink(os.path.join(root, file_name))
+                ops += 1
+                self._throttle(started, ops)
+            for dir_name in dir_names:
+                dir_path = os.path.join(root, dir_name)
+                if os.path.islink(dir_path):
+                    os.unlink(dir_path)
+                else:
+                    os.rmdir(dir_path)
+                ops += 1
+                self._throttle(started, ops)
+        os.rmdir(path)
@@ -0,0 +1,115 @@
+"""
+プロジェクトのディスク使用量
+プロジェクト直下のディレクトリ(コンポーネント)ごとの使用量をインデックスに保存し,
+コンポーネントの作成・書き込み時にそのコンポーネントだけを更新する.プロジェクト全体を走査するのは初回とrefresh時のみ
+サイズはファイルサイズの合計で,ハードリンク(ブロブストア,HARDLINKコピー)で共有しているファイルもプロジェクトごとに数える
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+from app_project_maker.error import QuotaExceededError
+from app_project_maker.hidden_project_config import SNAPSHOT_FILES
+
+# プロジェクト直下のファイル(.prjなど)の集計に使うコンポーネント名
+ROOT_COMPONENT = ''
+
+
+@dataclass
+class DiskUsage:
+    bytes: int = 0
+    files: int = 0
+    # コンポーネント(プロジェクト直下のディレクトリ名) -> byte.プロジェクト直下のファイルはROOT_COMPONENT
+    components: Dict[str, int] = field(default_factory=dict)
+
+    def __str__(self):
+        return f'{self.bytes / 2 ** 20:.1f} MiB {self.files} files'
+
+
+def scan_directory(path: Union[str, Path]) -> Tuple[int, int]:
+    """
+    ディレクトリ以下のファイルサイズの合計とファイル数.シンボリックリンクは辿らない
+    :param path:
+    :return: (byte, ファイル数)
+    """
+    total = 0
+    files = 0
+    stack = [str(path)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            total += entry.stat(follow_symlinks=False).st_size
+                            files += 1
+                    except FileNotFoundError:
+                        continue
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+    return total, files
+
+
+def component_name(resource_path: Union[str, Path]) -> str:
+    """
+    リソースのパスを集計に使うコンポーネント名(プロジェクト直下のディレクトリ名)にする
+    scan_projectはプロジェクト直下のディレクトリ単位で数えるので,'media/video'のような入れ子のリソースは'media'に数える
+    :param resource_path: プロジェクトからの相対パス
+    :return:
+    """
+    parts = Path(resource_path).parts
+    return parts[0] if parts else ROOT_COMPONENT
+
+
+def scan_project(path: Union[str, Path]) -> Dict[str, Tuple[int, int]]:
+    """
+    プロジェクトのコンポーネントごとの使用量.スナップショットは含めない
+    :param path:
+    :return: コンポーネント -> (byte, ファイル数)
+    """
+    usage: Dict[str, Tuple[int, int]] = {}
+    root_bytes = 0
+    root_files = 0
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.name in SNAPSHOT_FILES:
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    usage[entry.name] = scan_directory(entry.path)
+                else:
+                    root_bytes += entry.stat(follow_symlinks=False).st_size
+                    root_files += 1
+            except FileNotFoundError:
+                continue
+    usage[ROOT_COMPONENT] = (root_bytes, root_files)
+    return usage
+
+
+@dataclass(frozen=True)
+class Quota:
+    """
+    :param project_bytes: 1プロジェクトあたりの上限
+    :param total_bytes: ベースディレクトリ全体の上限
+    """
+    project_bytes: Optional[int] = None
+    total_bytes: Optional[int] = None
+
+    def check(self, project_name: str, project_usage: int, total_usage: int, additional: int):
+        """
+        additional byte増やした場合に上限を超えるならQuotaExceededErrorを投げる
+        :param project_name:
+        :param project_usage: 現在のプロジェクトの使用量
+        :param total_usage: 現在の全体の使用量
+        :param additional:
+        :return:
+        """
+        if self.project_bytes is not None and project_usage + additional > self.project_bytes:
+            raise QuotaExceededError(f'{project_name}: {project_usage + additional} > {self.project_bytes} bytes')
+        if self.total_bytes is not None and total_usage + additional > self.total_bytes:
+            raise QuotaExceededError(f'total: {total_usage + additional} > {self.total_bytes} bytes')
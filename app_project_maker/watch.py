@@ -0,0 +1,319 @@
+"""
+ベースディレクトリを監視し,他のツールが作成・削除したプロジェクトをAppProjectMaker.projectsに差分で反映する
+Linuxではinotifyを使い,それ以外ではディレクトリのstatのスナップショットを定期的に比較する
+"""
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from app_project_maker.log import logger
+
+from app_project_maker.hidden_project_config import META_HIDDEN_FILE
+from app_project_maker.layout import is_shard_dir
+
+
+class ChangeKind(Enum):
+    CREATED = 1
+    REMOVED = 2
+
+
+@dataclass(frozen=True)
+class ProjectChange:
+    kind: ChangeKind
+    name: str
+    path: Path
+
+
+ChangeCallback = Callable[[ProjectChange], None]
+
+
+class PollingBackend:
+    """
+    ベースディレクトリ直下とシャードディレクトリ内のディレクトリの(inode,更新時刻)を比較して,
+    変更されたディレクトリのベースディレクトリからの相対パスを返す
+    プロジェクトディレクトリ内に.prjが作られるとディレクトリの更新時刻が変わる
+    """
+    name = 'polling'
+
+    def __init__(self, directory: Path, interval: float = 1.0):
+        self.directory = directory
+        self.interval = interval
+        self._stop = threading.Event()
+        self._snapshot = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        self._scan_directory(self.directory, '', snapshot)
+        return snapshot
+
+    def _scan_directory(self, directory, prefix: str, snapshot: Dict[str, Tuple[int, int]]):
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            snapshot[prefix + entry.name] = (entry.inode(),
+                                                             entry.stat(follow_symlinks=False).st_mtime_ns)
+                            if not prefix and is_shard_dir(entry.name):
+                                self._scan_directory(entry.path, entry.name + os.sep, snapshot)
+                    except FileNotFoundError:
+                        continue
+        except FileNotFoundError:
+            pass
+
+    def wait(self) -> Optional[Set[str]]:
+        """
+        :return: 変更された可能性のあるディレクトリ(ベースディレクトリからの相対パス).停止した場合はNone
+        """
+        if self._stop.wait(self.interval):
+            return None
+        snapshot = self._scan()
+        changed = {name for name in snapshot.keys() | self._snapshot.keys()
+                   if snapshot.get(name) != self._snapshot.get(name)}
+        self._snapshot = snapshot
+        return changed
+
+    def close(self):
+        self._stop.set()
+
+
+class InotifyBackend:
+    """
+    inotifyでベースディレクトリとシャードディレクトリを監視する.
+    .prjがまだ無いディレクトリは.prjの作成を待つために個別に監視し,.prjができたら監視をやめる
+    """
+    name = 'inotify'
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    _EVENT = struct.Struct('iIII')
+    _BASE_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+    _PROJECT_MASK = IN_CREATE | IN_MOVED_TO | IN_CLOSE_WRITE | IN_ONLYDIR
+    _SHARD_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_ONLYDIR
+
+    def __init__(self, directory: Path):
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, 'inotify is only available on Linux')
+        self.directory = directory
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        # 停止用のパイプ
+        self._wake_r, self._wake_w = os.pipe()
+        self._watches: Dict[int, Optional[str]] = {}
+        # シャードディレクトリの監視 -> シャード名
+        self._shards: Dict[int, str] = {}
+        # イベントの取りこぼしやベースディレクトリ自体の移動があった
+        self.overflow = False
+        self._base_wd = self._add_watch(directory, self._BASE_MASK)
+        self._watches[self._base_wd] = None
+        for entry in os.scandir(directory):
+            if entry.is_dir(follow_symlinks=False):
+                self._watch_directory(entry.name)
+
+    def _watch_directory(self, name: str) -> Set[str]:
+        """
+        ベースディレクトリ直下に作られたディレクトリの監視を始める
+        :return: シャードであれば,監視を始める前に既にあったプロジェクトの相対パス
+        """
+        if not is_shard_dir(name) or self.directory.joinpath(name, META_HIDDEN_FILE).exists():
+            self._watch_pending(name)
+            return set()
+        try:
+            self._shards[self._add_watch(self.directory.joinpath(name), self._SHARD_MASK)] = name
+            entries = [entry.name for entry in os.scandir(self.directory.joinpath(name))
+                       if entry.is_dir(follow_symlinks=False)]
+        except OSError as e:
+            logger.debug(f'Cannot Watch: {name} {e!r}')
+            return set()
+        existing = set()
+        for entry in entries:
+            existing.add(name + os.sep + entry)
+            self._watch_pending(name + os.sep + entry)
+        return existing
+
+    def _list_all(self) -> Set[str]:
+        names = set()
+        for entry in os.scandir(self.directory):
+            names.add(entry.name)
+            if is_shard_dir(entry.name) and entry.is_dir(follow_symlinks=False):
+                try:
+                    names.update(entry.name + os.sep + child for child in os.listdir(entry.path))
+                except OSError:
+                    continue
+        return names
+
+    def _add_watch(self, path: Path, mask: int) -> int:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), ctypes.c_uint32(mask))
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch failed: {path}')
+        return wd
+
+    def _watch_pending(self, name: str):
+        path = self.directory.joinpath(name)
+        if path.joinpath(META_HIDDEN_FILE).exists():
+            return
+        try:
+            wd = self._add_watch(path, self._PROJECT_MASK)
+        except OSError as e:
+            # 削除済み,または監視数の上限
+            logger.debug(f'Cannot Watch: {path} {e!r}')
+            return
+        # 監視を始めるまでに.prjが作られていた場合は監視しない
+        if path.joinpath(META_HIDDEN_FILE).exists():
+            self._libc.inotify_rm_watch(self._fd, wd)
+        else:
+            self._watches[wd] = name
+
+    def _unwatch(self, wd: int):
+        self._watches.pop(wd, None)
+        self._shards.pop(wd, None)
+        self._libc.inotify_rm_watch(self._fd, wd)
+
+    def wait(self) -> Optional[Set[str]]:
+        readable, _, _ = select.select([self._fd, self._wake_r], [], [])
+        if self._wake_r in readable:
+            return None
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changed: Set[str] = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0').decode(sys.getfilesystemencoding(), 'surrogateescape')
+            offset += length
+
+            if mask & (self.IN_Q_OVERFLOW | self.IN_DELETE_SELF | self.IN_MOVE_SELF):
+                # イベントが溢れた場合は全て確認する
+                self.overflow = True
+                if self.directory.is_dir():
+                    changed.update(self._list_all())
+                continue
+            if mask & self.IN_IGNORED:
+                self._watches.pop(wd, None)
+                self._shards.pop(wd, None)
+                continue
+            shard = self._shards.get(wd)
+            if shard is not None:
+                if name:
+                    changed.add(shard + os.sep + name)
+                    if mask & (self.IN_CREATE | self.IN_MOVED_TO) and mask & self.IN_ISDIR:
+                        self._watch_pending(shard + os.sep + name)
+                continue
+            parent = self._watches.get(wd, '')
+            if parent is None:
+                if not name:
+                    continue
+                changed.add(name)
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO) and mask & self.IN_ISDIR:
+                    changed.update(self._watch_directory(name))
+            elif parent:
+                changed.add(parent)
+                if name == META_HIDDEN_FILE:
+                    self._unwatch(wd)
+        return changed
+
+    def close(self):
+        os.write(self._wake_w, b'\0')
+
+    def _release(self):
+        for fd in (self._fd, self._wake_r, self._wake_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+class ProjectWatcher:
+    """
+    AppProjectMaker.projectsを監視結果に合わせて更新するスレッド
+    コールバックは監視スレッドから呼ばれる
+    """
+
+    def __init__(self, maker, backend: str = 'auto', interval: float = 1.0):
+        """
+        :param maker: AppProjectMaker
+        :param backend: 'inotify','polling','auto'(Linuxではinotify,使えなければpolling)
+        :param interval: pollingの間隔(秒)
+        """
+        self.maker = maker
+        self.callbacks: List[ChangeCallback] = []
+        directory = Path(maker.base_dir_path)
+        self.backend = None
+        if backend in ('auto', InotifyBackend.name):
+            try:
+                self.backend = InotifyBackend(directory)
+            except OSError as e:
+                if backend != 'auto':
+                    raise
+                logger.debug(f'Inotify Unavailable: {e!r}')
+        if self.backend is None:
+            self.backend = PollingBackend(directory, interval)
+        self._thread = threading.Thread(target=self._run, name='ProjectWatcher', daemon=True)
+        self._running = False
+
+    def add_callback(self, callback: ChangeCallback):
+        self.callbacks.append(callback)
+
+    def start(self) -> ProjectWatcher:
+        self._running = True
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        self._running = False
+        self.backend.close()
+        self._thread.join(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _run(self):
+        try:
+            while self._running:
+                changed = self.backend.wait()
+                if changed is None:
+                    break
+                if getattr(self.backend, 'overflow', False):
+                    self.backend.overflow = False
+                    changed.update(self.maker._watch_names())
+                for change in self.maker._apply_directory_changes(changed):
+                    for callback in list(self.callbacks):
+                        try:
+                            callback(change)
+                        except Exception as e:
+                            logger.warning(f'Watch Callback Failed: {e!r}')
+        finally:
+            if isinstance(self.backend, InotifyBackend):
+                self.backend._release()
@@ -20,11 +20,14 @@ VERSION = '0.0.3'
 
 # What packages are required for this module to be executed?
 REQUIRED = [
-    'loguru'
+    'loguru',
+    'dataclasses_json',
 ]
 
 # What packages are optional?
 EXTRAS = {
+    # 高速なjsonバックエンド(app_project_maker.codec)
+    'fast': ['orjson'],
 }
 
 # The rest you shouldn't have to touch too much :)
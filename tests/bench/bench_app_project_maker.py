@@ -0,0 +1,141 @@
+"""
+AppProjectMakerの主要な操作を多数のプロジェクトで計測するベンチマーク
+
+    python -m tests.bench.bench_app_project_maker --count 100 1000 10000 --output bench.json
+    python -m tests.bench.bench_app_project_maker --count 1000 --compare bench.json
+
+結果はjsonで保存し,--compareで以前の結果と比較できる
+
+initはAppProjectMakerの作成からmaker.projectsの最初のアクセス(project.jsonの読み込みとインデックスの同期)までを計測する.
+project.jsonは最初のアクセス時に読み込むので,コンストラクタだけの時間はconstructとして別に計測する
+"""
+import argparse
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from loguru import logger
+
+from app_project_maker import AppProjectMaker
+from app_project_maker.sort import ProjectSort
+from tests.bench.generate import generate
+
+BASE_DIR = 'projects'
+
+
+def measure(func: Callable[[], object], repeat: int, number: int = 1) -> Dict[str, float]:
+    """
+    :param func: 計測する処理
+    :param repeat: 計測回数
+    :param number: 1回の計測で実行する回数.結果は1回あたりの秒数
+    :return:
+    """
+    times: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start) / number)
+    return {'repeat': repeat, 'number': number, 'min': min(times), 'median': statistics.median(times),
+            'mean': statistics.fmean(times)}
+
+
+def bench_registry(count: int, repeat: int, ops: int, generate_kwargs: dict) -> Dict[str, Dict[str, float]]:
+    work_dir = Path(tempfile.mkdtemp(prefix=f'bench_{count}_'))
+    results = {}
+    try:
+        generate(work_dir.joinpath(BASE_DIR), count, **generate_kwargs)
+
+        def new_maker():
+            return AppProjectMaker(cur_dir=str(work_dir), base_dir_path=BASE_DIR)
+
+        def load_maker():
+            maker = new_maker()
+            maker.projects
+            return maker
+
+        results['construct'] = measure(new_maker, repeat)
+        results['init'] = measure(load_maker, repeat)
+        maker = load_maker()
+        results['load_projects'] = measure(maker.load_projects, repeat)
+        results['list_projects'] = measure(maker.list_projects, repeat)
+        for sort in ProjectSort:
+            results[f'list_projects_raw[{sort.name}]'] = measure(lambda: maker.list_projects_raw(sort), repeat)
+        results['save_project'] = measure(maker.save_project, repeat)
+
+        created = iter(range(10 ** 9))
+        results['create_project'] = measure(lambda: maker.create_project(f'bench_new_{next(created):06d}'),
+                                            repeat, ops)
+        src = maker[next(iter(maker.projects))]
+        copied = iter(range(10 ** 9))
+        results['copy_project'] = measure(lambda: maker.copy_project(f'bench_copy_{next(copied):06d}', src),
+                                          repeat, ops)
+        removable = [name for name in maker.projects if name.startswith('bench_')]
+        results['remove_project'] = measure(lambda: maker.remove_project(removable.pop()),
+                                            max(1, min(repeat, len(removable) // ops)), ops)
+        results['flush_deletions'] = measure(maker.flush_deletions, 1)
+        del maker
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def environment() -> Dict[str, str]:
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  cwd=Path(__file__).parent).stdout.strip()
+    except OSError:
+        revision = ''
+    return {'revision': revision, 'python': sys.version.split()[0], 'platform': platform.platform(),
+            'date': datetime.now().isoformat(timespec='seconds')}
+
+
+def print_results(results: dict, baseline: dict = None):
+    for count, operations in results['results'].items():
+        print(f'projects={count}')
+        for operation, value in operations.items():
+            line = f'  {operation:<28} {value["median"] * 1000:10.3f} ms'
+            base = (baseline or {}).get('results', {}).get(count, {}).get(operation)
+            if base:
+                line += f'  (baseline {base["median"] * 1000:10.3f} ms, x{value["median"] / base["median"]:.2f})'
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--ops', type=int, default=10, help='create/copy/removeの1計測あたりの実行回数')
+    parser.add_argument('--components', type=int, default=2)
+    parser.add_argument('--files', type=int, default=2)
+    parser.add_argument('--file-size', type=int, default=256)
+    parser.add_argument('--output', help='結果を保存するjsonファイル')
+    parser.add_argument('--compare', help='比較する以前の結果のjsonファイル')
+    args = parser.parse_args()
+
+    logger.remove()
+    generate_kwargs = {'components': args.components, 'files': args.files, 'file_size': args.file_size}
+    results = {'environment': environment(), 'parameters': vars(args), 'results': {}}
+    for count in args.count:
+        results['results'][str(count)] = bench_registry(count, args.repeat, args.ops, generate_kwargs)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='UTF-8') as fp:
+            baseline = json.load(fp)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='UTF-8') as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+export_project / import_project のスループット計測
+
+    python -m tests.bench.bench_archive --size-mb 2048 --workers 1 4 8
+
+動画のような圧縮しにくいファイルと,検出結果のような圧縮しやすいファイルを半分ずつ持つプロジェクトを作成し,
+圧縮スレッド数ごとに書き出しと取り込みの速度を計測する.書き出し先は/dev/nullに相当するカウンタで,ディスク書き込みは含まない
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from loguru import logger
+
+from app_project_maker import AppProjectMaker
+
+CHUNK = 2 ** 20
+
+
+class NullWriter:
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, data: bytes) -> int:
+        self.bytes += len(data)
+        return len(data)
+
+
+def fill(maker: AppProjectMaker, size_mb: int, file_mb: int = 64):
+    project = maker.create_project('Bench')
+    random_chunk = os.urandom(CHUNK)
+    text_chunk = b''.join(f'{i},{i * 7 % 1000},{i * 13 % 1000},person\n'.encode() for i in range(CHUNK // 24))[:CHUNK]
+    for component, chunk in (('video', random_chunk), ('detection', text_chunk)):
+        directory = project.path.joinpath(component)
+        directory.mkdir()
+        for i in range(max(1, size_mb // 2 // file_mb)):
+            with open(directory.joinpath(f'{i:04d}.bin'), 'wb') as fp:
+                for _ in range(file_mb):
+                    fp.write(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=1024)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--level', type=int, default=6)
+    args = parser.parse_args()
+
+    logger.remove()
+    work_dir = tempfile.mkdtemp(prefix='bench_archive_')
+    try:
+        source = AppProjectMaker(cur_dir=os.path.join(work_dir, 'source'), base_dir_path='projects')
+        fill(source, args.size_mb)
+        print(f'size={args.size_mb}MiB level={args.level} cpus={os.cpu_count()}')
+        for workers in args.workers:
+            stats = source.export_project('Bench', NullWriter(), level=args.level, workers=workers)
+            print(f'  export workers={workers:<3} {stats.elapsed:8.2f}s {stats.bytes_per_sec / 2 ** 20:8.1f} MiB/s '
+                  f'ratio={stats.compressed_bytes / stats.bytes:.2f}')
+
+        archive_path = os.path.join(work_dir, 'bench.tar.gz')
+        with open(archive_path, 'wb') as fp:
+            source.export_project('Bench', fp, level=args.level, workers=max(args.workers))
+        target = AppProjectMaker(cur_dir=os.path.join(work_dir, 'target'), base_dir_path='projects')
+        start = time.perf_counter()
+        with open(archive_path, 'rb') as fp:
+            target.import_project(fp)
+        elapsed = time.perf_counter() - start
+        print(f'  import               {elapsed:8.2f}s {args.size_mb / elapsed:8.1f} MiB/s')
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+永続化コーデックのマイクロベンチマーク
+
+    python -m tests.bench.bench_codec --number 2000
+"""
+import argparse
+import timeit
+from datetime import datetime
+
+from app_project_maker.codec import CompiledCodec, DataclassesJsonCodec, orjson
+from app_project_maker.config.project_config import ComponentConfig, ProjectConfig, RecordConfig
+from app_project_maker.hidden_project_config import ProjectMeta
+from app_project_maker.project_manage_config import ProjectManageConfig
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    samples = {
+        'ProjectMeta': ProjectMeta('2021_11_26_Tomato', datetime.now(), datetime.now(), 'No Name', 'Project Maker'),
+        'ProjectManageConfig(1000)': ProjectManageConfig({f'/data/.prj/project_{i:06d}' for i in range(1000)}),
+        'ProjectConfig': ProjectConfig([ComponentConfig(f'component{i}') for i in range(10)],
+                                       RecordConfig('record', 15, False, True)),
+    }
+    codecs = [('dataclasses_json', DataclassesJsonCodec()), ('compiled+json', CompiledCodec('json'))]
+    if orjson is not None:
+        codecs.append(('compiled+orjson', CompiledCodec('orjson')))
+
+    print(f'{"type":<26} {"codec":<18} {"encode us":>10} {"decode us":>10}')
+    for label, sample in samples.items():
+        cls = type(sample)
+        text = DataclassesJsonCodec().encode(sample)
+        number = max(1, args.number // 50) if 'ManageConfig' in label else args.number
+        for name, codec in codecs:
+            encode = timeit.timeit(lambda: codec.encode(sample), number=number) / number * 1e6
+            decode = timeit.timeit(lambda: codec.decode(cls, text), number=number) / number * 1e6
+            print(f'{label:<26} {name:<18} {encode:10.1f} {decode:10.1f}')
+
+
+if __name__ == '__main__':
+    main()
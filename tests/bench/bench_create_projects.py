@@ -0,0 +1,85 @@
+"""
+create_project の逐次呼び出しと create_projects の一括作成の速度比較
+
+    python -m tests.bench.bench_create_projects --count 500 --workers 16
+    python -m tests.bench.bench_create_projects --count 200 --latency 0.005
+
+--latency を指定すると mkdir と .prj の書き込みごとに待ち時間を入れ,
+ネットワークファイルシステムのような遅いディスクを模擬する
+"""
+import argparse
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from loguru import logger
+
+from app_project_maker import AppProjectMaker
+from app_project_maker import hidden_project_config
+
+
+@contextmanager
+def simulated_latency(latency: float):
+    """mkdirと.prjの書き込みにlatency秒の待ち時間を追加する"""
+    if latency <= 0:
+        yield
+        return
+    original_mkdir = Path.mkdir
+    original_write = hidden_project_config.atomic_write_text
+
+    def slow_mkdir(self, *args, **kwargs):
+        time.sleep(latency)
+        return original_mkdir(self, *args, **kwargs)
+
+    def slow_write(*args, **kwargs):
+        time.sleep(latency)
+        return original_write(*args, **kwargs)
+
+    Path.mkdir = slow_mkdir
+    hidden_project_config.atomic_write_text = slow_write
+    try:
+        yield
+    finally:
+        Path.mkdir = original_mkdir
+        hidden_project_config.atomic_write_text = original_write
+
+
+def run(count: int, workers: int, latency: float):
+    names = [f'camera{i % 8}_{i:06d}' for i in range(count)]
+    cases = [
+        ('create_project loop', lambda maker: [maker.create_project(name) for name in names]),
+        ('create_projects workers=1', lambda maker: maker.create_projects(names, workers=1)),
+        (f'create_projects workers={workers}', lambda maker: maker.create_projects(names, workers=workers)),
+    ]
+    print(f'count={count} latency={latency * 1000:.1f}ms')
+    for label, case in cases:
+        work_dir = tempfile.mkdtemp(prefix='bench_create_')
+        try:
+            maker = AppProjectMaker(cur_dir=work_dir, base_dir_path='projects')
+            with simulated_latency(latency):
+                start = time.perf_counter()
+                case(maker)
+                elapsed = time.perf_counter() - start
+            print(f'  {label:<28} {elapsed:8.3f}s {count / elapsed:10.1f} projects/s')
+            del maker
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=None, help='秒.省略時はローカルと5msの両方を計測')
+    args = parser.parse_args()
+
+    logger.remove()
+    latencies = [args.latency] if args.latency is not None else [0.0, 0.005]
+    for latency in latencies:
+        run(args.count, args.workers, latency)
+
+
+if __name__ == '__main__':
+    main()
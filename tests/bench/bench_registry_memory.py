@@ -0,0 +1,72 @@
+"""
+project.jsonの読み込み(AppProjectMaker.projects)のメモリ使用量と速度の計測
+
+    python -m tests.bench.bench_registry_memory --count 100000
+
+tests.bench.generateで作ったプロジェクト群を読み込み,tracemallocで登録内容が保持しているメモリを計測する.
+読み込み直後,1件アクセス後,全件を列挙した後,save_projectの所要時間をそれぞれ表示する.
+全件の列挙(Projectの作成)が1件あたり--max-iterate-usマイクロ秒を超えた場合は終了コード1で終わる.
+ProjectRegistry導入前はProjectを読み込み時に全て作っていたため列挙は10万件で約25msだった.
+Projectの作成を重くすると起動を遅延させた分以上に列挙・ソート・検索が遅くなるので,その退行を検出する
+"""
+import argparse
+import gc
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from loguru import logger
+
+from app_project_maker import AppProjectMaker
+from tests.bench.generate import generate, project_name
+
+
+def measure(label: str, fn):
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    print(f'  {label:<16} {elapsed * 1000:10.1f} ms {retained / 2 ** 20:10.2f} MiB')
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--work-dir', default=None, help='生成済みのディレクトリを使う場合に指定(削除しない)')
+    parser.add_argument('--max-iterate-us', type=float, default=15.0,
+                        help='全件の列挙の1件あたりの上限(マイクロ秒,tracemalloc有効時)')
+    args = parser.parse_args()
+
+    logger.remove()
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='bench_registry_memory_')
+    try:
+        base_dir = Path(work_dir, 'projects')
+        if not base_dir.joinpath('project.json').exists():
+            generate(base_dir, args.count, components=0, files=0)
+        print(f'count={args.count}')
+        maker = AppProjectMaker(cur_dir=work_dir, base_dir_path='projects')
+        tracemalloc.start()
+        projects, _ = measure('load', lambda: maker.projects)
+        measure('access one', lambda: maker[project_name(args.count // 2)])
+        _, elapsed = measure('iterate all', lambda: list(projects.values()))
+        measure('iterate paths', lambda: [project.path for project in projects.values()])
+        measure('save_project', maker.save_project)
+        tracemalloc.stop()
+        per_project = elapsed / args.count * 1e6
+        print(f'  iterate all {per_project:.2f} us/project (limit {args.max_iterate_us} us)')
+        if per_project > args.max_iterate_us:
+            sys.exit(1)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
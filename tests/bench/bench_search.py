@@ -0,0 +1,70 @@
+"""
+AppProjectMaker.searchの計測
+
+    python -m tests.bench.bench_search --count 100000
+
+tests.bench.generateで作ったプロジェクト群に対し,インデックスの作成時間と条件ごとの検索時間(中央値)を表示する.
+比較としてiter_projects(ディレクトリと.prjを走査する)の同じ条件の時間も表示する
+"""
+import argparse
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from loguru import logger
+
+from app_project_maker import AppProjectMaker
+from app_project_maker.search import SearchQuery
+from tests.bench.generate import generate, project_name
+
+
+def measure(label: str, fn, repeat: int = 200):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    print(f'  {label:<32} {statistics.median(times) * 1e6:10.1f} us {len(result):8d} hits')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--work-dir', default=None, help='生成済みのディレクトリを使う場合に指定(削除しない)')
+    args = parser.parse_args()
+
+    logger.remove()
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='bench_search_')
+    try:
+        base_dir = Path(work_dir, 'projects')
+        if not base_dir.joinpath('project.json').exists():
+            generate(base_dir, args.count, components=0, files=0)
+        print(f'count={args.count}')
+        maker = AppProjectMaker(cur_dir=work_dir, base_dir_path='projects')
+        maker.projects
+        start = time.perf_counter()
+        maker.index.search_index()
+        print(f'  {"build index":<32} {(time.perf_counter() - start) * 1000:10.1f} ms')
+
+        day = project_name(args.count // 2)[:len('2021_01_01_')]
+        index = maker.index
+        measure(f'pattern {day}*', lambda: index.search(SearchQuery(pattern=f'{day}*')))
+        measure(f'prefix {day}camera03', lambda: index.search(SearchQuery(prefix=f'{day}camera03')))
+        measure('contains 012345', lambda: index.search(SearchQuery(contains='012345')))
+        measure('pattern *_camera05_0123*', lambda: index.search(SearchQuery(pattern='*_camera05_0123*')))
+        measure('updated within a day', lambda: index.search(
+            SearchQuery(since=datetime(2021, 6, 1), until=datetime(2021, 6, 2))))
+        measure('user + prefix', lambda: index.search(SearchQuery(prefix=day, user='No Name')))
+        measure('maker.search limit=10', lambda: maker.search(pattern=f'{day}*', limit=10))
+        measure(f'iter_projects {day}*', lambda: list(maker.iter_projects(pattern=f'{day}*')), repeat=3)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
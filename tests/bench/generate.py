@@ -0,0 +1,74 @@
+"""
+ベンチマーク用のプロジェクト群を生成する
+
+    python -m tests.bench.generate /tmp/bench --count 10000
+
+create_projectを経由せずに,AppProjectMakerが作るものと同じ構成(.prj,コンポーネントディレクトリ,project.json)を直接書き込む
+"""
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from app_project_maker.hidden_project_config import ProjectMeta
+from app_project_maker.project_manage_config import ProjectManageConfig
+
+COMPONENTS = ('video', 'detection', 'optical_flow', 'record')
+
+
+def project_name(i: int) -> str:
+    # 実際の運用に近い '日付_カメラ名' 形式
+    date = datetime(2021, 1, 1) + timedelta(days=i // 16)
+    return f'{date:%Y_%m_%d}_camera{i % 16:02d}_{i:06d}'
+
+
+def generate(base_dir: Path, count: int, components: int = 2, files: int = 2, file_size: int = 256,
+             seed: int = 0) -> Path:
+    """
+    :param base_dir: AppProjectMakerのbase_dir_pathに当たるディレクトリ
+    :param count: プロジェクト数
+    :param components: 1プロジェクトあたりのコンポーネントディレクトリ数
+    :param files: 1コンポーネントあたりのファイル数
+    :param file_size: ファイルサイズ(byte)
+    :param seed:
+    :return: base_dir
+    """
+    rng = random.Random(seed)
+    base_dir = Path(base_dir)
+    base_dir.mkdir(parents=True, exist_ok=True)
+    payload = b'\0' * file_size
+    start = datetime(2021, 1, 1)
+    paths = set()
+    for i in range(count):
+        name = project_name(i)
+        path = base_dir.joinpath(name)
+        path.mkdir(exist_ok=True)
+        create_date = start + timedelta(seconds=rng.randrange(0, 86400 * 365))
+        update_date = create_date + timedelta(seconds=rng.randrange(0, 86400 * 30))
+        ProjectMeta(name, create_date, update_date, 'No Name', 'Project Maker').write_current(path)
+        for component in COMPONENTS[:components]:
+            component_path = path.joinpath(component)
+            component_path.mkdir(exist_ok=True)
+            for j in range(files):
+                with open(component_path.joinpath(f'{j:04d}.bin'), 'wb') as fp:
+                    fp.write(payload)
+        paths.add(str(path.absolute()))
+    ProjectManageConfig(paths).write(os.path.join(base_dir, 'project.json'))
+    return base_dir
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('base_dir')
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--components', type=int, default=2)
+    parser.add_argument('--files', type=int, default=2)
+    parser.add_argument('--file-size', type=int, default=256)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate(Path(args.base_dir), args.count, args.components, args.files, args.file_size, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,7 +3,12 @@ from pathlib import Path
 
 from app_project_maker import AppProjectMaker
 from app_project_maker.app_project_maker import Project
+from app_project_maker.copy_mode import CopyMode
+from app_project_maker.error import ProjectOverrideError
+from app_project_maker.file_lock import FileLock
+from app_project_maker.hidden_project_config import ProjectMeta
 from app_project_maker.project_manage_config import ProjectManageConfig
+from app_project_maker.trash import CLAIM_LOCK_SUFFIX, CLAIM_PREFIX, TrashReaper
 
 
 def test_create_project():
@@ -81,3 +86,196 @@ def test_remove_all_project():
 
     project.remove_all_project()
     assert not Path('projects').exists()
+
+
+def test_batch_save_project(tmp_path, monkeypatch):
+    project = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    writes = []
+    original_write = ProjectManageConfig.write
+
+    def count_write(self, json_path, fsync=False):
+        writes.append(len(self.project_list))
+        original_write(self, json_path, fsync)
+
+    monkeypatch.setattr(ProjectManageConfig, 'write', count_write)
+    with project.batch():
+        first = project.create_project('First')
+        project.create_project('Second')
+        project.copy_project('Third', first)
+        with project.batch():
+            project.remove_project('Second')
+        assert writes == []
+    # ブロックを抜けた時に1回だけ保存される
+    assert writes == [2]
+    assert len(ProjectManageConfig.read(project.project_manage_config_path).project_list) == 2
+
+
+def test_atomic_save_project(tmp_path, monkeypatch):
+    project = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    project.create_project('First')
+    with open(project.project_manage_config_path) as f:
+        before = f.read()
+
+    def broken_replace(src, dst):
+        raise OSError('crash')
+
+    monkeypatch.setattr('os.replace', broken_replace)
+    try:
+        project.create_project('Second')
+        assert False
+    except OSError:
+        pass
+    # 書き込みに失敗しても元のproject.jsonが残り,一時ファイルも残らない
+    with open(project.project_manage_config_path) as f:
+        assert f.read() == before
+    assert not [p for p in Path(project.base_dir_path).iterdir() if p.suffix == '.tmp']
+
+
+def test_create_projects(tmp_path):
+    project = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    project.create_project('Exist')
+    names = [f'Camera{i}' for i in range(20)]
+    result = project.create_projects(names + ['Exist'], exist_ok=False, workers=4)
+
+    assert set(result.projects) == set(names)
+    # 既存プロジェクトのエラーで他のプロジェクトの作成が止まらない
+    assert isinstance(result.errors['Exist'], ProjectOverrideError)
+    assert all(project.base_dir_path.joinpath(name, '.prj').exists() for name in names)
+    assert len(ProjectManageConfig.read(project.project_manage_config_path).project_list) == 21
+
+
+def test_copy_project_modes(tmp_path):
+    project = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    new_project: Project = project.create_project('NewCompany')
+    new_project.path.joinpath('video').mkdir()
+    new_project.path.joinpath('video', 'source.mp4').write_bytes(b'\0' * 4096)
+    new_project.path.joinpath('video', 'config.json').write_text('{}')
+    new_project.path.joinpath('video', 'weights.npy').write_bytes(b'\1' * 16)
+
+    for mode in CopyMode:
+        reports = []
+        copied = project.copy_project(f'Copy{mode.name}', new_project, mode=mode, progress=reports.append)
+        assert copied.path.joinpath('video', 'source.mp4').read_bytes() == b'\0' * 4096
+        assert copied.hidden_config().name == f'Copy{mode.name}'
+        assert reports[-1].files_done == reports[-1].files_total == 4
+
+    # 書き換えられないメディアファイルだけハードリンクされる
+    linked = project['CopyHARDLINK'].path
+    assert linked.joinpath('video', 'source.mp4').stat().st_ino == \
+           new_project.path.joinpath('video', 'source.mp4').stat().st_ino
+    for name in ('config.json', 'weights.npy'):
+        assert linked.joinpath('video', name).stat().st_ino != new_project.path.joinpath('video', name).stat().st_ino
+
+    # 判定を指定すればそれ以外のファイルもハードリンクできる
+    custom = project.copy_project('CopyCustom', new_project, mode=CopyMode.HARDLINK,
+                                  immutable=lambda path: path.endswith('.npy'))
+    assert custom.path.joinpath('video', 'weights.npy').stat().st_ino == \
+           new_project.path.joinpath('video', 'weights.npy').stat().st_ino
+    assert custom.path.joinpath('video', 'source.mp4').stat().st_ino != \
+           new_project.path.joinpath('video', 'source.mp4').stat().st_ino
+
+
+def test_remove_project_in_background(tmp_path):
+    project = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects', delete_ops_per_sec=50)
+    new_project = project.create_project('NewCompany')
+    for i in range(20):
+        new_project.path.joinpath(f'frame{i}.png').write_bytes(b'0')
+    project.remove_project('NewCompany')
+    # ディレクトリは即座に消え,登録も解除される
+    assert not new_project.path.exists()
+    assert 'NewCompany' not in ProjectManageConfig.read(project.project_manage_config_path).project_list
+    assert project.pending_deletions
+    assert project.flush_deletions(timeout=10)
+    assert not project.trash_dir_path.exists()
+
+    project.remove_all_project()
+    assert not project.base_dir_path.exists()
+    assert project.wait_deletions(timeout=10)
+    assert not project.all_trash_dir_path.exists()
+
+
+def test_resume_deletion(tmp_path):
+    trash = tmp_path.joinpath('projects', '.trash', 'left')
+    trash.mkdir(parents=True)
+    trash.joinpath('video.mp4').write_bytes(b'0')
+    project = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    # 起動時には削除を始めない
+    assert trash.exists()
+    assert project.reaper._thread is None
+    assert project.wait_deletions(timeout=10)
+    assert not trash.exists()
+
+
+def test_resume_deletion_from_processes(tmp_path):
+    trash_dir = tmp_path.joinpath('.trash')
+    for i in range(50):
+        trash_dir.joinpath(f'left{i}', 'sub').mkdir(parents=True)
+        trash_dir.joinpath(f'left{i}', 'sub', 'video.mp4').write_bytes(b'0')
+    # 終了したプロセスの作業ディレクトリは引き取り,削除中のものには触らない
+    trash_dir.joinpath(f'{CLAIM_PREFIX}dead').mkdir()
+    trash_dir.joinpath(f'{CLAIM_PREFIX}dead', 'video.mp4').write_bytes(b'0')
+    trash_dir.joinpath(f'{CLAIM_PREFIX}dead{CLAIM_LOCK_SUFFIX}').touch()
+    alive = trash_dir.joinpath(f'{CLAIM_PREFIX}alive')
+    alive.mkdir()
+    alive.joinpath('video.mp4').write_bytes(b'0')
+    lock = FileLock(f'{alive}{CLAIM_LOCK_SUFFIX}')
+    lock.acquire()
+
+    reapers = [TrashReaper([trash_dir]) for _ in range(4)]
+    claimed = [reaper._claim_leftovers() for reaper in reapers]
+    # 同じものを複数のreaperが削除しない
+    assert sum(map(len, claimed)) == 51
+    for reaper in reapers:
+        reaper.resume()
+    for reaper in reapers:
+        assert reaper.wait(timeout=10)
+    assert sorted(path.name for path in trash_dir.iterdir()) == [alive.name, f'{alive.name}{CLAIM_LOCK_SUFFIX}']
+    assert alive.joinpath('video.mp4').exists()
+
+    lock.release()
+    assert TrashReaper([trash_dir]).wait(timeout=10)
+    assert not trash_dir.exists()
+
+
+def test_hidden_config_cache(tmp_path, monkeypatch):
+    project = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    new_project = project.create_project('NewCompany')
+    reads = []
+    original_read = ProjectMeta.read.__func__
+
+    def count_read(cls, directory_path):
+        reads.append(directory_path)
+        return original_read(cls, directory_path)
+
+    monkeypatch.setattr(ProjectMeta, 'read', classmethod(count_read))
+    new_project.hidden_config()
+    new_project.hidden_config()
+    assert len(reads) == 1
+
+    # 他から書き換えられた場合は読み直す
+    meta = original_read(ProjectMeta, new_project.path)
+    meta.user = 'Other'
+    meta.write_current(new_project.path)
+    assert new_project.hidden_config().user == 'Other'
+    assert len(reads) == 2
+
+
+def test_update_config_date_write_behind(tmp_path, monkeypatch):
+    project = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects', meta_write_behind=60)
+    new_project = project.create_project('NewCompany')
+    writes = []
+    original_write = ProjectMeta.write_current
+
+    def count_write(self, directory_path):
+        writes.append(self.update_date)
+        original_write(self, directory_path)
+
+    monkeypatch.setattr(ProjectMeta, 'write_current', count_write)
+    for _ in range(50):
+        new_project.update_config_date()
+    # 最初の1回だけ書き込まれ,残りはまとめて遅延される
+    assert len(writes) == 1
+    last = new_project.hidden_config().update_date
+    project.flush()
+    assert len(writes) == 2
+    assert ProjectMeta.read(new_project.path).update_date.timestamp() == last.timestamp()
@@ -0,0 +1,73 @@
+import io
+import tarfile
+
+import pytest
+
+from app_project_maker import AppProjectMaker
+from app_project_maker.archive import ParallelGzipWriter
+from app_project_maker.error import ArchiveError, ProjectOverrideError
+from app_project_maker.hidden_project_config import ProjectMeta
+from app_project_maker.project_manage_config import ProjectManageConfig
+
+
+def test_export_and_import_project(tmp_path):
+    source = AppProjectMaker(cur_dir=str(tmp_path.joinpath('source')), base_dir_path='projects')
+    project = source.create_project('NewCompany')
+    project.path.joinpath('video').mkdir()
+    payload = bytes(range(256)) * 4096
+    project.path.joinpath('video', 'frame.bin').write_bytes(payload)
+
+    archive = io.BytesIO()
+    stats = source.export_project('NewCompany', archive, workers=4)
+    assert stats.projects == ['NewCompany'] and stats.files == 2
+    # 連結したgzipメンバーは通常のtar.gzとして読める
+    archive.seek(0)
+    with tarfile.open(fileobj=archive, mode='r:gz') as tar:
+        assert 'NewCompany/video/frame.bin' in tar.getnames()
+
+    target = AppProjectMaker(cur_dir=str(tmp_path.joinpath('target')), base_dir_path='projects')
+    archive.seek(0)
+    imported = target.import_project(archive, name='Imported')
+    assert imported.name == 'Imported'
+    assert imported.path.joinpath('video', 'frame.bin').read_bytes() == payload
+    assert ProjectMeta.read(imported.path).name == 'Imported'
+    assert target.index.get('Imported') is not None
+    registry = ProjectManageConfig.read(target.project_manage_config_path)
+    assert registry.project_list == {str(imported.path.absolute())}
+    assert not [p for p in target.base_dir_path.iterdir() if p.name.startswith('.import-')]
+
+    archive.seek(0)
+    with pytest.raises(ProjectOverrideError):
+        target.import_project(archive, name='Imported')
+
+
+def test_export_many_projects(tmp_path):
+    source = AppProjectMaker(cur_dir=str(tmp_path.joinpath('source')), base_dir_path='projects')
+    for name in ('First', 'Second', 'Third'):
+        source.create_project(name).path.joinpath('data.bin').write_bytes(name.encode() * 1000)
+
+    archive = io.BytesIO()
+    source.export_projects(['First', 'Third'], archive)
+
+    target = AppProjectMaker(cur_dir=str(tmp_path.joinpath('target')), base_dir_path='projects')
+    archive.seek(0)
+    with pytest.raises(ArchiveError):
+        target.import_project(archive)
+    archive.seek(0)
+    assert [p.name for p in target.import_projects(archive)] == ['First', 'Third']
+    assert set(target.projects) == {'First', 'Third'}
+
+
+def test_import_rejects_unsafe_paths(tmp_path):
+    archive = io.BytesIO()
+    with ParallelGzipWriter(archive) as writer, tarfile.open(fileobj=writer, mode='w|') as tar:
+        info = tarfile.TarInfo('Evil/../../escape.txt')
+        info.size = 1
+        tar.addfile(info, io.BytesIO(b'0'))
+
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    archive.seek(0)
+    with pytest.raises(ArchiveError):
+        maker.import_project(archive)
+    assert not tmp_path.joinpath('escape.txt').exists()
+    assert maker.projects == {}
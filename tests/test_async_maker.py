@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app_project_maker import AppProjectMaker
+from app_project_maker.async_maker import AsyncAppProjectMaker, AsyncProject
+from app_project_maker.error import ProjectOverrideError
+from app_project_maker.sort import ProjectSort
+
+
+def test_async_operations(tmp_path):
+    async def main():
+        async with await AsyncAppProjectMaker.open(str(tmp_path), base_dir_path='projects') as maker:
+            # 登録の変更は直列に実行され,同時に作成しても全て残る
+            projects = await asyncio.gather(*(maker.create_project(f'Project{i}') for i in range(20)))
+            assert all(isinstance(project, AsyncProject) for project in projects)
+            assert len(maker.maker.projects) == 20
+            assert (await projects[0].hidden_config()).name == 'Project0'
+
+            await projects[0].update_config_date()
+            assert [p.name for p in await maker.list_projects(ProjectSort.DESCENT)][0] == 'Project0'
+
+            copied = await maker.copy_project('Copied', projects[0])
+            assert copied.path.joinpath('.prj').exists()
+            with pytest.raises(ProjectOverrideError):
+                await maker.copy_project('Copied', projects[1])
+
+            await maker.remove_project('Project1', wait=True)
+            assert not await maker.exist_project('Project1')
+            return maker.maker
+
+    maker = asyncio.run(main())
+    assert len(maker.projects) == 20
+
+
+def test_event_loop_is_not_blocked(tmp_path):
+    async def main():
+        maker = await AsyncAppProjectMaker.open(str(tmp_path), base_dir_path='projects', max_workers=2)
+        project = await maker.create_project('Slow')
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        def slow(_):
+            time.sleep(0.3)
+
+        task = asyncio.ensure_future(ticker())
+        await maker.run(slow, project.project)
+        task.cancel()
+        await maker.aclose()
+        return ticks
+
+    assert asyncio.run(main()) >= 10
+
+
+def test_cancel_copy(tmp_path):
+    async def main():
+        maker = await AsyncAppProjectMaker.open(str(tmp_path), base_dir_path='projects')
+        project = await maker.create_project('Source')
+        for i in range(200):
+            project.path.joinpath(f'frame{i:03d}.png').write_bytes(b'0' * 1000)
+
+        def slow_progress(_):
+            time.sleep(0.005)
+
+        task = asyncio.ensure_future(maker.copy_project('Copied', project, progress=slow_progress))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert 'Copied' not in maker.maker.projects
+        assert not maker.maker.base_dir_path.joinpath('Copied').exists()
+
+        # 同じ名前で再度コピーできる
+        copied = await maker.copy_project('Copied', project)
+        assert len(list(copied.path.glob('frame*.png'))) == 200
+        await maker.aclose()
+
+    asyncio.run(main())
+
+
+def test_copy_loads_registry_in_executor(tmp_path, monkeypatch):
+    source = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects').create_project('Source')
+    loaded_in = []
+    load = AppProjectMaker._load
+
+    def record(self):
+        loaded_in.append(threading.current_thread())
+        load(self)
+
+    monkeypatch.setattr(AppProjectMaker, '_load', record)
+
+    async def main():
+        # 読み込み前のAppProjectMakerでも,project.jsonの読み込みでイベントループを止めない
+        maker = AsyncAppProjectMaker(AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects'))
+        copied = await maker.copy_project('Copied', source)
+        assert copied.path.joinpath('.prj').exists()
+        await maker.aclose()
+
+    asyncio.run(main())
+    assert loaded_in and threading.main_thread() not in loaded_in
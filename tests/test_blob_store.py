@@ -0,0 +1,80 @@
+import os
+from typing import Dict
+
+from app_project_maker import AppProjectMaker, AbstractComponent
+from app_project_maker.blob_store import BlobManifest
+from app_project_maker.copy_mode import CopyMode
+
+WEIGHTS = b'weights' * 100000
+
+
+class ModelComponent(AbstractComponent):
+    """モデルの重みを配置するコンポーネント"""
+
+    def create(self):
+        path = self.resource_directory.joinpath('model.bin')
+        path.write_bytes(WEIGHTS)
+        self.register_resource(path)
+
+    def valid(self) -> bool:
+        return self.resource_directory.joinpath('model.bin').exists()
+
+    @property
+    def resources(self) -> Dict[str, str]:
+        return {'model': str(self.resource_directory.joinpath('model.bin'))}
+
+
+def test_components_share_blobs(tmp_path):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects', blob_store=True)
+    first = maker.create_project('First')
+    second = maker.create_project('Second')
+    first.add_component('model', 'model', ModelComponent)
+    second.add_component('model', 'model', ModelComponent)
+    first_model = first.path.joinpath('model', 'model.bin')
+    assert os.path.samefile(first_model, second.path.joinpath('model', 'model.bin'))
+    assert BlobManifest.read(first.path).entries == {'model/model.bin': maker.blob_store.digests(first.path)[0]}
+
+    copied = maker.copy_project('Copied', first, mode=CopyMode.COPY)
+    assert os.path.samefile(first_model, copied.path.joinpath('model', 'model.bin'))
+    report = maker.blob_report()
+    assert report.blobs == 1 and report.references == 3
+    assert report.saved_bytes == len(WEIGHTS) * 2
+
+    # 他のプロジェクトが参照している間は解放しない
+    digest = maker.blob_store.digests(first.path)[0]
+    maker.remove_project('First')
+    maker.remove_project('Copied')
+    assert maker.wait_deletions(timeout=10)
+    assert maker.blob_store.references(digest) == 1
+    maker.remove_project('Second')
+    assert maker.wait_deletions(timeout=10)
+    assert not maker.blob_store.blob_path(digest).exists()
+
+    # 再起動後もストアは有効
+    assert AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects').blob_store is not None
+
+
+def test_gc_and_detach(tmp_path):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects', blob_store=True)
+    project = maker.create_project('Camera')
+    video = project.path.joinpath('video')
+    video.mkdir()
+    for i in range(3):
+        video.joinpath(f'{i}.mp4').write_bytes(b'frame' * (i + 1))
+    assert len(project.register_resources(video)) == 3
+
+    maker.blob_store.detach(project.path, video.joinpath('0.mp4'))
+    video.joinpath('0.mp4').write_bytes(b'edited')
+    assert 'video/0.mp4' not in BlobManifest.read(project.path).entries
+    assert maker.blob_report().unreferenced == 1
+    assert len(maker.gc_blobs().removed) == 1
+    assert maker.blob_report().blobs == 2
+
+
+def test_disabled_by_default(tmp_path):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    project = maker.create_project('Camera')
+    project.add_component('model', 'model', ModelComponent)
+    assert maker.blob_store is None
+    assert not project.path.joinpath('.blobs.json').exists()
+    assert maker.blob_report().blobs == 0
@@ -0,0 +1,43 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app_project_maker import codec
+from app_project_maker.codec import CompiledCodec, DataclassesJsonCodec
+from app_project_maker.config.config import OutputVideoSize
+from app_project_maker.config.project_config import ComponentConfig, ProjectConfig, RecordConfig
+from app_project_maker.hidden_project_config import ProjectMeta
+from app_project_maker.project_manage_config import ProjectManageConfig
+
+SAMPLES = [
+    ProjectMeta('2021_11_26_Tomato', datetime.now(), datetime.now(), 'ユーザー', 'Project Maker'),
+    ProjectMeta('Epoch', datetime.fromtimestamp(86400, tz=timezone.utc)),
+    ProjectMeta('Tiny', datetime.fromtimestamp(0.00001, tz=timezone.utc)),
+    ProjectManageConfig(set()),
+    ProjectManageConfig({'/data/.prj/a', '/data/.prj/ß "quoted"'}),
+    ProjectConfig([ComponentConfig('video'), ComponentConfig('detection')], RecordConfig('record', 15, False, True)),
+    OutputVideoSize(500, -1),
+]
+
+
+@pytest.mark.parametrize('backend', [
+    'json',
+    pytest.param('orjson', marks=pytest.mark.skipif(codec.orjson is None, reason='orjson is not installed')),
+])
+@pytest.mark.parametrize('sample', SAMPLES, ids=lambda s: type(s).__name__)
+def test_compiled_codec_is_byte_compatible(backend, sample):
+    reference = DataclassesJsonCodec()
+    compiled = CompiledCodec(backend)
+    text = compiled.encode(sample)
+    assert text == reference.encode(sample)
+    assert compiled.decode(type(sample), text) == reference.decode(type(sample), text)
+
+
+def test_set_codec(tmp_path):
+    previous = codec.set_codec('dataclasses_json')
+    try:
+        ProjectMeta.write(tmp_path, 'Reference')
+        reference = ProjectMeta.read(tmp_path)
+    finally:
+        codec.set_codec(previous)
+    assert ProjectMeta.read(tmp_path) == reference
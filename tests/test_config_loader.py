@@ -0,0 +1,74 @@
+from dataclasses import replace
+
+import pytest
+
+from app_project_maker import AppProjectMaker
+from app_project_maker.config.loader import ConfigLoader
+from app_project_maker.config.project_config import ComponentConfig, DetectionConfig, ProjectConfig, RecordConfig
+from app_project_maker.error import ConfigValidationError
+
+CONFIG = ProjectConfig([ComponentConfig('camera.mp4')], RecordConfig('record', 5, True, False))
+
+
+def test_project_config_is_memoized_and_reloaded(tmp_path, monkeypatch):
+    project = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects').create_project('Camera')
+    loader = project.config_loader(ProjectConfig, debounce=0)
+    loader.write(CONFIG)
+    assert project.config() == CONFIG
+    assert project.config() is project.config()
+    assert loader.loads == 1
+
+    changes = []
+    loader.subscribe(lambda new, old, changed: changes.append(changed))
+    loader.write(replace(CONFIG, record=replace(CONFIG.record, interval_minutes=10)))
+    assert project.config().record.interval_minutes == 10
+    assert changes == [{'record.interval_minutes'}]
+
+    # 外部から壊れた設定を書かれても前回の設定を使い続ける
+    loader.path.write_text('{"components": [], "record": {"directory": "record"}}')
+    assert project.config().record.interval_minutes == 10
+    assert len(changes) == 1
+
+
+def test_debounce_skips_stat(tmp_path, monkeypatch):
+    path = tmp_path.joinpath('record_config.json')
+    ConfigLoader(path, RecordConfig).write(CONFIG.record)
+    loader = ConfigLoader(path, RecordConfig, debounce=60)
+    assert loader.get() == CONFIG.record
+
+    def fail(*args, **kwargs):
+        raise AssertionError('stat called')
+
+    monkeypatch.setattr('app_project_maker.config.loader.os.stat', fail)
+    for _ in range(100):
+        assert loader.get() == CONFIG.record
+
+
+def test_validation_at_load(tmp_path):
+    path = tmp_path.joinpath('detection_config.json')
+    path.write_text('{"gpu": true, "text_color": [255, 0], "size_w": 640, "size_h": 480}')
+    with pytest.raises(ConfigValidationError):
+        ConfigLoader(path, DetectionConfig).get()
+    path.write_text('{"gpu": true, "text_color": [255, 0, 0], "size_w": 640, "size_h": 480}')
+    assert ConfigLoader(path, DetectionConfig).get().text_color == (255, 0, 0)
+
+
+@pytest.mark.parametrize('cls, text', [
+    # 文字列の真偽値はbool()で変換するとTrueになる
+    (RecordConfig, '{"directory": "record", "interval_minutes": 5, "record_raw": "false", "record_detection": false}'),
+    (DetectionConfig, '{"gpu": "0", "text_color": [255, 0, 0], "size_w": 640, "size_h": 480}'),
+    # intのフィールドの小数
+    (DetectionConfig, '{"gpu": true, "text_color": [255, 0, 0], "size_w": 1.5, "size_h": 480}'),
+    (DetectionConfig, '{"gpu": true, "text_color": [255, 0.5, 0], "size_w": 640, "size_h": 480}'),
+    # strのフィールドの数値
+    (RecordConfig, '{"directory": 5, "interval_minutes": 5, "record_raw": false, "record_detection": false}'),
+    (ProjectConfig, '{"components": [{"resource_path": 1}], '
+                    '"record": {"directory": "r", "interval_minutes": 5, "record_raw": false, "record_detection": false}}'),
+    # boolのフィールドの数値
+    (RecordConfig, '{"directory": "record", "interval_minutes": 5, "record_raw": 0, "record_detection": false}'),
+])
+def test_values_are_not_coerced_at_load(tmp_path, cls, text):
+    path = tmp_path.joinpath('config.json')
+    path.write_text(text)
+    with pytest.raises(ConfigValidationError):
+        ConfigLoader(path, cls).get()
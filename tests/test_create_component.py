@@ -1,3 +1,124 @@
+import time
+from pathlib import Path
+from typing import Dict
+
+import pytest
+
+from app_project_maker import AppProjectMaker, AbstractComponent
+from app_project_maker.app_project_maker import ComponentSpec
+from app_project_maker.error import ComponentDependencyError
+
 
 def test_something():
-    pass
\ No newline at end of file
+    pass
+
+
+class SlowComponent(AbstractComponent):
+    """作成に時間がかかるコンポーネント"""
+    delay = 0.2
+
+    def create(self):
+        time.sleep(self.delay)
+        self.resource_directory.joinpath('config.json').write_text('{}')
+
+    def valid(self) -> bool:
+        return self.resource_directory.joinpath('config.json').exists()
+
+    @property
+    def resources(self) -> Dict[str, str]:
+        return {'config': str(self.resource_directory.joinpath('config.json'))}
+
+
+class BrokenComponent(SlowComponent):
+    def create(self):
+        raise RuntimeError('model file not found')
+
+
+def test_add_components_in_parallel(tmp_path):
+    project = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects').create_project('Camera')
+    specs = [(f'camera{i}.mp4', f'component{i}', SlowComponent) for i in range(5)]
+
+    start = time.perf_counter()
+    results = project.add_components(specs, max_workers=5)
+    assert time.perf_counter() - start < SlowComponent.delay * 5
+    assert all(result.created and result.error is None for result in results.values())
+    assert all(result.create_seconds >= SlowComponent.delay for result in results.values())
+    assert set(project.components) == {f'camera{i}.mp4' for i in range(5)}
+
+    # 2回目は既存のリソースを使う
+    results = project.add_components(specs)
+    assert not any(result.created for result in results.values())
+    assert Path(results['camera0.mp4'].resources['config']).exists()
+
+
+def test_add_components_dependencies(tmp_path):
+    project = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects').create_project('Camera')
+    order = []
+
+    class Recorded(SlowComponent):
+        delay = 0.01
+
+        def create(self):
+            order.append(self.resource_name)
+            super().create()
+
+    results = project.add_components([
+        ComponentSpec('flow', 'flow', Recorded, depends_on=['detection']),
+        ComponentSpec('detection', 'detection', Recorded, depends_on=['video']),
+        ComponentSpec('video', 'video', Recorded),
+        ComponentSpec('broken', 'broken', BrokenComponent),
+        ComponentSpec('after_broken', 'after_broken', Recorded, depends_on=['broken']),
+    ])
+    assert order == ['video', 'detection', 'flow']
+    assert isinstance(results['broken'].error, RuntimeError)
+    assert isinstance(results['after_broken'].error, ComponentDependencyError)
+    assert 'broken' not in project.components
+
+
+def test_add_components_rejects_cycles_before_create(tmp_path):
+    project = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects').create_project('Camera')
+    created = []
+
+    class Recorded(SlowComponent):
+        delay = 0
+
+        def create(self):
+            created.append(self.resource_name)
+            super().create()
+
+    with pytest.raises(ValueError, match='circular dependency'):
+        project.add_components([
+            ComponentSpec('video', 'video', Recorded),
+            ComponentSpec('detection', 'detection', Recorded, depends_on=['video', 'flow']),
+            ComponentSpec('flow', 'flow', Recorded, depends_on=['detection']),
+        ])
+    # 循環していないvideoも作成しない
+    assert created == []
+    assert project.components == {}
+
+
+def test_valid_result_is_cached(tmp_path):
+    calls = []
+
+    class CachedComponent(SlowComponent):
+        delay = 0
+        cache_validation = True
+
+        def valid(self) -> bool:
+            calls.append(self.resource_name)
+            return super().valid()
+
+    project = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects').create_project('Camera')
+    # 1回目は作成,2回目は作成されたリソースを検証
+    project.add_component('camera.mp4', 'video', CachedComponent)
+    project.add_component('camera.mp4', 'video', CachedComponent)
+    assert len(calls) == 2
+    project.add_component('camera.mp4', 'video', CachedComponent)
+    result = project.add_components([('camera.mp4', 'video', CachedComponent)])['camera.mp4']
+    assert result.valid_cached and not result.created
+    assert len(calls) == 2
+
+    # リソースが変わったら検証し直す
+    project.path.joinpath('video', 'frame.png').write_bytes(b'0')
+    project.add_component('camera.mp4', 'video', CachedComponent)
+    assert len(calls) == 3
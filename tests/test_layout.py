@@ -0,0 +1,118 @@
+import io
+import shutil
+
+import pytest
+
+from app_project_maker import AppProjectMaker
+from app_project_maker.error import LayoutError
+from app_project_maker.hidden_project_config import ProjectMeta
+from app_project_maker.layout import LAYOUT_FILE, LayoutKind, ProjectLayout, is_shard_dir, scan_projects
+from app_project_maker.project_manage_config import ProjectManageConfig
+from tests.test_watch import wait_until
+
+
+def test_layout_paths():
+    layout = ProjectLayout(LayoutKind.DATE)
+    assert layout.shard('2021_11_26_camera00') == 'date-2021_11'
+    assert layout.shard('NoDate').startswith('hash-')
+    assert layout.shard('NoDate') == ProjectLayout(LayoutKind.HASH).shard('NoDate')
+    assert ProjectLayout().relative_path('Flat') == 'Flat'
+    assert is_shard_dir('hash-0a') and is_shard_dir('date-2021_11')
+    assert not is_shard_dir('hash-project') and not is_shard_dir('2021_11')
+
+
+def test_sharded_project_operations(tmp_path):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects', layout='hash')
+    project = maker.create_project('Sharded')
+    shard = ProjectLayout(LayoutKind.HASH).shard('Sharded')
+    assert project.path == maker.base_dir_path.joinpath(shard, 'Sharded')
+    assert maker.candidate_project_path('Sharded') == str(project.path)
+    assert maker.exist_project('Sharded')
+    assert maker.open_project('Sharded').path == project.path
+    copied = maker.copy_project('Copied', project)
+    assert copied.path.parent.name == ProjectLayout(LayoutKind.HASH).shard('Copied')
+
+    fp = io.BytesIO()
+    maker.export_project('Sharded', fp)
+    fp.seek(0)
+    imported = maker.import_project(fp, name='Imported')
+    assert imported.path.parent.name == ProjectLayout(LayoutKind.HASH).shard('Imported')
+
+    # レイアウトはlayout.jsonから読み込まれる
+    reloaded = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    assert reloaded.layout.kind == LayoutKind.HASH
+    assert set(reloaded.projects) == {'Sharded', 'Copied', 'Imported'}
+    assert reloaded['Copied'].path == copied.path
+    assert set(reloaded.list_projects()[0]) == {'Sharded', 'Copied', 'Imported'}
+    assert [p.name for p in reloaded.iter_projects(pattern='Sha*')] == ['Sharded']
+
+    reloaded.remove_project('Copied')
+    assert not reloaded.exist_project('Copied')
+    with pytest.raises(LayoutError):
+        AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects', layout='flat')
+
+
+def test_migrate_layout(tmp_path):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    names = [f'2021_11_{i:02d}_camera' for i in range(1, 8)] + ['Other']
+    maker.create_projects(names)
+    opened = maker['2021_11_01_camera']
+    other = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    other_project = other['Other']
+
+    progress = []
+    result = maker.migrate_layout(LayoutKind.DATE, batch_size=3, progress=lambda done, total: progress.append(done))
+    assert result.moved == len(names) and result.conflicts == []
+    assert progress == [3, 6, 8]
+    assert ProjectLayout.read(maker.base_dir_path) == ProjectLayout(LayoutKind.DATE)
+    assert sorted(relative for relative, _ in scan_projects(maker.base_dir_path)) == sorted(
+        ProjectLayout(LayoutKind.DATE).relative_path(name) for name in names)
+    # 作成済みのProjectもそのまま使える
+    assert opened.path == maker.base_dir_path.joinpath('date-2021_11', '2021_11_01_camera')
+    assert opened.hidden_config().name == '2021_11_01_camera'
+    registry = ProjectManageConfig.read(maker.project_manage_config_path)
+    assert registry.project_list == {str(maker.projects.path(name).absolute()) for name in names}
+    assert maker.index.get('Other').path == str(maker.projects.path('Other').absolute())
+
+    # 他のプロセスはrefreshで移動を反映する
+    assert other.refresh()
+    assert other.layout.kind == LayoutKind.DATE
+    assert other_project.path == maker.projects.path('Other')
+    assert other['2021_11_02_camera'].path == maker.projects.path('2021_11_02_camera')
+    assert maker.migrate_layout('date').moved == 0
+
+
+def test_resume_interrupted_migration(tmp_path):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    maker.create_projects(['A', 'B'])
+    ProjectLayout(LayoutKind.HASH, previous=LayoutKind.FLAT).write(maker.base_dir_path)
+    # 移行中は移行元の場所も探す
+    resumed = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    assert resumed.project_path('A') == maker.base_dir_path.joinpath('A')
+    hash_layout = ProjectLayout(LayoutKind.HASH)
+    assert resumed.project_path('New') == maker.base_dir_path.joinpath(hash_layout.relative_path('New'))
+    assert resumed.migrate_layout('hash').moved == 2
+    assert not resumed.layout.migrating
+    assert not maker.base_dir_path.joinpath('A').exists()
+    assert resumed['A'].path == maker.base_dir_path.joinpath(hash_layout.relative_path('A'))
+    assert maker.base_dir_path.joinpath(LAYOUT_FILE).exists()
+
+
+@pytest.mark.parametrize('backend', ['inotify', 'polling'])
+def test_watch_sharded_layout(tmp_path, backend):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects', layout='hash')
+    maker.create_project('Existing')
+    try:
+        maker.watch(backend=backend, interval=0.05)
+    except OSError:
+        pytest.skip('inotify is not available')
+    try:
+        external = maker.project_path('External')
+        external.mkdir(parents=True)
+        ProjectMeta.write(external, 'External')
+        assert wait_until(lambda: 'External' in maker.projects)
+        assert maker.projects.path('External') == external
+        shutil.rmtree(maker.project_path('Existing'))
+        assert wait_until(lambda: 'Existing' not in maker.projects)
+    finally:
+        maker.unwatch()
@@ -0,0 +1,49 @@
+import io
+
+from app_project_maker import AppProjectMaker
+from app_project_maker.metrics import METRICS, Metrics, Operation
+
+
+def test_stats_cover_project_operations(tmp_path):
+    METRICS.reset()
+    events = []
+    AppProjectMaker.add_metrics_hook(events.append)
+    try:
+        maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+        project = maker.create_project('NewCompany')
+        project.path.joinpath('video.mp4').write_bytes(b'0' * 1000)
+        project.hidden_config()
+        maker.copy_project('Copied', project)
+        maker.remove_project('NewCompany')
+        assert maker.wait_deletions(timeout=10)
+        maker.export_project('Copied', io.BytesIO())
+    finally:
+        AppProjectMaker.remove_metrics_hook(events.append)
+
+    stats = maker.stats()
+    for name in ('mkdir', 'meta_read', 'meta_write', 'registry_load', 'registry_save', 'copy', 'delete', 'export'):
+        assert stats[name].count >= 1, name
+    assert stats['copy'].bytes >= 1000
+    assert stats['registry_save'].bytes > 0
+    assert sum(stats['meta_write'].buckets) == stats['meta_write'].count
+    assert {event.operation for event in events} >= {Operation.MKDIR, Operation.COPY, Operation.DELETE}
+
+
+def test_prometheus_text():
+    metrics = Metrics()
+    metrics.record(Operation.COPY, 0.002, bytes=10)
+    metrics.record(Operation.COPY, 0.2, bytes=20)
+    try:
+        with metrics.measure(Operation.DELETE):
+            raise OSError('busy')
+    except OSError:
+        pass
+
+    text = metrics.to_prometheus()
+    assert '# TYPE app_project_maker_operation_seconds histogram' in text
+    assert 'app_project_maker_operation_seconds_bucket{operation="copy",le="0.005"} 1' in text
+    assert 'app_project_maker_operation_seconds_bucket{operation="copy",le="+Inf"} 2' in text
+    assert 'app_project_maker_operation_seconds_count{operation="copy"} 2' in text
+    assert 'app_project_maker_operation_bytes_total{operation="copy"} 30' in text
+    assert 'app_project_maker_operation_errors_total{operation="delete"} 1' in text
+    assert metrics.snapshot()['copy'].quantile(0.5) == 0.005
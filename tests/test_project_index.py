@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+from app_project_maker import AppProjectMaker
+from app_project_maker.hidden_project_config import ProjectMeta
+from app_project_maker.sort import ProjectSort
+
+
+def test_sort_from_index(tmp_path, monkeypatch):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    old = maker.create_project('Old')
+    new = maker.create_project('New')
+    old.update_config_date(datetime.now() - timedelta(days=1))
+    new.update_config_date(datetime.now())
+
+    # ソート時に.prjを読まないこと
+    def fail(*args, **kwargs):
+        raise AssertionError('ProjectMeta.read called')
+
+    monkeypatch.setattr(ProjectMeta, 'read', fail)
+    assert [p.name for p in maker.list_projects_raw(ProjectSort.DESCENT)] == ['New', 'Old']
+    assert [p.name for p in maker.list_projects_raw(ProjectSort.ASCENT)] == ['Old', 'New']
+
+
+def test_index_survives_reload_and_rebuild(tmp_path):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    first = maker.create_project('First')
+    maker.copy_project('Second', first)
+    maker.remove_project('First')
+    assert maker.index.get('First') is None
+    assert maker.index.get('Second') is not None
+
+    # 外部ツールが.prjを書き換えた場合は再構築で反映される
+    meta = ProjectMeta.read(maker['Second'].path)
+    meta.update_date = datetime(2000, 1, 1)
+    meta.write_current(maker['Second'].path)
+    maker.rebuild_index(full=False)
+    assert maker.index.get('Second').update_date == datetime(2000, 1, 1).timestamp()
+
+    reloaded = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    assert set(e.name for e in reloaded.index.entries()) == {'Second'}
+
+
+def test_iter_projects_and_most_recent(tmp_path):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    now = datetime.now()
+    for i in range(30):
+        project = maker.create_project(f'2021_11_{i:02d}_Tomato' if i % 2 else f'2021_12_{i:02d}_Salad')
+        project.update_config_date(now - timedelta(hours=i))
+
+    assert len(list(maker.iter_projects())) == 30
+    tomato = list(maker.iter_projects(pattern='2021_11_*'))
+    assert len(tomato) == 15 and all(p.name.endswith('Tomato') for p in tomato)
+    page = list(maker.iter_projects(pattern='2021_11_*', offset=10, limit=10))
+    assert [p.name for p in page] == [p.name for p in tomato[10:]]
+    recent = list(maker.iter_projects(since=now - timedelta(hours=4, minutes=30)))
+    assert len(recent) == 5
+
+    assert [p.name for p in maker.most_recent(3)] == ['2021_12_00_Salad', '2021_11_01_Tomato', '2021_12_02_Salad']
+    assert [p.name for p in maker.most_recent(2, pattern='*Tomato')] == ['2021_11_01_Tomato', '2021_11_03_Tomato']
+    assert maker.most_recent(1)[0] is maker.projects['2021_12_00_Salad']
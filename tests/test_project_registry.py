@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from app_project_maker import AppProjectMaker
+from app_project_maker.project_manage_config import ProjectManageConfig
+from app_project_maker.project_registry import path_stem
+from app_project_maker.sort import ProjectSort
+
+
+def test_projects_are_materialized_on_access(tmp_path):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    maker.create_projects([f'Project{i}' for i in range(10)])
+    external = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='external').create_project('External')
+    maker.projects['External'] = external
+    maker.save_project()
+
+    reloaded = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    projects = reloaded.projects
+    assert len(projects) == 11
+    assert 'Project3' in projects
+    assert projects.materialized() == []
+    assert projects.path('External') == external.path
+
+    project = reloaded['Project3']
+    assert project is projects['Project3']
+    assert project.path == reloaded.base_dir_path.joinpath('Project3')
+    assert projects.materialized() == [project]
+
+    # 保存してもアクセスしていないプロジェクトは作らない
+    reloaded.create_project('New')
+    assert len(projects.materialized()) == 2
+    registry = ProjectManageConfig.read(reloaded.project_manage_config_path)
+    assert str(external.path.absolute()) in registry.project_list
+    assert len(registry.project_list) == 12
+
+    assert {project.name for project in projects.values()} == set(projects)
+    assert len(projects.materialized()) == 12
+
+
+def test_listing_does_not_build_paths(tmp_path):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    maker.create_projects([f'Project{i}' for i in range(10)])
+
+    # 全件の列挙・ソートではPathを作らない(Pathの作成が1件あたりの時間の大半を占める)
+    reloaded = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    listed = reloaded.list_projects_raw(ProjectSort.DESCENT)
+    assert len(listed) == 10
+    assert all(type(project._path) is str for project in listed)
+    assert listed[0].path == reloaded.base_dir_path.joinpath(listed[0].name)
+
+
+def test_registry_mutation(tmp_path):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    maker.create_projects(['A', 'B'])
+    maker.remove_project('A')
+    assert list(maker.projects) == ['B']
+    assert set(maker.projects.absolute_paths()) == {str(maker.base_dir_path.joinpath('B').absolute())}
+    maker.remove_all_project()
+    assert len(maker.projects) == 0
+    assert maker.projects.absolute_paths() == {}
+
+
+def test_project_slots(tmp_path):
+    project = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects').create_project('Slots')
+    with pytest.raises(AttributeError):
+        project.unknown = 1
+    assert project.components == {}
+    assert project.to_view(tag='x') == {'name': 'Slots', 'path': project.path, 'project': project, 'tag': 'x'}
+
+
+@pytest.mark.parametrize('path', ['a', 'a.b', 'a.b.c', '.hidden', 'a.', os.path.join('dir', 'x.y')])
+def test_path_stem(path):
+    from pathlib import Path
+    assert path_stem(path) == Path(path).stem
@@ -0,0 +1,46 @@
+import multiprocessing
+
+from app_project_maker import AppProjectMaker
+from app_project_maker.project_manage_config import ProjectManageConfig
+
+
+def _create_projects(cur_dir: str, worker: int, count: int):
+    maker = AppProjectMaker(cur_dir=cur_dir, base_dir_path='projects')
+    for i in range(count):
+        maker.create_project(f'worker{worker}_{i}')
+
+
+def test_concurrent_processes_keep_registrations(tmp_path):
+    AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=_create_projects, args=(str(tmp_path), worker, 10)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+        assert process.exitcode == 0
+
+    registry = ProjectManageConfig.read(str(tmp_path.joinpath('projects', 'project.json')))
+    assert len(registry.project_list) == 40
+    assert registry.generation >= 40
+
+
+def test_merge_on_save_and_refresh(tmp_path):
+    first = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    second = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    first.create_project('First')
+    second.create_project('Second')
+    # 後から保存したインスタンスが前の登録を消さない
+    registry = ProjectManageConfig.read(first.project_manage_config_path)
+    assert len(registry.project_list) == 2
+    assert set(second.projects) == {'First', 'Second'}
+
+    assert first.registry_changed()
+    assert first.refresh()
+    assert set(first.projects) == {'First', 'Second'}
+    assert not first.registry_changed()
+    assert not first.refresh()
+
+    second.remove_project('First')
+    assert first.refresh()
+    assert set(first.projects) == {'Second'}
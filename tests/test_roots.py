@@ -0,0 +1,73 @@
+import os
+import threading
+import time
+from pathlib import Path
+
+from app_project_maker import AppProjectMaker
+from app_project_maker import roots
+from app_project_maker.roots import ROOTS_FILE, RootCache
+
+
+def _external_projects(tmp_path):
+    paths = []
+    for root in ('nas1', 'nas2'):
+        external = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path=root)
+        paths.extend(str(external.create_project(f'{root}_{i}').path.absolute()) for i in range(2))
+    return paths
+
+
+def test_scan_external_roots(tmp_path):
+    paths = _external_projects(tmp_path)
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    maker.create_project('Local')
+    names, dirs = maker.list_projects(other_path=paths + [str(tmp_path.joinpath('nas1', 'missing'))])
+    assert set(names) == {'Local', 'nas1_0', 'nas1_1', 'nas2_0', 'nas2_1'}
+
+    status = maker.root_status()
+    assert set(status) == {str(tmp_path.joinpath('nas1').absolute()), str(tmp_path.joinpath('nas2').absolute())}
+    assert all(not s.stale and s.projects == 2 and s.latency is not None for s in status.values())
+    cache = RootCache.read(maker.base_dir_path)
+    assert cache.roots[str(tmp_path.joinpath('nas1').absolute())].projects[paths[0]] is True
+
+
+def test_unreachable_root_uses_last_known_listing(tmp_path, monkeypatch):
+    paths = _external_projects(tmp_path)
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    for path in paths:
+        maker.projects[os.path.basename(path)] = maker._new_project(Path(path))
+    maker.save_project()
+    # 初回の読み込みでルートごとの一覧をキャッシュする
+    assert len(AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects').projects) == 4
+    assert maker.base_dir_path.joinpath(ROOTS_FILE).exists()
+
+    # インデックスに無いプロジェクトも応答しないルートでは.prjを読まない
+    maker.index.clear()
+    # nas2が応答しなくなり,その間にnas2_1が削除された
+    os.remove(os.path.join(paths[3], '.prj'))
+    hung = str(tmp_path.joinpath('nas2'))
+    release = threading.Event()
+    stat = os.stat
+
+    def slow_stat(path, *args, **kwargs):
+        if str(path).startswith(hung):
+            release.wait(10)
+        return stat(path, *args, **kwargs)
+
+    monkeypatch.setattr(roots.os, 'stat', slow_stat)
+    try:
+        started = time.perf_counter()
+        reloaded = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects', root_timeout=0.2)
+        assert set(reloaded.projects) == {'nas1_0', 'nas1_1', 'nas2_0', 'nas2_1'}
+        assert time.perf_counter() - started < 5
+        status = reloaded.root_status()
+        assert status[str(tmp_path.joinpath('nas2').absolute())].stale
+        assert status[str(tmp_path.joinpath('nas2').absolute())].latency is None
+        assert status[str(tmp_path.joinpath('nas2').absolute())].scanned_at is not None
+        assert not status[str(tmp_path.joinpath('nas1').absolute())].stale
+    finally:
+        release.set()
+
+    # 応答が戻れば次の確認で反映する
+    reloaded.roots.timeout = 5
+    assert set(reloaded.load_projects()) == {'nas1_0', 'nas1_1', 'nas2_0'}
+    assert not reloaded.root_status()[str(tmp_path.joinpath('nas2').absolute())].stale
@@ -0,0 +1,94 @@
+import fnmatch
+from datetime import datetime, timedelta
+
+import pytest
+
+from app_project_maker import AppProjectMaker
+from app_project_maker.hidden_project_config import ProjectMeta
+from app_project_maker.search import SearchEntry, SearchIndex, SearchQuery, _literal_parts
+
+
+def _names(projects):
+    return [project.name for project in projects]
+
+
+def test_search_by_name(tmp_path):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    maker.create_projects(['2021_11_26_camera00', '2021_11_26_camera01', '2021_11_27_camera00', 'Other'])
+    assert _names(maker.search(pattern='2021_11_26_*')) == ['2021_11_26_camera00', '2021_11_26_camera01']
+    assert _names(maker.search(prefix='2021_11_2')) == ['2021_11_26_camera00', '2021_11_26_camera01',
+                                                        '2021_11_27_camera00']
+    assert _names(maker.search(contains='camera00')) == ['2021_11_26_camera00', '2021_11_27_camera00']
+    assert _names(maker.search(contains='th')) == ['Other']
+    assert _names(maker.search(pattern='*_camera0[1-9]')) == ['2021_11_26_camera01']
+    assert _names(maker.search(prefix='2021', contains='27')) == ['2021_11_27_camera00']
+    assert len(maker.search(limit=2)) == 2
+    assert maker.search(contains='missing') == []
+
+
+def test_search_is_kept_current(tmp_path):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    source = maker.create_project('Source')
+    assert _names(maker.search(prefix='S')) == ['Source']
+
+    maker.copy_project('Second', source)
+    assert _names(maker.search(prefix='S')) == ['Second', 'Source']
+    maker.remove_project('Source')
+    assert _names(maker.search(prefix='S')) == ['Second']
+
+    # .prjのuser,makerと更新日
+    alice = maker.create_project('Alice')
+    ProjectMeta.write(alice.path, 'Alice', user='alice', maker='Recorder')
+    alice.update_config_date(datetime(2021, 1, 1))
+    assert _names(maker.search(user='alice')) == ['Alice']
+    assert _names(maker.search(maker='Recorder')) == ['Alice']
+    assert maker.search(user='alice', prefix='S') == []
+
+    second = maker['Second']
+    second.update_config_date(datetime(2030, 1, 1))
+    assert _names(maker.search(since=datetime(2029, 1, 1))) == ['Second']
+    assert _names(maker.search(until=datetime(2029, 1, 1))) == ['Alice']
+    now = datetime.now()
+    assert _names(maker.search(created_since=now - timedelta(hours=1), created_until=now)) == ['Alice', 'Second']
+    assert maker.search(created_since=now + timedelta(hours=1)) == []
+
+    # 他のインスタンスも読み込み時のインデックスから検索できる
+    other = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    assert _names(other.search(pattern='*e*')) == ['Alice', 'Second']
+
+
+def test_search_index_updates():
+    index = SearchIndex([('a1', SearchEntry(1, 10, 'u', 'm')), ('b2', SearchEntry(2, 20, 'v', 'm'))])
+    index.upsert('abc', SearchEntry(3, 30, 'u', 'n'))
+    index.upsert('a1', SearchEntry(1, 40, 'v', 'm'))
+    index.remove('b2')
+    index.remove('missing')
+    assert index.search(SearchQuery(user='v')) == ['a1']
+    assert index.search(SearchQuery(prefix='a')) == ['a1', 'abc']
+    assert index.search(SearchQuery(since=datetime.fromtimestamp(35))) == ['a1']
+    assert index.search(SearchQuery(contains='abc')) == ['abc']
+    assert index.search(SearchQuery(contains='b2')) == []
+    assert index.search(SearchQuery()) == ['a1', 'abc']
+    assert len(index) == 2
+
+
+@pytest.mark.parametrize('pattern, expected', [
+    ('2021_11_26_*', ('2021_11_26_', '2021_11_26_')),
+    ('*camera*', ('', 'camera')),
+    ('a?[0-9]bcd*', ('a', 'bcd')),
+    ('plain', ('plain', 'plain')),
+    ('[!]abc]def', ('', 'def')),
+    ('x[]]yz', ('x', 'yz')),
+    ('ab[cde', ('ab', 'cde')),
+])
+def test_literal_parts(pattern, expected):
+    assert _literal_parts(pattern) == expected
+
+
+@pytest.mark.parametrize('pattern', ['[!]abc]*', '*[]]*', '[]a]bc*', 'x[!]]*', '*a[!]x]c*', 'ab[cd*', '*[!a-c]d?',
+                                     '[!]abc]def', '*[[]*'])
+def test_search_matches_fnmatch(pattern):
+    names = ['abcdef', ']bcdef', 'xbcdef', 'xdef', 'x]yz', 'xyz', 'abc', 'a]c', 'a c', 'ab[cd', 'zzd1', 'ad1',
+             'bc', ']bc', 'abcabc', '[x', 'xx']
+    index = SearchIndex((name, SearchEntry(0, 0, '', '')) for name in names)
+    assert index.search(SearchQuery(pattern=pattern)) == sorted(n for n in names if fnmatch.fnmatchcase(n, pattern))
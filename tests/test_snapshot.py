@@ -0,0 +1,109 @@
+import io
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from app_project_maker import AppProjectMaker
+from app_project_maker.error import SnapshotNotFoundError
+from app_project_maker.snapshot import SNAPSHOT_DIR, SNAPSHOT_META_FILE, SnapshotInfo, SnapshotRetention
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def _touch_later(path, text):
+    # 更新時刻の分解能が粗いファイルシステムでも変更として検出されるようにする
+    _write(path, text)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+
+def test_incremental_snapshot(tmp_path):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    project = maker.create_project('Snap')
+    _write(project.path.joinpath('data', 'a.txt'), 'a')
+    _write(project.path.joinpath('data', 'b.txt'), 'b')
+    first = project.snapshot(label='first')
+    assert first.files == 2 and first.copied_files == 2 and first.label == 'first'
+
+    _touch_later(project.path.joinpath('data', 'b.txt'), 'bb')
+    second = project.snapshot()
+    assert second.copied_files == 1
+    snapshots = project.snapshots
+    unchanged = [snapshots.snapshot_path(info.snapshot_id).joinpath('data', 'a.txt') for info in (first, second)]
+    assert os.path.samefile(*unchanged)
+    assert snapshots.snapshot_path(second.snapshot_id).joinpath('data', 'b.txt').read_text() == 'bb'
+    assert [info.snapshot_id for info in project.list_snapshots()] == [first.snapshot_id, second.snapshot_id]
+    assert project.path.joinpath(SNAPSHOT_META_FILE).exists()
+
+    # スナップショットは使用量に含めない
+    assert SNAPSHOT_DIR not in project.refresh_usage().components
+
+
+def test_restore(tmp_path):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    project = maker.create_project('Restore')
+    _write(project.path.joinpath('data', 'a.txt'), 'a')
+    info = project.snapshot()
+
+    _touch_later(project.path.joinpath('data', 'a.txt'), 'changed')
+    _write(project.path.joinpath('new', 'c.txt'), 'c')
+    result = project.restore(info.snapshot_id)
+    assert result.restored_files == 1 and result.removed_files == 1
+    assert project.path.joinpath('data', 'a.txt').read_text() == 'a'
+    assert not project.path.joinpath('new').exists()
+    assert project.hidden_config().name == 'Restore'
+    # 復元したファイルはスナップショットと共有しない
+    snapshot_file = project.snapshots.snapshot_path(info.snapshot_id).joinpath('data', 'a.txt')
+    assert not os.path.samefile(snapshot_file, project.path.joinpath('data', 'a.txt'))
+    assert project.list_snapshots() == [info]
+
+    with pytest.raises(SnapshotNotFoundError):
+        project.restore('unknown')
+
+
+def test_prune_snapshots(tmp_path):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    project = maker.create_project('Prune')
+    _write(project.path.joinpath('data', 'a.txt'), 'a')
+    ids = [project.snapshot().snapshot_id for _ in range(4)]
+    removed = project.prune_snapshots(keep_last=2)
+    assert removed == ids[:2]
+    assert [info.snapshot_id for info in project.list_snapshots()] == ids[2:]
+    # 削除したスナップショットはゴミ箱に移動する
+    assert maker.wait_deletions(5)
+    assert sorted(os.listdir(project.path.joinpath(SNAPSHOT_DIR))) == sorted(
+        ['.lock'] + ids[2:] + [f'{i}.json' for i in ids[2:]])
+    assert project.path.joinpath(SNAPSHOT_DIR, ids[2], 'data', 'a.txt').read_text() == 'a'
+
+    # 最新のスナップショットは常に残す
+    assert project.prune_snapshots(keep_last=0) == [ids[2]]
+    assert [info.snapshot_id for info in project.list_snapshots()] == [ids[3]]
+
+
+def test_retention_keep_within():
+    now = datetime(2021, 11, 26)
+    snapshots = [SnapshotInfo('old', now - timedelta(days=10)), SnapshotInfo('recent', now - timedelta(hours=1)),
+                 SnapshotInfo('latest', now)]
+    assert SnapshotRetention(keep_within=timedelta(days=1)).keep(snapshots, now) == {'recent', 'latest'}
+    assert SnapshotRetention(keep_last=1, keep_within=timedelta(days=30)).keep(snapshots, now) == {
+        'old', 'recent', 'latest'}
+    assert SnapshotRetention().keep(snapshots, now) == {'old', 'recent', 'latest'}
+
+
+def test_snapshots_are_not_copied(tmp_path):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    project = maker.create_project('Source')
+    _write(project.path.joinpath('data', 'a.txt'), 'a')
+    project.snapshot()
+    copied = maker.copy_project('Copied', project)
+    assert copied.path.joinpath('data', 'a.txt').exists()
+    assert not copied.path.joinpath(SNAPSHOT_DIR).exists()
+    assert copied.list_snapshots() == []
+
+    fp = io.BytesIO()
+    stats = maker.export_project('Source', fp)
+    assert stats.files == 2
@@ -0,0 +1,42 @@
+import re
+import subprocess
+import sys
+
+from app_project_maker import AppProjectMaker
+
+# import app_project_maker にかけてよい累積時間(マイクロ秒).遅いCIでも超えない程度の余裕を持たせる
+IMPORT_BUDGET_US = 150_000
+HEAVY_MODULES = ('loguru', 'dataclasses_json', 'marshmallow')
+# 使うメソッド内でimportするモジュール(書き出し・取り込み,インデックス,ブロブストア,スナップショット,監視など)
+LAZY_MODULES = ('tarfile', 'gzip', 'sqlite3', 'ctypes.util', 'app_project_maker.archive',
+                'app_project_maker.blob_store', 'app_project_maker.project_index', 'app_project_maker.roots',
+                'app_project_maker.search', 'app_project_maker.snapshot', 'app_project_maker.watch')
+
+
+def test_import_is_fast_and_lazy():
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app_project_maker'],
+                            capture_output=True, text=True, check=True)
+    imported = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)', line)
+        if match:
+            imported[match.group(4)] = int(match.group(2))
+
+    for module in HEAVY_MODULES + LAZY_MODULES:
+        assert module not in imported, module
+    assert imported['app_project_maker'] < IMPORT_BUDGET_US
+
+
+def test_registry_loaded_on_first_access(tmp_path):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    assert not maker.loaded
+    assert not tmp_path.joinpath('projects', 'project.json').exists()
+
+    assert maker.projects == {}
+    assert maker.loaded
+    assert tmp_path.joinpath('projects', 'project.json').exists()
+
+    maker.create_project('NewCompany')
+    reloaded = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    assert not reloaded.loaded
+    assert list(reloaded.projects) == ['NewCompany']
@@ -0,0 +1,168 @@
+import os
+from typing import Dict
+
+import pytest
+
+from app_project_maker import AppProjectMaker, AbstractComponent
+from app_project_maker.blob_store import BlobManifest
+from app_project_maker.copy_mode import CopyMode
+from app_project_maker.error import QuotaExceededError
+from app_project_maker.usage import scan_project
+
+
+class VideoComponent(AbstractComponent):
+    size = 1000
+    estimated_size = 1000
+
+    def create(self):
+        self.write_resource('video.mp4', b'0' * self.size)
+
+    def valid(self) -> bool:
+        return self.resource_directory.joinpath('video.mp4').exists()
+
+    @property
+    def resources(self) -> Dict[str, str]:
+        return {'video': str(self.resource_directory.joinpath('video.mp4'))}
+
+
+def test_usage_is_tracked_incrementally(tmp_path, monkeypatch):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    project = maker.create_project('Camera')
+    root = project.disk_usage()
+    assert root.components == {'': root.bytes}
+
+    project.add_component('video', 'video', VideoComponent)
+    usage = project.disk_usage()
+    assert usage.components['video'] == 1000
+    assert usage.bytes == scan_project(project.path)['video'][0] + root.bytes
+
+    # 記録済みの使用量はディスクを走査せずに返す
+    def fail(*args, **kwargs):
+        raise AssertionError('scanned')
+
+    monkeypatch.setattr('app_project_maker.app_project_maker.scan_project', fail)
+    monkeypatch.setattr('app_project_maker.app_project_maker.scan_directory', fail)
+    project.components['video'].write_resource('extra.bin', b'0' * 500)
+    assert project.disk_usage().components['video'] == 1500
+    assert maker.total_usage() == project.disk_usage().bytes
+    monkeypatch.undo()
+
+    copied = maker.copy_project('Copied', project)
+    assert copied.disk_usage().components['video'] == 1500
+    assert maker.total_usage() == project.disk_usage().bytes * 2
+    maker.remove_project('Copied')
+    assert maker.total_usage() == project.disk_usage().bytes
+
+
+def test_nested_components_are_counted_once(tmp_path):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    project = maker.create_project('Camera')
+    project.disk_usage()
+    project.add_component('video', 'media/video', VideoComponent)
+    project.add_component('audio', 'media/audio', VideoComponent)
+    project.components['video'].write_resource('extra.bin', b'0' * 500)
+    project.components['audio'].resources_changed()
+
+    # scan_projectと同じくプロジェクト直下のディレクトリ単位で数える
+    usage = project.disk_usage()
+    assert usage.components == {'': usage.components[''], 'media': 2500}
+    assert usage.bytes == sum(size for size, _ in scan_project(project.path).values())
+    assert project.refresh_usage().components == usage.components
+
+
+def test_quotas(tmp_path):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects', project_quota=1500, total_quota=2500)
+    project = maker.create_project('Camera')
+    project.add_component('video', 'video', VideoComponent)
+
+    # 見積もりで超える場合は作成しない
+    with pytest.raises(QuotaExceededError):
+        project.add_component('video2', 'video2', VideoComponent)
+
+    class Underestimated(VideoComponent):
+        size = 2000
+        estimated_size = 0
+
+    # 書き込みの時点で超える場合も残さない
+    with pytest.raises(QuotaExceededError):
+        project.add_component('big', 'big', Underestimated)
+    assert not project.path.joinpath('big', 'video.mp4').exists()
+
+    class DirectWriter(Underestimated):
+        def create(self):
+            self.resource_directory.joinpath('frames').mkdir()
+            self.resource_directory.joinpath('frames', 'video.mp4').write_bytes(b'0' * self.size)
+
+    # 既存のディレクトリではcreate()が追加したものだけを削除する
+    project.path.joinpath('existing').mkdir()
+    project.path.joinpath('existing', 'precious.txt').write_text('keep')
+    with pytest.raises(QuotaExceededError):
+        project.add_component('existing', 'existing', DirectWriter)
+    assert project.path.joinpath('existing', 'precious.txt').read_text() == 'keep'
+    assert not project.path.joinpath('existing', 'frames').exists()
+    with pytest.raises(QuotaExceededError):
+        project.add_component('new', 'new', DirectWriter)
+    assert not project.path.joinpath('new').exists()
+
+    maker.copy_project('Copied', project)
+    with pytest.raises(QuotaExceededError):
+        maker.copy_project('Copied2', project)
+    assert not maker.exist_project('Copied2')
+
+
+def test_total_quota_counts_unmeasured_projects(tmp_path):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    for i in range(3):
+        maker.create_project(f'Camera{i}').path.joinpath('video.mp4').write_bytes(b'0' * 4000)
+
+    # 使用量を記録していないプロジェクトも読み込み時に数える
+    limited = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects', total_quota=10000)
+    project = limited['Camera0']
+    assert limited.index.total_usage() == sum(
+        size for name in limited.projects for size, _ in scan_project(limited.projects[name].path).values())
+    with pytest.raises(QuotaExceededError):
+        project.add_component('video', 'video', VideoComponent)
+    with pytest.raises(QuotaExceededError):
+        limited.copy_project('Copied', project)
+
+    # 登録したプロジェクトも数える
+    external = maker.base_dir_path.joinpath('External')
+    external.mkdir()
+    external.joinpath('video.mp4').write_bytes(b'0' * 100)
+    before = limited.index.total_usage()
+    limited.open_project('External')
+    assert limited.index.total_usage() >= before + 100
+
+
+class SharedComponent(AbstractComponent):
+    def create(self):
+        self.register_resource(self.write_resource('model.bin', b'model'))
+
+    def valid(self) -> bool:
+        return self.resource_directory.joinpath('model.bin').exists()
+
+    @property
+    def resources(self) -> Dict[str, str]:
+        return {'model': str(self.resource_directory.joinpath('model.bin'))}
+
+
+def test_write_resource_does_not_change_linked_files(tmp_path):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects', blob_store=True)
+    source = maker.create_project('Source')
+    source.add_component('model', 'model', SharedComponent)
+    source.add_component('video', 'video', VideoComponent)
+    copied = maker.copy_project('Copied', source, mode=CopyMode.HARDLINK)
+    copied.add_component('model', 'model', SharedComponent)
+    copied.add_component('video', 'video', VideoComponent)
+    assert os.path.samefile(source.path.joinpath('video', 'video.mp4'), copied.path.joinpath('video', 'video.mp4'))
+
+    # ブロブに登録したファイル
+    copied.components['model'].write_resource('model.bin', b'changed')
+    assert source.path.joinpath('model', 'model.bin').read_bytes() == b'model'
+    assert copied.path.joinpath('model', 'model.bin').read_bytes() == b'changed'
+    assert 'model/model.bin' not in BlobManifest.read(copied.path).entries
+    assert 'model/model.bin' in BlobManifest.read(source.path).entries
+    # HARDLINKでコピーしたファイル
+    copied.components['video'].write_resource('video.mp4', b'1' * 10)
+    assert source.path.joinpath('video', 'video.mp4').read_bytes() == b'0' * VideoComponent.size
+    assert copied.path.joinpath('video', 'video.mp4').read_bytes() == b'1' * 10
@@ -0,0 +1,77 @@
+import shutil
+import threading
+import time
+
+import pytest
+
+from app_project_maker import AppProjectMaker
+from app_project_maker.sort import ProjectSort
+from app_project_maker.hidden_project_config import ProjectMeta
+from app_project_maker.watch import ChangeKind
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.mark.parametrize('backend', ['inotify', 'polling'])
+def test_watch_external_changes(tmp_path, backend):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    maker.create_project('Existing')
+    changes = []
+    try:
+        maker.watch(changes.append, backend=backend, interval=0.05)
+    except OSError:
+        pytest.skip('inotify is not available')
+    try:
+        # 他のツールがプロジェクトを作成・削除する
+        external = maker.base_dir_path.joinpath('External')
+        external.mkdir()
+        time.sleep(0.1)
+        ProjectMeta.write(external, 'External')
+        assert wait_until(lambda: 'External' in maker.projects)
+        shutil.rmtree(maker.base_dir_path.joinpath('Existing'))
+        assert wait_until(lambda: 'Existing' not in maker.projects)
+        # .prjが無いディレクトリはプロジェクトではない
+        maker.base_dir_path.joinpath('NotProject').mkdir()
+        time.sleep(0.2)
+    finally:
+        maker.unwatch()
+
+    assert [(c.kind, c.name) for c in changes] == [(ChangeKind.CREATED, 'External'), (ChangeKind.REMOVED, 'Existing')]
+    assert set(maker.projects) == {'External'}
+
+
+def test_watch_changes_are_applied_under_lock(tmp_path):
+    maker = AppProjectMaker(cur_dir=str(tmp_path), base_dir_path='projects')
+    maker.create_project('Existing')
+    maker.base_dir_path.joinpath('External').mkdir()
+    ProjectMeta.write(maker.base_dir_path.joinpath('External'), 'External')
+    # 呼び出し側がprojects_lockを持っている間は監視スレッドからの変更を反映しない
+    with maker.projects_lock:
+        applying = threading.Thread(target=maker._apply_directory_changes, args=(['External'],))
+        applying.start()
+        applying.join(0.2)
+        assert applying.is_alive()
+        assert set(maker.projects) == {'Existing'}
+    applying.join(5)
+    assert set(maker.projects) == {'Existing', 'External'}
+
+    # 監視スレッドが登録を変更している間に列挙・検索・保存しても壊れない
+    maker.watch(backend='polling', interval=0.01)
+    try:
+        for i in range(30):
+            external = maker.base_dir_path.joinpath(f'External{i}')
+            external.mkdir()
+            ProjectMeta.write(external, external.name)
+            maker.list_projects_raw(ProjectSort.DESCENT)
+            maker.search(prefix='External')
+            maker.save_project()
+        assert wait_until(lambda: len(maker.projects) == 32)
+    finally:
+        maker.unwatch()